@@ -0,0 +1,285 @@
+import uasyncio
+import utime
+
+
+class HttpError(OSError):
+    pass
+
+
+def parse_url(url):
+    """Splits a http(s) url into (use_ssl, host, port, path)."""
+    if url.startswith('https://'):
+        use_ssl, port, rest = True, 443, url[8:]
+    elif url.startswith('http://'):
+        use_ssl, port, rest = False, 80, url[7:]
+    else:
+        raise ValueError(f'Unsupported url {url}')
+
+    slash = rest.find('/')
+    if slash < 0:
+        host, path = rest, '/'
+    else:
+        host, path = rest[:slash], rest[slash:]
+    if ':' in host:
+        host, port = host.split(':', 1)
+        port = int(port)
+    return use_ssl, host, port, path
+
+
+class Response:
+    """
+        A HTTP response whose body is read on demand.
+
+        The body must be read to the end (or the response closed) before
+        the connection can be reused for another request.
+    """
+    def __init__(self, client, key, reader, writer, deadline_ms):
+        self._client = client
+        self._key = key
+        self._reader = reader
+        self._writer = writer
+        self._deadline_ms = deadline_ms
+        self.status_code = None
+        self.reason = ''
+        self.headers = {}
+        # Bytes left in the body (content-length) or in the current chunk
+        self._remaining = None
+        self._chunked = False
+        self._keep_alive = True
+        self._done = False
+
+    async def _read_headers(self):
+        line = await self._wait(self._reader.readline())
+        if not line:
+            raise EOFError('Connection closed by server')
+        try:
+            parts = line.decode().rstrip().split(' ', 2)
+            self.status_code = int(parts[1])
+        except (ValueError, IndexError):
+            self.close()
+            raise HttpError('Malformed HTTP status line')
+        self.reason = parts[2] if len(parts) > 2 else ''
+
+        while True:
+            line = await self._wait(self._reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            self.headers[name.strip().lower()] = value.strip()
+
+        version = parts[0]
+        connection = self.headers.get('connection', '').lower()
+        self._keep_alive = (connection != 'close' and
+                            (version != 'HTTP/1.0' or
+                             connection == 'keep-alive'))
+
+        if 'chunked' in self.headers.get('transfer-encoding', '').lower():
+            self._chunked = True
+            self._remaining = 0
+        elif 'content-length' in self.headers:
+            self._remaining = int(self.headers['content-length'])
+        elif self.status_code in (204, 304) or self.status_code < 200:
+            self._remaining = 0
+        else:
+            # Body ends when the server closes the connection
+            self._keep_alive = False
+
+        if self._remaining == 0 and not self._chunked:
+            self._finish()
+
+    async def _wait(self, coro):
+        # The connection is in an unknown state after any error, so it is
+        # dropped rather than left open or returned to the pool
+        try:
+            try:
+                timeout_ms = self._client.remaining_ms(self._deadline_ms)
+            except HttpError:
+                coro.close()  # Never started
+                raise
+            return await uasyncio.wait_for(coro, timeout_ms / 1000)
+        except uasyncio.TimeoutError:
+            self.close()
+            raise HttpError('HTTP request timed out')
+        except BaseException:
+            self.close()
+            raise
+
+    async def read(self, size=1024):
+        """
+            Reads up to size bytes of the body. Returns b'' once the whole
+            body has been read.
+        """
+        if self._done:
+            return b''
+
+        if self._chunked and not self._remaining:
+            line = await self._wait(self._reader.readline())
+            self._remaining = int(line.split(b';', 1)[0].strip(), 16)
+            if not self._remaining:
+                # Skip trailers up to the final blank line
+                while line not in (b'\r\n', b'\n', b''):
+                    line = await self._wait(self._reader.readline())
+                self._finish()
+                return b''
+
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+        data = await self._wait(self._reader.read(size))
+
+        if not data:
+            if self._remaining is None:
+                # Body delimited by connection close
+                self._finish()
+                return b''
+            self.close()
+            raise EOFError('Connection closed mid-body')
+
+        if self._remaining is not None:
+            self._remaining -= len(data)
+            if not self._remaining:
+                if self._chunked:
+                    await self._wait(self._reader.readline())  # chunk CRLF
+                else:
+                    self._finish()
+        return data
+
+    async def content(self):
+        """Reads the whole body into memory."""
+        chunks = []
+        while True:
+            data = await self.read()
+            if not data:
+                return b''.join(chunks)
+            chunks.append(data)
+
+    async def text(self):
+        return (await self.content()).decode()
+
+    def _finish(self):
+        self._done = True
+        if self._writer is None:
+            return
+        if self._keep_alive:
+            self._client._release(self._key, self._reader, self._writer)
+        else:
+            self._client._close_stream(self._writer)
+        self._reader = self._writer = None
+
+    def close(self):
+        """Closes the response, dropping the connection if not finished."""
+        self._done = True
+        if self._writer is not None:
+            self._client._close_stream(self._writer)
+            self._reader = self._writer = None
+
+
+class HttpClient:
+    """
+        A small non-blocking HTTP/1.1 client on uasyncio streams.
+
+        An idle connection per host is kept open and reused by the next
+        request to the same host. Each request has a deadline covering
+        the connection, the request and every body read.
+    """
+    def __init__(self, timeout_ms=5000, user_agent='micropython'):
+        self.timeout_ms = timeout_ms
+        self.user_agent = user_agent
+        # (host, port, ssl) -> (reader, writer) of idle connections
+        self._idle = {}
+
+        self.connections_opened = 0
+        self.requests = 0
+
+    def remaining_ms(self, deadline_ms):
+        remaining = utime.ticks_diff(deadline_ms, utime.ticks_ms())
+        if remaining <= 0:
+            raise HttpError('HTTP request timed out')
+        return remaining
+
+    async def request(self, method, url, headers=None, data=None,
+                      timeout_ms=None):
+        """
+            Sends a request and returns the Response once its headers have
+            been read. data may be str or bytes.
+        """
+        deadline_ms = utime.ticks_add(utime.ticks_ms(),
+                                      timeout_ms or self.timeout_ms)
+        use_ssl, host, port, path = parse_url(url)
+        key = (host, port, use_ssl)
+
+        if isinstance(data, str):
+            data = data.encode()
+
+        lines = [f'{method} {path} HTTP/1.1\r\n'
+                 f'Host: {host}\r\n'
+                 f'User-Agent: {self.user_agent}\r\n']
+        if data is not None:
+            lines.append(f'Content-Length: {len(data)}\r\n')
+        if headers:
+            for name, value in headers.items():
+                lines.append(f'{name}: {value}\r\n')
+        lines.append('\r\n')
+        head = ''.join(lines).encode()
+
+        # A reused connection may have been closed by the server while
+        # idle, so retry once on a fresh one
+        for reused in (True, False):
+            streams = self._idle.pop(key, None) if reused else None
+            if reused and streams is None:
+                continue
+            if streams is None:
+                streams = await self._open(host, port, use_ssl, deadline_ms)
+            reader, writer = streams
+
+            response = Response(self, key, reader, writer, deadline_ms)
+            try:
+                writer.write(head)
+                if data:
+                    writer.write(data)
+                await response._wait(writer.drain())
+                await response._read_headers()
+            except (OSError, EOFError) as e:
+                response.close()
+                if reused and not isinstance(e, HttpError):
+                    continue
+                raise
+            self.requests += 1
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def _open(self, host, port, use_ssl, deadline_ms):
+        timeout_s = self.remaining_ms(deadline_ms) / 1000
+        try:
+            if use_ssl:
+                streams = await uasyncio.wait_for(
+                    uasyncio.open_connection(host, port, ssl=True), timeout_s)
+            else:
+                streams = await uasyncio.wait_for(
+                    uasyncio.open_connection(host, port), timeout_s)
+        except uasyncio.TimeoutError:
+            raise HttpError(f'Timed out connecting to {host}')
+        self.connections_opened += 1
+        return streams
+
+    def _release(self, key, reader, writer):
+        old = self._idle.get(key)
+        if old is not None:
+            self._close_stream(old[1])
+        self._idle[key] = (reader, writer)
+
+    def _close_stream(self, writer):
+        try:
+            writer.close()
+        except OSError:
+            pass
+
+    def close(self):
+        """Closes all idle connections."""
+        for reader, writer in self._idle.values():
+            self._close_stream(writer)
+        self._idle = {}
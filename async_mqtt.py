@@ -0,0 +1,291 @@
+import struct
+import uasyncio
+import utime
+from micropython import const
+
+# Control packet types (first byte, flags included)
+_CONNECT = const(0x10)
+_CONNACK = const(0x20)
+_PUBLISH = const(0x30)
+_PUBACK = const(0x40)
+_PINGREQ = const(0xC0)
+_DISCONNECT = const(0xE0)
+
+
+class MqttError(OSError):
+    pass
+
+
+def _string(value):
+    """MQTT UTF-8 string: 2 byte length and the bytes."""
+    if isinstance(value, str):
+        value = value.encode()
+    return struct.pack('!H', len(value)) + value
+
+
+class MqttClient:
+    """
+        A small MQTT 3.1.1 client on uasyncio streams, for publishing.
+
+        run keeps one long-lived connection up, pinging the broker so it
+        stays open and reconnecting with backoff when it drops. publish
+        sends QoS 0 or 1 messages. At most window QoS 1 messages wait for
+        their PUBACK at a time, publish waits for a free slot.
+    """
+    def __init__(self, client_id, host, port=1883, user=None, password=None,
+                 keepalive_s=60, ssl=False, window=4, timeout_ms=5000,
+                 backoff_ms=1000, max_backoff_ms=60000):
+        """
+            Parameters:
+                client_id - Unique id of this device on the broker.
+                host, port - Broker address.
+                user, password - Credentials, None for none.
+                keepalive_s - Longest time without a packet to the broker.
+                ssl - Connect with TLS.
+                window - QoS 1 messages in flight at once.
+                timeout_ms - Time to wait for the broker to answer.
+                backoff_ms - Delay after the first failed connection,
+                             doubled after each further failure.
+                max_backoff_ms - Upper bound of the delay.
+        """
+        self.client_id = client_id
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.keepalive_s = keepalive_s
+        self.ssl = ssl
+        self.window = window
+        self.timeout_ms = timeout_ms
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+
+        self.connected = False
+        self._reader = None
+        self._writer = None
+        self._write_lock = uasyncio.Lock()
+        # Pulsed when a PUBACK arrives or the connection drops
+        self._acked = uasyncio.Event()
+        self._closed = uasyncio.Event()
+        # Packet ids of QoS 1 messages waiting for their PUBACK
+        self._in_flight = []
+        self._next_id = 0
+        self._last_sent = 0
+        self._last_received = 0
+
+        # Statistics
+        self.connects = 0
+        self.disconnects = 0
+        self.published = 0
+        self.pings = 0
+
+    async def _wait(self, coro):
+        try:
+            return await uasyncio.wait_for_ms(coro, self.timeout_ms)
+        except uasyncio.TimeoutError:
+            raise MqttError('MQTT broker timed out')
+
+    async def connect(self):
+        """Connects to the broker. Needs a network connection."""
+        if self.ssl:
+            streams = uasyncio.open_connection(self.host, self.port, ssl=True)
+        else:
+            streams = uasyncio.open_connection(self.host, self.port)
+        self._reader, self._writer = await self._wait(streams)
+
+        flags = 0x02  # Clean session
+        payload = _string(self.client_id)
+        if self.user is not None:
+            flags |= 0x80
+            payload += _string(self.user)
+            if self.password is not None:
+                flags |= 0x40
+                payload += _string(self.password)
+        variable = b'\x00\x04MQTT\x04' + bytes((flags,)) + struct.pack(
+            '!H', self.keepalive_s)
+        try:
+            await self._send(_CONNECT, variable + payload)
+            packet_type, body = await self._wait(
+                self._read_packet(self._reader))
+        except (OSError, EOFError) as e:
+            self._drop()
+            raise MqttError(f'MQTT connect failed: {e}')
+        if packet_type != _CONNACK or len(body) < 2 or body[1]:
+            self._drop()
+            raise MqttError(f'MQTT connection refused: {body[1:2]}')
+
+        self.connected = True
+        self.connects += 1
+        self._closed = uasyncio.Event()
+        self._last_received = utime.ticks_ms()
+        uasyncio.create_task(self._read_loop())
+        uasyncio.create_task(self._keepalive())
+
+    async def _send(self, first_byte, body=b'', *parts):
+        """Private method - writes a packet, parts follow body."""
+        length = len(body)
+        for part in parts:
+            length += len(part)
+        # Remaining length, 7 bits per byte
+        header = bytearray((first_byte,))
+        while True:
+            byte = length & 0x7F
+            length >>= 7
+            header.append(byte | 0x80 if length else byte)
+            if not length:
+                break
+        async with self._write_lock:
+            writer = self._writer
+            if writer is None:
+                raise MqttError('MQTT not connected')
+            writer.write(header)
+            writer.write(body)
+            for part in parts:
+                writer.write(part)
+            await self._wait(writer.drain())
+        self._last_sent = utime.ticks_ms()
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length = 0
+        shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(length) if length else b''
+        return header[0] & 0xF0, body
+
+    async def _read_loop(self):
+        # Only this connection's, a new one may be up by the time it ends
+        reader = self._reader
+        closed = self._closed
+        try:
+            while True:
+                packet_type, body = await self._read_packet(reader)
+                self._last_received = utime.ticks_ms()
+                if packet_type == _PUBACK:
+                    packet_id = struct.unpack('!H', body)[0]
+                    if packet_id in self._in_flight:
+                        self._in_flight.remove(packet_id)
+                    self._acked.set()
+                    self._acked.clear()
+        except Exception as e:
+            if not closed.is_set():
+                print(f"MQTT connection lost: {e}")
+        if not closed.is_set():
+            self._drop()
+
+    async def _keepalive(self):
+        closed = self._closed
+        interval_ms = self.keepalive_s * 1000 // 2
+        while not closed.is_set():
+            await uasyncio.sleep_ms(interval_ms // 2)
+            if closed.is_set():
+                return
+            now = utime.ticks_ms()
+            if utime.ticks_diff(now, self._last_received) > interval_ms * 3:
+                # Nothing, not even a ping response, for 1.5 keepalives
+                print("MQTT broker stopped answering")
+                self._drop()
+                return
+            if utime.ticks_diff(now, self._last_sent) >= interval_ms:
+                try:
+                    await self._send(_PINGREQ)
+                    self.pings += 1
+                except OSError:
+                    self._drop()
+                    return
+
+    def _drop(self):
+        """
+            Private method - closes the connection. QoS 1 messages in
+            flight are forgotten, callers send them again.
+        """
+        was_connected = self.connected
+        self.connected = False
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+        self._in_flight = []
+        self._closed.set()
+        self._acked.set()
+        self._acked.clear()
+        if was_connected:
+            self.disconnects += 1
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        """
+            Publishes payload (str or bytes) to topic. With QoS 1 returns
+            once the message is sent and a window slot is free, use
+            wait_acked to wait for the broker to have them all.
+            Raises MqttError if not connected.
+        """
+        if not self.connected:
+            raise MqttError('MQTT not connected')
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        first_byte = _PUBLISH | (qos << 1) | (1 if retain else 0)
+        variable = _string(topic)
+        if qos:
+            while len(self._in_flight) >= self.window:
+                try:
+                    await self._wait(self._acked.wait())
+                except MqttError:
+                    # The acks are lost, start over on a new connection
+                    self._drop()
+                    raise
+                if not self.connected:
+                    raise MqttError('MQTT connection lost')
+            self._next_id = self._next_id % 0xFFFF + 1
+            self._in_flight.append(self._next_id)
+            variable += struct.pack('!H', self._next_id)
+        await self._send(first_byte, variable, payload)
+        self.published += 1
+
+    async def wait_acked(self):
+        """
+            Waits until every QoS 1 message was acknowledged. Raises
+            MqttError if the connection drops or the broker times out.
+        """
+        while self._in_flight:
+            try:
+                await self._wait(self._acked.wait())
+            except MqttError:
+                # Start over on a new connection
+                self._drop()
+                raise
+            if not self.connected:
+                raise MqttError('MQTT connection lost')
+
+    async def disconnect(self):
+        if self.connected:
+            try:
+                await self._send(_DISCONNECT)
+            except OSError:
+                pass
+        self._drop()
+
+    async def run(self, wifi):
+        """
+            Keeps the connection up over the shared wifi, reconnecting
+            with backoff. Run as a task.
+        """
+        backoff_ms = self.backoff_ms
+        while True:
+            try:
+                async with wifi:
+                    await self.connect()
+                    print("MQTT connected")
+                    backoff_ms = self.backoff_ms
+                    await self._closed.wait()
+            except OSError as e:
+                print(f"MQTT connection failed: {e}")
+            await uasyncio.sleep_ms(backoff_ms)
+            backoff_ms = min(backoff_ms * 2, self.max_backoff_ms)
@@ -0,0 +1,226 @@
+from array import array
+import utime
+
+from async_http import HttpClient
+from history import format_fixed, to_fixed
+
+BLYNK_BATCH_URL = 'https://blynk.cloud/external/api/batch/update'
+
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Longest point in a batch body, '[<13 digit ms>,-3276.8],'
+_POINT_SIZE = 25
+
+# Blynk expects unix time, MicroPython ports may count from 2000
+EPOCH_OFFSET = 946684800 if utime.gmtime(0)[0] == 2000 else 0
+
+
+def _format_int(buffer, value, start):
+    """Writes the non-negative int value into buffer, returns the end."""
+    end = start
+    divisor = 1
+    while divisor * 10 <= value:
+        divisor *= 10
+    while divisor:
+        buffer[end] = 0x30 + value // divisor % 10
+        end += 1
+        divisor //= 10
+    return end
+
+
+class BlynkUploader:
+    """
+        Queues readings in RAM and sends them to Blynk in batches.
+
+        Each flush sends every queued value of a virtual pin as timestamped
+        history in a single request, all over one connection, so the app
+        gets every sample while the radio is only up once per flush. The
+        queue is bounded; when it is full the oldest reading is dropped.
+        A failed flush keeps the queue for the next attempt, which only
+        sends each pin the values it didn't get yet, so Blynk doesn't
+        store them twice. After a failed flush the next one is only due
+        once a backoff has passed, however many readings are queued.
+    """
+    def __init__(self, token, pins=('v0', 'v1'), capacity=96,
+                 flush_interval_s=1800, flush_size=48, timeout=10, http=None,
+                 backoff_s=60):
+        """
+            Parameters:
+                token - Blynk auth token.
+                pins - Virtual pins, one per value passed to add.
+                capacity - Maximum number of queued readings.
+                flush_interval_s - Time after which queued readings are due.
+                flush_size - Number of queued readings that makes a flush due.
+                timeout - HTTP request deadline in seconds.
+                http - HttpClient to share with other uploaders, so they
+                       reuse one connection.
+                backoff_s - Delay after the first failed flush, doubled
+                            after each further failure up to
+                            flush_interval_s.
+        """
+        self.token = token
+        self.pins = pins
+        self.capacity = capacity
+        self.flush_interval_s = flush_interval_s
+        self.flush_size = min(flush_size, capacity)
+        self.backoff_s = backoff_s
+        self.http = http or HttpClient(timeout_ms=timeout * 1000)
+        # Request URLs and the body buffer are made once and reused
+        self._urls = [f'{BLYNK_BATCH_URL}?token={token}&pin={pin}'
+                      for pin in pins]
+        self._body_buffer = bytearray(
+            2 + _POINT_SIZE * capacity if pins else 0)
+        self._body_mv = memoryview(self._body_buffer)
+
+        self.timestamps = array('I', bytes(4 * capacity))
+        self.values = [array('h', bytes(2 * capacity)) for _ in pins]
+        self._first = 0
+        self._count = 0
+        # Per pin, how many of the queued readings it already got
+        self._delivered = [0] * len(pins)
+        self._last_flush = utime.ticks_ms()
+
+        self.dropped = 0
+        # Consecutive failed flushes, reset by a successful one
+        self.failed_flushes = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, *values, timestamp=None):
+        """Queues a reading, one value per pin."""
+        if timestamp is None:
+            timestamp = utime.time()
+        if self._count == self.capacity:
+            # Drop the oldest reading
+            self._first = (self._first + 1) % self.capacity
+            self._count -= 1
+            self.dropped += 1
+            for j in range(len(self._delivered)):
+                if self._delivered[j]:
+                    self._delivered[j] -= 1
+
+        i = (self._first + self._count) % self.capacity
+        self.timestamps[i] = timestamp
+        for pin_values, value in zip(self.values, values):
+            pin_values[i] = to_fixed(value)
+        self._count += 1
+
+    def clear(self):
+        self._first = 0
+        self._count = 0
+        for j in range(len(self._delivered)):
+            self._delivered[j] = 0
+
+    def last_timestamp(self):
+        """Timestamp of the newest queued reading, None if none."""
+        if not self._count:
+            return None
+        return self.timestamps[(self._first + self._count - 1) %
+                               self.capacity]
+
+    def flush_due(self, pending=None):
+        """
+            Whether a flush is due. pending is the number of readings
+            waiting to be sent, by default the number queued.
+        """
+        if pending is None:
+            pending = self._count
+        if not pending:
+            return False
+        elapsed = utime.ticks_diff(utime.ticks_ms(), self._last_flush)
+        if self.failed_flushes:
+            backoff_s = self.backoff_s << min(self.failed_flushes - 1, 8)
+            return elapsed >= min(backoff_s, self.flush_interval_s) * 1000
+        return (pending >= self.flush_size or
+                elapsed >= self.flush_interval_s * 1000)
+
+    def failed(self):
+        """
+            Counts a failed flush, also one that couldn't be attempted
+            because the network didn't come up, and backs off the next.
+        """
+        self.failed_flushes += 1
+        self._last_flush = utime.ticks_ms()
+
+    def _body(self, pin_values, start, count):
+        """
+            JSON body of [[timestamp_ms, value], ...] for the queued
+            readings start to count, written into the reused body buffer.
+        """
+        body = self._body_buffer
+        body[0] = 0x5B  # '['
+        end = 1
+        for n in range(start, count):
+            i = (self._first + n) % self.capacity
+            body[end] = 0x5B
+            end = _format_int(body, self.timestamps[i] + EPOCH_OFFSET,
+                              end + 1)
+            body[end:end + 4] = b'000,'  # Seconds to ms
+            end = format_fixed(body, pin_values[i], end + 4)
+            body[end] = 0x5D  # ']'
+            body[end + 1] = 0x2C  # ','
+            end += 2
+        if count > start:
+            end -= 1  # No trailing ','
+        body[end] = 0x5D
+        return self._body_mv[:end + 1]
+
+    async def flush(self):
+        """
+            Sends the queued readings. Needs a network connection.
+
+            Returns True if the queue was sent and cleared.
+        """
+        count = self._count
+        if not count:
+            return True
+
+        self._last_flush = utime.ticks_ms()
+        delivered = self._delivered
+        try:
+            for j in range(len(self._urls)):
+                if delivered[j] >= count:
+                    continue
+                response = await self.http.post(
+                    self._urls[j],
+                    data=self._body(self.values[j], delivered[j], count),
+                    headers=_JSON_HEADERS)
+                # Drain the body so the connection can be reused
+                await response.content()
+                if response.status_code != 200:
+                    raise OSError(f'Blynk returned {response.status_code}')
+                delivered[j] = count
+        except Exception as e:
+            self.failed()
+            print(f"Failed to send data to Blynk: {e}")
+            self.close()
+            return False
+
+        self.failed_flushes = 0
+        # Readings added while flushing stay queued
+        self._first = (self._first + count) % self.capacity
+        self._count -= count
+        for j in range(len(delivered)):
+            delivered[j] -= count
+        return True
+
+    async def update(self, values):
+        """
+            Sets the current value of pins, eg {'v10': 12}, in one request.
+            Returns True on success.
+        """
+        params = '&'.join(f'{pin}={value}' for pin, value in values.items())
+        try:
+            response = await self.http.get(
+                f'{BLYNK_BATCH_URL}?token={self.token}&{params}')
+            await response.content()
+            return response.status_code == 200
+        except Exception as e:
+            print(f"Failed to send data to Blynk: {e}")
+            self.close()
+            return False
+
+    def close(self):
+        """Closes the connection kept open between requests."""
+        self.http.close()
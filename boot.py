@@ -0,0 +1,6 @@
+# Runs before main.py on every boot. Starts the OTA slot holding the
+# installed version and rolls back a new one that didn't confirm it
+# started (see ota_slots). Copied over USB, not updated over the air.
+import ota_slots
+
+ota_slots.boot()
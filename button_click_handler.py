@@ -1,44 +1,227 @@
-from machine import Pin
+import machine
+import micropython
+import uasyncio
 import utime
+from array import array
+from machine import Pin
+from micropython import const
+
+# Lets exceptions raised inside the IRQ handler be reported
+micropython.alloc_emergency_exception_buf(100)
+
+# Edge timestamps kept between two runs of the gesture task, power of 2
+_RING_SIZE = const(16)
+_RING_MASK = const(15)
+# Read/write positions wrap at 256 so a full ring can be told from an empty one
+_INDEX_MASK = const(0xFF)
 
 
 class ButtonClickHandler:
     """
         Creates a click handler using the GPIO pin provided
+
+        The pin IRQ only timestamps the edge into a preallocated ring and
+        sets a ThreadSafeFlag, it never allocates or calls user code. The
+        run task debounces the edges and turns them into click, long press
+        and double click events.
     """
-    def __init__(self, GPIO_pin, click_handler):
+    def __init__(self, GPIO_pin, click_handler, wake_from_sleep=False,
+                 on_long_press=None, on_double_click=None, debounce_ms=30,
+                 long_press_ms=1000, double_click_ms=300):
         """
             Parameters:
                 GPIO_PIN - GPIO pin to use for the button.
                 click_handler - Click handler function with arg time_held_down.
+                wake_from_sleep - Button press wakes the CPU from lightsleep.
+                on_long_press - Called with time_held_down for presses of at
+                                least long_press_ms. Long presses are passed
+                                to click_handler when not given.
+                on_double_click - Called with time_held_down of the second
+                                  press. Clicks are only delayed by
+                                  double_click_ms when this is given.
+                debounce_ms - Time the level must be stable to count.
+                long_press_ms - Hold time that makes a long press.
+                double_click_ms - Max gap between two clicks of a double
+                                  click.
         """
         self.button_down = False
         self.button_held_down_start = 0
         self.click_handler = click_handler
+        self.on_long_press = on_long_press
+        self.on_double_click = on_double_click
+        self.debounce_ms = debounce_ms
+        self.long_press_ms = long_press_ms
+        self.double_click_ms = double_click_ms
+
+        # Written by the IRQ only
+        self._edges = array('I', bytes(4 * _RING_SIZE))
+        self._head = 0
+        # Read by the gesture task only
+        self._tail = 0
+        self._flag = uasyncio.ThreadSafeFlag()
+
+        # Edges lost because the ring filled before the task ran
+        self.overruns = 0
 
         # Sets the GPIO as an input and listens
         # Pin.PULL_UP enables the internal pull up resistor
-        button = Pin(GPIO_pin, Pin.IN, Pin.PULL_UP)
+        self.button = Pin(GPIO_pin, Pin.IN, Pin.PULL_UP)
+
+        self.wake_from_sleep = wake_from_sleep
+        self._wake_armed = False
+        self._listen()
 
-        # Will call the event handler when button is pressed down or released
-        button.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING,
-                   handler=self._button_event_handler)
+    def _listen(self):
+        """
+            Private method - calls the event handler when the button is
+            pressed down or released.
+        """
+        self.button.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING,
+                        handler=self._button_event_handler, hard=True)
+
+    def arm_wake(self):
+        """
+            Lets a press wake the CPU from the lightsleep about to start.
+
+            The ESP32 only wakes from light sleep on a GPIO level, not an
+            edge, so the edge IRQ is swapped for a low level wake source
+            until disarm_wake(). Returns False while the button is held
+            down, it would wake straight away and its release be missed.
+        """
+        if not self.wake_from_sleep:
+            return True
+        if not self.button.value():
+            return False
+        try:
+            self.button.irq(handler=None, trigger=Pin.WAKE_LOW,
+                            wake=machine.SLEEP)
+            self._wake_armed = True
+        except (TypeError, ValueError) as e:
+            # Only the timer wakes the CPU from now on
+            print(f"Button can't wake from sleep: {e}")
+            self.wake_from_sleep = False
+            self._listen()
+        return True
+
+    def disarm_wake(self):
+        """
+            Restores the edge IRQ after lightsleep. A press that woke the
+            CPU is recorded as an edge, at the time of waking.
+        """
+        if not self._wake_armed:
+            return
+        self._wake_armed = False
+        self._listen()
+        if not self.button.value():
+            self._button_event_handler(self.button)
 
     def _button_event_handler(self, pin):
         """
-            Private method - processes button clicks and calls click handler.
+            Private method - IRQ handler, records when the edge happened.
+        """
+        head = self._head
+        self._edges[head & _RING_MASK] = utime.ticks_ms()
+        self._head = (head + 1) & _INDEX_MASK
+        self._flag.set()
+
+    def _drain(self):
+        """
+            Private method - takes the edges recorded since the last call.
+
+            Returns the ticks_ms of the oldest one, or None if there were none.
+        """
+        head = self._head
+        pending = (head - self._tail) & _INDEX_MASK
+        if not pending:
+            return None
+        if pending > _RING_SIZE:
+            # The IRQ overwrote the oldest edges
+            self.overruns += pending - _RING_SIZE
+            self._tail = (head - _RING_SIZE) & _INDEX_MASK
+        first = self._edges[self._tail & _RING_MASK]
+        self._tail = head
+        return first
+
+    async def _settle(self):
+        """
+            Private method - waits for the contacts to stop bouncing.
+
+            Returns the level once stable and the ticks_ms of the first edge
+            of the burst, which is when the press or release really began.
+        """
+        await self._flag.wait()
+        first = self._drain()
+        # Stale wake ups are harmless, the edge was taken by an earlier burst
+        if first is None:
+            return self.button.value(), None
+        while True:
+            await uasyncio.sleep_ms(self.debounce_ms)
+            if self._drain() is None:
+                break
+        return self.button.value(), first
+
+    async def _wait_for_press(self, timeout_ms):
         """
-        if not pin.value():  # Button down
+            Private method - returns the next press start or None on timeout.
+        """
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        while not self.button_down:
+            remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remaining <= 0:
+                return None
+            try:
+                # Only the wait is timed out, a burst is always read in full
+                await uasyncio.wait_for_ms(self._flag.wait(), remaining)
+            except uasyncio.TimeoutError:
+                return None
+            self._flag.set()
+            self._level_changed(*await self._settle())
+        return self.button_held_down_start
+
+    def _level_changed(self, level, edge_ms):
+        """
+            Private method - tracks the debounced button state.
+
+            Returns the time held down when this was a release, else None.
+        """
+        if edge_ms is None:
+            return None
+        if not level:  # Button down
             if not self.button_down:
                 self.button_down = True
-                self.button_held_down_start = utime.ticks_ms()
+                self.button_held_down_start = edge_ms
         else:  # Button released
             if self.button_down:
-                button_held_down_finish = utime.ticks_ms()
+                self.button_down = False
+                return utime.ticks_diff(edge_ms, self.button_held_down_start)
+        return None
 
-                time_held_down = button_held_down_finish
-                - self.button_held_down_start
+    async def run(self):
+        """
+            Turns debounced button edges into gestures, run as a task.
+        """
+        while True:
+            time_held_down = self._level_changed(*await self._settle())
+            if time_held_down is None:
+                continue
 
-                self.button_down = False
+            if time_held_down >= self.long_press_ms:
+                if self.on_long_press is not None:
+                    self.on_long_press(time_held_down)
+                else:
+                    self.click_handler(time_held_down)
+                continue
+
+            if self.on_double_click is None:
+                self.click_handler(time_held_down)
+                continue
 
+            # Hold the click back to see whether a second one follows
+            if await self._wait_for_press(self.double_click_ms) is None:
                 self.click_handler(time_held_down)
+                continue
+            while True:
+                second_held_down = self._level_changed(*await self._settle())
+                if second_held_down is not None:
+                    break
+            self.on_double_click(second_held_down)
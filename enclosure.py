@@ -0,0 +1,221 @@
+import machine
+import uasyncio
+from micropython import const
+
+from sensor import Sensor
+from history import History, SCALE
+from timeseries_log import TimeSeriesLog
+from schedule import Schedule
+from trend import Trend
+
+# A yellow LED only turns red this far (fixed-point %RH) below the bounds
+LED_HYSTERESIS = const(10)
+
+
+class Leds:
+    """
+        The red, yellow and green status LEDs of an enclosure.
+    """
+    def __init__(self, red, yellow, green):
+        """
+            Parameters:
+                red, yellow, green - GPIO pins of the LEDs.
+        """
+        self.red = machine.Pin(red, machine.Pin.OUT)
+        self.yellow = machine.Pin(yellow, machine.Pin.OUT)
+        self.green = machine.Pin(green, machine.Pin.OUT)
+        self.current = None
+
+    def change_color(self, led):
+        """
+            Change the LED to the new led value
+
+            parameter: led (green, yellow, red)
+        """
+        # Turn the current LED off or leave on and return
+        if self.current is not None:
+            if self.current is led:
+                return
+            else:
+                self.current.value(0)
+
+        # Turn the 'led' argument that was passed
+        led.value(1)
+
+        # Set current to 'led'
+        self.current = led
+
+    def turn_off(self, led, delay=0):
+        async def task_turn_of_led():
+            await uasyncio.sleep(delay)
+            led.value(0)  # Turn off LED
+
+        uasyncio.create_task(task_turn_of_led())
+
+
+class Enclosure:
+    """
+        One vivarium: its sensor, humidity bounds, food schedule, LEDs,
+        reading history and log, and the Blynk pins it reports to.
+    """
+    def __init__(self, name, sensor_pin, leds, schedule, pins=('v0', 'v1'),
+                 am_bounds=(70, 60), pm_bounds=(80, 70), log_dir='ts',
+                 readings=None):
+        """
+            Parameters:
+                name - Shown on the display.
+                sensor_pin - GPIO pin of the DHT22.
+                leds - Leds of the enclosure.
+                schedule - Schedule of the enclosure.
+                pins - Blynk virtual pins for temperature and humidity.
+                am_bounds - (green, yellow) humidity bounds in the AM.
+                pm_bounds - (green, yellow) humidity bounds in the PM.
+                log_dir - Directory of the reading log.
+                readings - Event pulsed by every enclosure's sensor.
+        """
+        self.name = name
+        self.sensor = Sensor(sensor_pin, notify=readings,
+                             on_reading=self._record)
+        self.leds = leds
+        self.schedule = schedule
+        self.pins = pins
+        self.am_bounds = am_bounds
+        self.pm_bounds = pm_bounds
+        # Fixed-point bounds, scaled once rather than on every update
+        self._am_fixed = (am_bounds[0] * SCALE, am_bounds[1] * SCALE)
+        self._pm_fixed = (pm_bounds[0] * SCALE, pm_bounds[1] * SCALE)
+        self.history = History()
+        self.trend = Trend(fast_ms=self.sensor.interval_ms)
+        self.tslog = TimeSeriesLog(log_dir)
+        self.blink_led_task = None
+
+    def start(self, delay_ms=0):
+        """
+            Starts sampling after delay_ms, so enclosures sharing the
+            event loop don't read their sensors at the same time.
+        """
+        uasyncio.create_task(self.sensor.run(delay_ms))
+
+    def _record(self):
+        """
+            Private method - adds a fresh sensor reading to the on-device
+            history and the trend, which sets when the sensor is next
+            sampled. Called by the sensor before it schedules that sample.
+        """
+        sensor = self.sensor
+        self.history.add(sensor.temp, sensor.humidity)
+        self.trend.add(sensor.humidity, sensor.timestamp)
+        sensor.interval_ms = self.trend.interval_ms
+
+    def humidity_bounds(self):
+        """(green, yellow) humidity bounds of the current schedule."""
+        if getattr(self.schedule, 'mode', None) == "AM":
+            return self.am_bounds
+        return self.pm_bounds
+
+    def time_to_target(self):
+        """
+            Seconds until the humidity rises to the green bound at its
+            current trend, None if it isn't rising.
+        """
+        return self.trend.time_to_target(self.humidity_bounds()[0])
+
+    def time_to_dry(self):
+        """
+            Seconds until the humidity falls to the yellow bound at its
+            current trend, None if it isn't falling.
+        """
+        return self.trend.time_to_dry(self.humidity_bounds()[1])
+
+    def update(self):
+        """Updates the schedule and LEDs from the latest reading."""
+        schedule = self.schedule
+        schedule.update()
+
+        # The smoothed humidity keeps the LEDs from flickering
+        humidity = self.trend.level
+        if humidity is not None and not schedule.is_target_humidity_achieved():
+            if schedule.mode == "AM":
+                green_bounds, yellow_bounds = self._am_fixed
+            else:
+                green_bounds, yellow_bounds = self._pm_fixed
+
+            leds = self.leds
+            if leds.current is leds.yellow:
+                yellow_bounds -= LED_HYSTERESIS
+
+            if (humidity >= green_bounds):
+                leds.change_color(leds.green)
+
+                schedule.set_target_humidity_achieved()
+
+                leds.turn_off(leds.green, delay=5)
+
+            elif (humidity >= yellow_bounds):
+                leds.change_color(leds.yellow)
+            elif (humidity < yellow_bounds):
+                leds.change_color(leds.red)
+
+        # If food change due, flash the LED
+        if schedule.food_change_due() and self.blink_led_task is None:
+            self.blink_led_task = uasyncio.create_task(self.blink_led())
+
+        # Cancel asyncio blink LED task if button pressed
+        if not schedule.food_change_due() and self.blink_led_task is not None:
+            self.blink_led_task = None
+
+    async def blink_led(self):
+        """Blinks the current LED on/off every half second """
+        leds = self.leds
+        while self.schedule.food_change_due():
+            if leds.current is not None:
+                leds.current.value(0 if leds.current.value() else 1)
+            await uasyncio.sleep(0.5)
+
+        # If green, turn off after 5 seconds
+        leds.turn_off(leds.green, delay=5)
+
+    def reset_food_days_counter(self):
+        self.schedule.reset_food_days_counter()
+        if self.leds.current is not None:
+            self.leds.current.value(1)  # Ensure LED is on after blinking
+
+    def log_reading(self):
+        """Logs the latest reading to flash, returns False if none yet."""
+        if not self.sensor.has_reading():
+            return False
+        self.tslog.append(self.sensor.temp, self.sensor.humidity)
+        return True
+
+
+def create_enclosures(configs, morning, night, change_food_days,
+                      time_service, readings=None):
+    """
+        Creates an Enclosure per config dict. The keys are all optional:
+            name - Shown on the display, default the enclosure number.
+            sensor - DHT22 GPIO pin, default 2.
+            leds - (red, yellow, green) GPIO pins, default (5, 21, 6).
+            am, pm - (green, yellow) humidity bounds, default (70, 60)
+                     and (80, 70).
+            pins - Blynk virtual pins for temperature and humidity,
+                   default ('v0', 'v1') for the first enclosure, then
+                   ('v2', 'v3') and so on.
+            change_food_days - Days in between checking food.
+
+        The first enclosure keeps the state.log and ts files used before
+        there could be more than one, the others get numbered ones.
+    """
+    enclosures = []
+    for i, config in enumerate(configs):
+        suffix = str(i) if i else ''
+        leds = Leds(*config.get('leds', (5, 21, 6)))
+        schedule = Schedule(morning, night,
+                            config.get('change_food_days', change_food_days),
+                            time_service, state_path=f'state{suffix}.log')
+        pins = tuple(config.get('pins', (f'v{2 * i}', f'v{2 * i + 1}')))
+        enclosures.append(Enclosure(
+            config.get('name', str(i + 1)), config.get('sensor', 2), leds,
+            schedule, pins, am_bounds=config.get('am', (70, 60)),
+            pm_bounds=config.get('pm', (80, 70)), log_dir=f'ts{suffix}',
+            readings=readings))
+    return enclosures
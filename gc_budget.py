@@ -0,0 +1,40 @@
+import gc
+import utime
+
+
+class GcBudget:
+    """
+        Runs the garbage collector when it suits the main loop.
+
+        collect_if_due() is called in idle slots, right after a fresh
+        reading has been drawn with the next sensor read seconds away,
+        and collects once budget bytes have been allocated since the last
+        collection. MicroPython's own threshold is set to twice the
+        budget, so it only collects at a random moment (eg mid DHT read)
+        when the idle slots can't keep up.
+    """
+    def __init__(self, budget=16384):
+        """
+            Parameters:
+                budget - Bytes allocated between collections.
+        """
+        self.budget = budget
+        self.collections = 0
+        # Duration of the last collection
+        self.last_us = 0
+        gc.threshold(budget * 2)
+        self.collect()
+
+    def collect(self):
+        start = utime.ticks_us()
+        gc.collect()
+        self.last_us = utime.ticks_diff(utime.ticks_us(), start)
+        self.collections += 1
+        self._base = gc.mem_alloc()
+
+    def collect_if_due(self):
+        """Collects if the budget is used up, returns True if it did."""
+        if gc.mem_alloc() - self._base < self.budget:
+            return False
+        self.collect()
+        return True
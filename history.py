@@ -0,0 +1,177 @@
+from array import array
+import utime
+
+# Readings are stored as fixed-point integers, e.g. 23.4C -> 234
+SCALE = 10
+
+
+def to_fixed(value):
+    return int(round(value * SCALE))
+
+
+def format_fixed(buffer, value, start=0):
+    """
+        Writes the fixed-point value as text with one decimal, eg 234 as
+        b'23.4', into buffer at start without allocating. Returns the
+        index after the last char written.
+    """
+    i = start
+    if value < 0:
+        buffer[i] = 0x2D  # '-'
+        i += 1
+        value = -value
+    whole = value // SCALE
+    divisor = 1
+    while divisor * 10 <= whole:
+        divisor *= 10
+    while divisor:
+        buffer[i] = 0x30 + whole // divisor % 10
+        i += 1
+        divisor //= 10
+    buffer[i] = 0x2E  # '.'
+    buffer[i + 1] = 0x30 + value % SCALE
+    return i + 2
+
+
+class RunningStats:
+    """Incremental min/max/mean of fixed-point values."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.min = 0
+        self.max = 0
+        self.sum = 0
+        self.count = 0
+
+    def add(self, value):
+        if not self.count or value < self.min:
+            self.min = value
+        if not self.count or value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+
+    def mean(self):
+        """Fixed-point mean, None if no values were added."""
+        if not self.count:
+            return None
+        return self.sum // self.count
+
+
+class WindowAggregate:
+    """
+        Temperature and humidity stats over a fixed (tumbling) time window.
+
+        The window in progress is in temp/humidity and the last completed
+        window in last_temp/last_humidity. Each insert is O(1).
+    """
+    def __init__(self, period_s):
+        self.period_s = period_s
+        self.start = None
+        self.temp = RunningStats()
+        self.humidity = RunningStats()
+        self.last_temp = RunningStats()
+        self.last_humidity = RunningStats()
+
+    def add(self, temp, humidity, timestamp):
+        start = timestamp - timestamp % self.period_s
+        if self.start is None:
+            self.start = start
+        elif start != self.start:
+            # Window finished - keep it as the last window. The stats
+            # objects are swapped so nothing is allocated.
+            if start - self.start == self.period_s:
+                self.last_temp, self.temp = self.temp, self.last_temp
+                self.last_humidity, self.humidity = (self.humidity,
+                                                     self.last_humidity)
+            else:
+                # Gap of more than a window, the last window is empty
+                self.last_temp.reset()
+                self.last_humidity.reset()
+            self.temp.reset()
+            self.humidity.reset()
+            self.start = start
+
+        self.temp.add(temp)
+        self.humidity.add(humidity)
+
+
+class History:
+    """
+        Fixed-memory history of readings.
+
+        Samples are kept in preallocated ring buffers of fixed-point
+        temperature and humidity (array 'h') and timestamps in seconds
+        (array 'I'), so adding a sample does not allocate. Every sample
+        also updates the window aggregates.
+    """
+    def __init__(self, capacity=720, sample_period_s=30,
+                 windows=(60, 900, 3600)):
+        """
+            Parameters:
+                capacity - Number of samples kept in the ring buffers.
+                sample_period_s - Minimum time between stored samples.
+                                  Window aggregates still see every sample.
+                windows - Window lengths in seconds to aggregate over.
+        """
+        self.capacity = capacity
+        self.sample_period_s = sample_period_s
+        self.temps = array('h', bytes(2 * capacity))
+        self.humidities = array('h', bytes(2 * capacity))
+        self.timestamps = array('I', bytes(4 * capacity))
+        self._next = 0
+        self._count = 0
+        # Samples stored since boot, including those overwritten since
+        self.stored = 0
+        self.windows = [WindowAggregate(period) for period in windows]
+
+    def __len__(self):
+        return self._count
+
+    def add(self, temp, humidity, timestamp=None):
+        """
+            Adds a reading.
+
+            temp and humidity are in degrees/percent, timestamp in seconds
+            (defaults to utime.time()). Returns True if it was stored in
+            the ring buffer.
+        """
+        if timestamp is None:
+            timestamp = utime.time()
+        temp = to_fixed(temp)
+        humidity = to_fixed(humidity)
+
+        for window in self.windows:
+            window.add(temp, humidity, timestamp)
+
+        if (self._count and timestamp - self.timestamps[self._last()]
+                < self.sample_period_s):
+            return False
+
+        i = self._next
+        self.temps[i] = temp
+        self.humidities[i] = humidity
+        self.timestamps[i] = timestamp
+        self._next = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        self.stored += 1
+        return True
+
+    def index(self, n):
+        """Ring buffer index of the n-th stored sample, 0 being the oldest."""
+        if not 0 <= n < self._count:
+            raise IndexError('history index out of range')
+        return (self._next - self._count + n) % self.capacity
+
+    def _last(self):
+        return (self._next - 1) % self.capacity
+
+    def window(self, period_s):
+        """Returns the WindowAggregate with the given period."""
+        for window in self.windows:
+            if window.period_s == period_s:
+                return window
+        raise ValueError(f'No {period_s}s window')
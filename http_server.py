@@ -0,0 +1,250 @@
+import uasyncio
+
+_REASONS = {200: b'OK', 400: b'Bad Request', 404: b'Not Found',
+            405: b'Method Not Allowed', 500: b'Internal Server Error',
+            503: b'Service Unavailable'}
+
+# Sent to clients over the connection limit without reading the request
+_BUSY = b'HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n'
+
+
+class ResponseBuffer:
+    """
+        Preallocated buffer a response body is rendered into.
+
+        Parts are copied in place, so rendering doesn't build up strings.
+        Raises OverflowError when the body doesn't fit.
+    """
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.length = 0
+
+    def clear(self):
+        self.length = 0
+
+    def add(self, *parts):
+        """Adds str, bytes or numbers."""
+        for part in parts:
+            if not isinstance(part, (bytes, bytearray)):
+                part = str(part).encode()
+            end = self.length + len(part)
+            if end > len(self.buffer):
+                raise OverflowError('Response too large')
+            self.buffer[self.length:end] = part
+            self.length = end
+
+    def add_json(self, value):
+        """Adds a JSON string, number, boolean or null."""
+        if value is None:
+            self.add(b'null')
+        elif value is True:
+            self.add(b'true')
+        elif value is False:
+            self.add(b'false')
+        elif isinstance(value, str):
+            self.add(b'"', value.replace('\\', '\\\\').replace('"', '\\"'),
+                     b'"')
+        else:
+            self.add(value)
+
+    def add_fixed(self, value, scale=10):
+        """
+            Adds a fixed-point integer as a decimal, eg 234 as 23.4 or
+            with scale 100 as 2.34.
+        """
+        if value < 0:
+            self.add(b'-')
+            value = -value
+        whole, fraction = divmod(value, scale)
+        self.add(whole, b'.')
+        # Leading zeros of the fraction
+        digit = scale // 10
+        while digit > 1 and fraction < digit:
+            self.add(b'0')
+            digit //= 10
+        self.add(fraction)
+
+    def body(self):
+        return self.view[:self.length]
+
+
+class HttpServer:
+    """
+        Minimal HTTP/1.0 server for small GET endpoints on the LAN.
+
+        Handlers are registered per path with route and render the body
+        into a ResponseBuffer. At most max_clients connections are served
+        at once, each with its own preallocated buffer, others get a 503.
+        A client has timeout_ms to send its request and take the response,
+        so slow clients can't hold up the event loop. Bodies that can
+        outgrow the buffer are streamed, sent in parts as they render.
+    """
+    def __init__(self, port=80, max_clients=2, timeout_ms=3000,
+                 buffer_size=4096):
+        """
+            Parameters:
+                port - TCP port to listen on.
+                max_clients - Connections served at the same time.
+                timeout_ms - Time a client has for the whole exchange.
+                buffer_size - Largest response body in bytes, or part of a
+                              streamed one.
+        """
+        self.port = port
+        self.max_clients = max_clients
+        self.timeout_ms = timeout_ms
+        self.routes = {}
+        # (head, body) buffers of each connection slot
+        self._buffers = [(ResponseBuffer(128), ResponseBuffer(buffer_size))
+                         for _ in range(max_clients)]
+        self._server = None
+
+        # Statistics
+        self.clients = 0
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def route(self, path, handler, content_type='application/json',
+              streamed=False):
+        """
+            Serves GET path with handler(buffer, params), which renders the
+            body into buffer. params is a dict of the query string.
+
+            A streamed handler is a coroutine function handler(buffer,
+            params, send) that awaits send() to write out what it rendered
+            so far, so the body can be larger than the buffer. The response
+            has no Content-Length, closing the connection ends it.
+        """
+        self.routes[path] = (handler, content_type, streamed)
+
+    async def start(self):
+        self._server = await uasyncio.start_server(
+            self._serve, '0.0.0.0', self.port, backlog=self.max_clients)
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _serve(self, reader, writer):
+        if not self._buffers:
+            # Over the connection limit
+            self.rejected += 1
+            try:
+                writer.write(_BUSY)
+                await uasyncio.wait_for_ms(writer.drain(), self.timeout_ms)
+            except Exception:
+                pass
+            await self._close(writer)
+            return
+
+        out = self._buffers.pop()
+        self.clients += 1
+        try:
+            await uasyncio.wait_for_ms(self._exchange(reader, writer, out),
+                                       self.timeout_ms)
+        except uasyncio.TimeoutError:
+            self.timeouts += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"HTTP client error: {e}")
+        finally:
+            self.clients -= 1
+            self._buffers.append(out)
+            await self._close(writer)
+
+    async def _close(self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    async def _exchange(self, reader, writer, out):
+        """Private method - reads one request and sends the response."""
+        line = await reader.readline()
+        # Skip the headers, nothing here needs them
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+
+        parts = line.split()
+        if len(parts) < 2:
+            return await self._respond(writer, out, 400)
+        self.requests += 1
+        if parts[0] != b'GET':
+            return await self._respond(writer, out, 405)
+
+        path, _, query = parts[1].decode().partition('?')
+        route = self.routes.get(path)
+        if route is None:
+            return await self._respond(writer, out, 404)
+        handler, content_type, streamed = route
+
+        params = {}
+        for pair in query.split('&'):
+            name, _, value = pair.partition('=')
+            if name:
+                params[name] = value
+
+        head, body = out
+        # The head is only filled once a streamed response has started
+        head.clear()
+        body.clear()
+        try:
+            if streamed:
+                send = self._sender(writer, out, content_type)
+                await handler(body, params, send)
+                return await send()
+            handler(body, params)
+        except Exception as e:
+            if head.length:
+                # Part of the body is out, all that's left is to cut it short
+                raise
+            if isinstance(e, ValueError):
+                return await self._respond(writer, out, 400)
+            print(f"HTTP handler error on {path}: {e}")
+            return await self._respond(writer, out, 500)
+        await self._respond(writer, out, 200, content_type)
+
+    def _sender(self, writer, out, content_type):
+        """
+            Private method - returns send() of a streamed response, which
+            writes out the body rendered so far and empties the buffer.
+            The head goes out with the first part.
+        """
+        head, body = out
+
+        async def send():
+            if not head.length:
+                self._head(head, 200, content_type)
+                writer.write(head.body())
+            writer.write(body.body())
+            # The buffers are only reused once this returns
+            await writer.drain()
+            body.clear()
+        return send
+
+    def _head(self, head, status, content_type, length=None):
+        """Private method - renders the response head into head."""
+        head.clear()
+        head.add(b'HTTP/1.0 ', status, b' ', _REASONS[status],
+                 b'\r\nContent-Type: ', content_type)
+        if length is not None:
+            head.add(b'\r\nContent-Length: ', length)
+        head.add(b'\r\nConnection: close\r\n\r\n')
+
+    async def _respond(self, writer, out, status, content_type='text/plain'):
+        head, body = out
+        if status != 200:
+            body.clear()
+            body.add(_REASONS[status], b'\n')
+        self._head(head, status, content_type, body.length)
+        writer.write(head.body())
+        writer.write(body.body())
+        # The buffers are only reused once this returns
+        await writer.drain()
@@ -0,0 +1,195 @@
+from array import array
+import gc
+import uasyncio
+import utime
+
+# Bucket i of a histogram counts durations below 2**(i+1) us, the last
+# bucket everything from about 0.5 s up
+BUCKETS = 20
+
+
+class Histogram:
+    """Fixed-size log2 histogram of durations in microseconds."""
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, us):
+        bucket = 0
+        value = us >> 1
+        while value and bucket < BUCKETS - 1:
+            value >>= 1
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def mean(self):
+        return self.total // self.count if self.count else 0
+
+    def percentile(self, p):
+        """Upper bound in us of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0
+        target = self.count * p // 100
+        seen = 0
+        for bucket in range(BUCKETS):
+            seen += self.counts[bucket]
+            if seen > target:
+                return min(2 << bucket, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+        Timing spans, event loop lag and heap telemetry.
+
+        Spans are added by wrapping functions with instrument(), so when
+        instrumentation is off nothing is wrapped and there is no cost.
+    """
+    def __init__(self):
+        self.spans = {}
+        self.loop_lag = Histogram()
+        self.mem_free_min = None
+        self.mem_alloc_max = 0
+        self.gc_count = 0
+        self._last_alloc = 0
+
+    def span(self, name):
+        """Returns the histogram of the named span, creating it."""
+        histogram = self.spans.get(name)
+        if histogram is None:
+            histogram = self.spans[name] = Histogram()
+        return histogram
+
+    def wrap(self, function, name):
+        """Returns function timed into the named span."""
+        histogram = self.span(name)
+        ticks_us = utime.ticks_us
+        ticks_diff = utime.ticks_diff
+
+        def timed(*args, **kwargs):
+            start = ticks_us()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.add(ticks_diff(ticks_us(), start))
+        return timed
+
+    def wrap_async(self, function, name):
+        """Returns coroutine function timed into the named span."""
+        histogram = self.span(name)
+        ticks_us = utime.ticks_us
+        ticks_diff = utime.ticks_diff
+
+        async def timed(*args, **kwargs):
+            start = ticks_us()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.add(ticks_diff(ticks_us(), start))
+        return timed
+
+    def instrument(self, owner, attr, name=None, is_async=False):
+        """Replaces owner.attr (eg a class method) with a timed version."""
+        function = getattr(owner, attr)
+        wrap = self.wrap_async if is_async else self.wrap
+        setattr(owner, attr, wrap(function, name or attr))
+
+    def sample_memory(self):
+        """Records heap usage. A drop in allocated memory means a GC ran."""
+        alloc = gc.mem_alloc()
+        free = gc.mem_free()
+        if alloc < self._last_alloc:
+            self.gc_count += 1
+        self._last_alloc = alloc
+        if alloc > self.mem_alloc_max:
+            self.mem_alloc_max = alloc
+        if self.mem_free_min is None or free < self.mem_free_min:
+            self.mem_free_min = free
+
+    async def monitor(self, interval_ms=100):
+        """
+            Measures event loop lag, how late a sleep wakes up compared
+            to when it was scheduled, and samples the heap.
+        """
+        while True:
+            start = utime.ticks_us()
+            await uasyncio.sleep_ms(interval_ms)
+            late = utime.ticks_diff(utime.ticks_us(), start) - interval_ms * 1000
+            self.loop_lag.add(late if late > 0 else 0)
+            self.sample_memory()
+
+    def summary(self):
+        """Returns the metrics as a flat dict of numbers."""
+        values = {
+            'loop_lag_mean_us': self.loop_lag.mean(),
+            'loop_lag_p99_us': self.loop_lag.percentile(99),
+            'loop_lag_max_us': self.loop_lag.max,
+            'mem_free': gc.mem_free(),
+            'mem_free_min': self.mem_free_min or 0,
+            'mem_alloc_max': self.mem_alloc_max,
+            'gc_count': self.gc_count,
+        }
+        for name, histogram in self.spans.items():
+            values[f'{name}_count'] = histogram.count
+            values[f'{name}_mean_us'] = histogram.mean()
+            values[f'{name}_p99_us'] = histogram.percentile(99)
+            values[f'{name}_max_us'] = histogram.max
+        return values
+
+    def report(self):
+        """Prints the summary over serial."""
+        for name, value in sorted(self.summary().items()):
+            print(f'{name}: {value}')
+
+    async def report_every(self, interval_s):
+        while True:
+            await uasyncio.sleep(interval_s)
+            self.report()
+
+
+class BootTimer:
+    """
+        When each boot stage ended, in ms since reset (ticks_ms starts at
+        0), so a slow boot shows where the time went. Always on, it is a
+        handful of ticks_ms calls.
+    """
+    def __init__(self):
+        # (stage, ms since reset) in the order the stages ended
+        self.stages = []
+
+    def mark(self, stage):
+        """Records that stage ended now, only the first time."""
+        for name, _ in self.stages:
+            if name == stage:
+                return
+        ms = utime.ticks_ms()
+        self.stages.append((stage, ms))
+        print(f'Boot: {stage} at {ms}ms')
+
+    def get(self, stage):
+        """Ms since reset stage ended at, None if it hasn't yet."""
+        for name, ms in self.stages:
+            if name == stage:
+                return ms
+        return None
+
+
+# Boot stages of this run, marked by main
+boot = BootTimer()
+
+# The active Metrics, None while instrumentation is off
+metrics = None
+
+
+def enable():
+    global metrics
+    if metrics is None:
+        metrics = Metrics()
+    return metrics
@@ -1,45 +1,118 @@
-import dht
 import machine
+import random
 import ssd1306
-import ntptime
-import network
+import sys
 import utime
 import uasyncio
-import urequests
+from micropython import const
 
-import micropython_ota
+import instrumentation
+import ota_slots
+from gc_budget import GcBudget
+from history import format_fixed
+from sparkline import Sparkline
 from button_click_handler import ButtonClickHandler
+from sensor import Sensor, DHT22_MIN_INTERVAL_MS
+from wifi_manager import WifiManager
+from schedule import Schedule
+from enclosure import create_enclosures
+from time_service import TimeService
 
 from env import variables
 
-sta_if = network.WLAN(network.WLAN.IF_STA)
+# Modules only some setups need (OTA, MQTT, the status server, low power)
+# are imported where they are used, so they don't slow down the boot
+instrumentation.boot.mark('imports')
 
-red = machine.Pin(5, machine.Pin.OUT)
-yellow = machine.Pin(21, machine.Pin.OUT)
-green = machine.Pin(6, machine.Pin.OUT)
+# Without SSID & PASS in env.py the device runs offline
+wifi = WifiManager(variables.get('SSID'), variables.get('PASS'))
 
-current_led = None
+# Local time is UTC_OFFSET hours from UTC, plus an hour in summer when a
+# DST rule ('EU' or 'US') is set
+time_service = TimeService(
+    wifi, host=variables.get('NTP_HOST', 'pool.ntp.org'),
+    utc_offset_s=int(variables.get('UTC_OFFSET', 0) * 3600),
+    dst=variables.get('DST'))
+
+# Set up in main() when LOW_POWER is on in env.py
+power = None
+
+enclosures = []
+# Index of the enclosure on the display and when it was first shown
+page = 0
+page_start = 0
+# Event set in main() once the first reading is on the display
+reading_shown = None
 
 morning = variables['MORNING']  # eg 8 for 8AM
 night = variables['NIGHT']  # eg 20 for 8PM
 
-BLYNK_TOKEN = variables['BLYNK_AUTH_TOKEN']
-BLYNK_API_URL = (
-    f'https://blynk.cloud/external/api/batch/update?token={BLYNK_TOKEN}')
+BLYNK_TOKEN = variables.get('BLYNK_AUTH_TOKEN')
+
+# Where readings are sent: 'blynk' (default) or 'mqtt' to the broker at
+# MQTT_HOST
+TELEMETRY = variables.get('TELEMETRY', 'blynk')
+
+# One dict per enclosure, see create_enclosures. A single enclosure
+# wired as before when not set in env.py
+ENCLOSURES = variables.get('ENCLOSURES', [{}])
+
+# Time each enclosure is shown on the display
+PAGE_MS = const(5000)
+
+# Port to serve readings, history and metrics on over the LAN, off when
+# not set in env.py
+HTTP_PORT = variables.get('HTTP_PORT')
 
+# Hours between background update checks, each moved by up to a tenth
+# either way so a fleet doesn't check the OTA host all at once
+OTA_INTERVAL_H = variables.get('OTA_INTERVAL_H', 6)
 
-class Sensor:
-    """The dht humidity and temperature sensor."""
+# Each enclosure's reading is followed by a plot of its humidity and
+# temperature over the last hour, unless turned off in env.py
+SPARKLINE = variables.get('SPARKLINE', True)
+VIEWS = 2 if SPARKLINE else 1
+_VIEW_READING = const(0)
+_VIEW_HISTORY = const(1)
 
-    def __init__(self, pin):
-        self.dht = dht.DHT22(machine.Pin(pin))
-        self.update()
+# Bytes the main loop lets be allocated before it collects garbage in
+# an idle slot
+GC_BUDGET = variables.get('GC_BUDGET', 16384)
 
-    def update(self):
-        """Calls dht measure and updates temp & humidity values"""
-        self.dht.measure()
-        self.temp = self.dht.temperature()
-        self.humidity = self.dht.humidity()
+# Blynk virtual pins to send instrumentation metrics to when it is on,
+# eg {'v10': 'loop_lag_max_us', 'v11': 'mem_free_min'}
+METRICS_PINS = variables.get('METRICS_PINS', {})
+
+
+# Serial log line of the reading on the display, its values (right
+# aligned, ending at _LOG_TEMP_END and _LOG_HUMIDITY_END) are rewritten
+# in place
+_log_line = bytearray(('Temperature:      °C, Humidity:      %\n').encode())
+_LOG_TEMP_END = const(18)
+_LOG_HUMIDITY_END = const(38)
+_LOG_FIELD = const(5)
+
+
+def _log_field(text, length, end):
+    """Copies length bytes of text into the log line, right aligned."""
+    start = end - _LOG_FIELD
+    pad = _LOG_FIELD - length
+    for i in range(_LOG_FIELD):
+        _log_line[start + i] = 0x20 if i < pad else text[i - pad]
+
+
+def _format_reading(text, value, unit):
+    """
+        Writes a fixed-point reading and its unit char into text, '--'
+        when there is no reading yet. Returns the length.
+    """
+    if value is None:
+        text[0] = text[1] = 0x2D  # '-'
+        end = 2
+    else:
+        end = format_fixed(text, value)
+    text[end] = unit
+    return end + 1
 
 
 class Display():
@@ -54,12 +127,101 @@ class Display():
         self.display.fill(0)
         self.display.show()
 
-    def add_text(self, text, y):
-        start_x = int((128 - len(text) * 24) / 2)
+        # Reused text of the reading, eg b'23.4c' and b'56.7%'
+        self._temp_text = bytearray(8)
+        self._humidity_text = bytearray(8)
+        # Enclosure, view and reading (fixed-point) on the display
+        self._enclosure = None
+        self._view = None
+        self._temp = None
+        self._humidity = None
+        # Enclosure -> its Sparkline, made the first time it is shown
+        self._sparklines = {}
+
+    def add_label(self, text):
+        self.display.text(text, 0, 0)
+
+    def add_text(self, text, y, length=None):
+        if length is None:
+            length = len(text)
+        start_x = (128 - length * 24) // 2
 
         if start_x < 0:
             start_x = 0
-        self.display.write_text(text, start_x, y, size=3)
+        self.display.write_text(text, start_x, y, size=3, length=length)
+
+    def show_reading(self, enclosure, label=False):
+        """
+            Draws the enclosure's latest reading, and its name when label
+            is set. Returns False without drawing if it is already shown,
+            the text is drawn from reused buffers so neither allocates.
+        """
+        sensor = enclosure.sensor
+        temp = sensor.temp_fixed
+        humidity = sensor.humidity_fixed
+        if (enclosure is self._enclosure and self._view == _VIEW_READING and
+                temp == self._temp and humidity == self._humidity):
+            return False
+        self._enclosure = enclosure
+        self._view = _VIEW_READING
+        self._temp = temp
+        self._humidity = humidity
+
+        self.reset()
+        if label:
+            self.add_label(enclosure.name)
+        temp_length = _format_reading(self._temp_text, temp, 0x63)  # 'c'
+        self.add_text(self._temp_text, 7, temp_length)
+        humidity_length = _format_reading(self._humidity_text, humidity,
+                                          0x25)  # '%'
+        self.add_text(self._humidity_text, 41, humidity_length)
+        self.show()
+
+        # Only logged when it changes, from the same buffers without the
+        # unit
+        _log_field(self._temp_text, temp_length - 1, _LOG_TEMP_END)
+        _log_field(self._humidity_text, humidity_length - 1,
+                   _LOG_HUMIDITY_END)
+        getattr(sys.stdout, 'buffer', sys.stdout).write(_log_line)
+        return True
+
+    def show_history(self, enclosure, label=False):
+        """
+            Draws the enclosure's sparkline (see sparkline) with its
+            latest reading in small text above, and its name when label
+            is set. Returns False without drawing if nothing changed.
+            Each new sample costs a column of drawing, the plot is copied
+            onto the frame and show() sends only what changed.
+        """
+        sparkline = self._sparklines.get(enclosure)
+        if sparkline is None:
+            sparkline = Sparkline(enclosure.history)
+            self._sparklines[enclosure] = sparkline
+        sensor = enclosure.sensor
+        temp = sensor.temp_fixed
+        humidity = sensor.humidity_fixed
+        new = sparkline.update()
+        if (not new and enclosure is self._enclosure and
+                self._view == _VIEW_HISTORY and temp == self._temp and
+                humidity == self._humidity):
+            return False
+        self._enclosure = enclosure
+        self._view = _VIEW_HISTORY
+        self._temp = temp
+        self._humidity = humidity
+
+        display = self.display
+        self.reset()
+        sparkline.blit(display, 0, 8)
+        length = _format_reading(self._humidity_text, humidity, 0x25)
+        display.write_text(self._humidity_text, 0, 0, 1, length=length)
+        length = _format_reading(self._temp_text, temp, 0x63)
+        display.write_text(self._temp_text, 128 - length * 8, 0, 1,
+                           length=length)
+        if label:
+            display.text(enclosure.name, 56, 0)
+        self.show()
+        return True
 
     def reset(self):
         self.display.fill(0)
@@ -73,232 +235,325 @@ class Display():
         self.display.show()
 
 
-def connect_to_wifi():
-    # Connect to wifi
-    try:
-        sta_if.active(True)
-        ssid = variables['SSID']
-        password = variables['PASS']
-        if ssid is None or password is None:
-            raise Exception(("Create env.py with a dict 'variables'"
-                            "containing SSID & PASS for Wifi."))
-        sta_if.connect(variables['SSID'], variables['PASS'])
-        while not sta_if.isconnected():
-            print("connecting...")
-            utime.sleep(1)
-        print('network info:', sta_if.ifconfig())
-    except Exception as e:
-        print(f"Failed to connect to internet: {e}")
-
-
-def disconnect_from_wifi():
-    # Close wifi connection
-    sta_if.active(False)
-
-
-def check_for_updates():
-    # Check the nginx server for new version of env.py and main.py files
+async def check_for_updates():
+    # Check the nginx server for a new version and install the files that
+    # changed according to its manifest in the inactive slot, then restart
+    # into it (see ota_slots)
+    import micropython_ota
     ota_host = variables['OTA_HOST']
     project_name = variables['OTA_PROJECT_NAME']
-    filenames = ['env.py', 'main.py']
 
-    micropython_ota.ota_update(ota_host, project_name, filenames,
-                               use_version_prefix=False,
-                               hard_reset_device=True,
-                               soft_reset_device=False, timeout=5)
+    # A new version is kept once it has shown a reading and reached the
+    # OTA host, so a release that breaks the network can't be kept and
+    # never be updated again. Until then the inactive slot holds the
+    # version to roll back to and nothing is installed over it.
+    if ota_slots.in_trial():
+        await micropython_ota.check_version(
+            ota_host, project_name, timeout=5, directory=ota_slots.active())
+        if micropython_ota.reached:
+            await reading_shown.wait()
+            ota_slots.confirm()
+        return
+
+    slot = ota_slots.inactive()
+    installed = await micropython_ota.ota_update(
+        ota_host, project_name, use_version_prefix=False,
+        hard_reset_device=False, soft_reset_device=False, timeout=5,
+        directory=ota_slots.active(), install_dir=slot,
+        skip_version=ota_slots.failed_version())
+    if installed:
+        ota_slots.activate(slot)
+        print('Hard-resetting device...')
+        machine.reset()
+
+
+async def check_for_updates_every(interval_s):
+    """
+        Checks for updates in the background every interval_s, give or
+        take a tenth.
+    """
+    spread_ms = interval_s * 100
+    while True:
+        await uasyncio.sleep_ms(interval_s * 1000 +
+                                random.randint(-spread_ms, spread_ms))
+        try:
+            async with wifi:
+                await check_for_updates()
+        except OSError as e:
+            print(f"Failed to connect to internet: {e}")
 
 
 def button_clicked(time_held_ms):
-    """Sets days_since_fed to 0 on button click event"""
-    global schedule
-    schedule.reset_food_days_counter()
-
-
-class Schedule():
-    def __init__(self):
-        self.sync_time()
-
-        # Whether target humidity was achieved after mode changed
-        self._target_humidity_achieved = False
-
-        self.days_since_fed = variables['CHANGE_FOOD_DAYS']
-
-        self.update()
-
-    def set_target_humidity_achieved(self):
-        self._target_humidity_achieved = True
-
-    def is_target_humidity_achieved(self):
-        return self._target_humidity_achieved
-
-    def food_change_due(self):
-        return self.days_since_fed >= variables['CHANGE_FOOD_DAYS']
-
-    def reset_food_days_counter(self):
-        self.days_since_fed = 0
-        current_led.value(1)  # Ensure LED is on after blinking
+    """Sets days_since_fed to 0 for the enclosure on the display"""
+    enclosures[page // VIEWS].reset_food_days_counter()
+    if power is not None:
+        power.activity()  # Turn the display back on
+
+
+def create_sink():
+    """Creates the TelemetrySink set by TELEMETRY in env.py."""
+    if TELEMETRY == 'mqtt':
+        from async_mqtt import MqttClient
+        from telemetry import MqttSink
+        client = MqttClient(
+            variables.get('MQTT_CLIENT_ID', 'vivarium'),
+            variables['MQTT_HOST'], port=variables.get('MQTT_PORT', 1883),
+            user=variables.get('MQTT_USER'),
+            password=variables.get('MQTT_PASS'))
+        # Holds the wifi up while connected
+        uasyncio.create_task(client.run(wifi))
+        return MqttSink(client, topic=variables.get('MQTT_TOPIC', 'vivarium'),
+                        qos=variables.get('MQTT_QOS', 1))
+    from telemetry import BlynkSink
+    return BlynkSink(BLYNK_TOKEN, METRICS_PINS)
+
+
+async def send_telemetry(sink, interval=30):
+    """
+        Log every enclosure's temperature and humidity readings to flash
+        and send them to the sink to be viewed remotely.
 
-    def update(self):
-        current_mode = ("AM" if self.get_time_hour() >= morning and
-                        self.get_time_hour() < night else "PM")
+        parameter: [int] interval (in seconds) between logged readings
+    """
+    while True:
+        due = False
+        for enclosure in enclosures:
+            if enclosure.log_reading() and sink.due(enclosure):
+                due = True
+
+        # Only bring the wifi up when something is due, then send every
+        # enclosure's readings over the one connection
+        if due:
+            try:
+                async with wifi:
+                    sent = await send_unsent(sink)
+            except OSError as e:
+                print(f"Failed to connect to internet: {e}")
+                sent = False
+            if not sent:
+                # Also the enclosures that weren't tried, so the wifi
+                # isn't brought up again for them on the next pass
+                for enclosure in enclosures:
+                    sink.failed(enclosure)
+
+        await uasyncio.sleep(interval)
+
+
+async def send_unsent(sink):
+    """
+        Sends the readings of every enclosure that the sink hasn't sent.
+        Returns False if some could not be sent.
+    """
+    try:
+        for enclosure in enclosures:
+            if not await sink.send(enclosure):
+                return False
 
-        # Set inital mode and return
-        if not hasattr(self, 'mode'):
-            self.mode = current_mode
-            return
+        metrics = instrumentation.metrics
+        if metrics is not None:
+            await sink.send_metrics(metrics.summary())
+        return True
+    finally:
+        sink.done()
 
-        # If the mode is to be changed
-        if self.mode != current_mode:
-            self.mode = current_mode
-            self._target_humidity_achieved = False
-            self.days_since_fed += 0.5
 
-    def sync_time(self):
-        # Sync time
+async def serve_status(port):
+    """
+        Keeps the wifi up and serves the status pages (see status_pages)
+        on the LAN, starting again if the connection drops.
+    """
+    from http_server import HttpServer
+    from status_pages import StatusPages
+    server = HttpServer(port)
+    StatusPages(enclosures, wifi, time_service, server,
+                boot=instrumentation.boot)
+    while True:
         try:
-            print("Synchronizing time with NTP...")
-            ntptime.settime()  # Synchronize with NTP server
-            print("Time synchronized!")
-        except Exception as e:
-            print(f"Failed to sync time: {e}")
-
-    def get_time_hour(self):
-        current_time = utime.localtime()
-        return current_time[3]
-
-    def get_time_minutes(self):
-        current_time = utime.localtime()
-        return current_time[4]
-
-
-def change_led_color(led):
+            async with wifi:
+                await server.start()
+                print(f"Serving status on port {port}")
+                try:
+                    while wifi.isconnected():
+                        await uasyncio.sleep(10)
+                finally:
+                    server.close()
+        except OSError as e:
+            print(f"Failed to connect to internet: {e}")
+        await uasyncio.sleep(30)
+
+
+def start_instrumentation():
     """
-        Change the LED to the new led value
-
-        parameter: led (green, yellow, red)
+        Times the hot paths, watches event loop lag and the heap, and
+        prints a summary over serial every 5 minutes.
     """
-    global current_led
-    # Turn the current LED off or leave on and return
-    if current_led is not None:
-        if current_led is led:
-            return
-        else:
-            current_led.value(0)
-
-    # Turn the 'led' argument that was passed
-    led.value(1)
+    import micropython_ota
+    from blynk_uploader import BlynkUploader
+    metrics = instrumentation.enable()
+    metrics.instrument(Sensor, 'update', 'sensor_update')
+    metrics.instrument(ssd1306.SSD1306, 'write_text')
+    metrics.instrument(ssd1306.SSD1306, 'show', 'display_show')
+    metrics.instrument(Schedule, 'update', 'schedule_update')
+    metrics.instrument(BlynkUploader, 'flush', 'blynk_flush', is_async=True)
+    metrics.instrument(micropython_ota, 'ota_update', is_async=True)
+    uasyncio.create_task(metrics.monitor())
+    uasyncio.create_task(metrics.report_every(300))
+    return metrics
+
+
+async def start_network():
+    """
+        Checks for updates and sets the clock once the wifi is up, then
+        keeps the clock in sync. Runs in the background so the readings
+        are up on the display without waiting for the network.
+    """
+    try:
+        async with wifi:
+            instrumentation.boot.mark('wifi')
+            # Check for updates on boot using micropython-ota
+            await check_for_updates()
+            instrumentation.boot.mark('ota_check')
 
-    # Set current_led to 'led'
-    current_led = led
+            print("Synchronizing time with NTP...")
+            await time_service.sync()
+            instrumentation.boot.mark('time_sync')
+    except OSError as e:
+        print(f"Failed to connect to internet: {e}")
 
+    uasyncio.create_task(check_for_updates_every(int(OTA_INTERVAL_H * 3600)))
 
-async def blink_led():
-    """Blinks the current LED on/off every half second """
-    global current_led, schedule
-    while schedule.food_change_due():
-        current_led.value(0 if current_led.value() else 1)
-        await uasyncio.sleep(0.5)
-    
-    # If green, turn off after 5 seconds
-    turn_off_led(green, delay=5)
+    # Keep the clock right from now on, resyncing in the background
+    await time_service.run()
 
 
-async def send_data_to_blynk(sensor, interval=30):
+def refresh(display):
     """
-        Send temperature and humidity data to Blynk server to be viewed on app.
-
-        parameter: [int] interval (in minutes) to the send data
+        One pass of the main loop: pages through the enclosures' readings
+        and sparklines on the display, draws the one shown and updates
+        every enclosure's schedule and LEDs. Returns whether every target
+        humidity is achieved. Doesn't allocate once running.
     """
-    while True:
-        connect_to_wifi()
-
-        url = f'{BLYNK_API_URL}&v0={sensor.temp}&v1={sensor.humidity}'
-        urequests.get(url)
-
-        disconnect_from_wifi()
+    global page, page_start
+    if utime.ticks_diff(utime.ticks_ms(), page_start) >= PAGE_MS:
+        page = (page + 1) % (len(enclosures) * VIEWS)
+        page_start = utime.ticks_ms()
 
-        await uasyncio.sleep(60 * interval)  # Update every 30 minutes
+    enclosure = enclosures[page // VIEWS]
+    if page % VIEWS == _VIEW_HISTORY:
+        display.show_history(enclosure, len(enclosures) > 1)
+    else:
+        display.show_reading(enclosure, len(enclosures) > 1)
 
-def turn_off_led(LED, delay=0): 
-    async def task_turn_of_led():
-        await uasyncio.sleep(delay)
-        LED.value(0)  # Turn off LED
+    all_achieved = True
+    for enclosure in enclosures:
+        enclosure.update()
+        if not enclosure.schedule.is_target_humidity_achieved():
+            all_achieved = False
+    return all_achieved
 
-    uasyncio.create_task(task_turn_of_led())
 
 async def main():
     """
         Contains the main loop and initialization code.
     """
-    connect_to_wifi()
-
-    # Check for updates on boot using micropython-ota
-    check_for_updates()
-
-    global schedule
-    schedule = Schedule()
-
-    disconnect_from_wifi()
+    # Off by default, nothing is timed unless turned on in env.py
+    metrics = None
+    if variables.get('INSTRUMENTATION'):
+        metrics = start_instrumentation()
+    loop_span = metrics.span('main_loop') if metrics else None
 
+    boot = instrumentation.boot
     display = Display()
+    boot.mark('display')
 
-    # Setup button click handler
-    ButtonClickHandler(7, button_clicked)
-
-    blink_led_task = None
+    # Pulsed by every enclosure's sensor
+    readings = uasyncio.Event()
 
-    sensor = Sensor(2)  # DHT22 sensor on GPIO2
-
-    # Create a task to continuously send data to Blynk
-    uasyncio.create_task(send_data_to_blynk(sensor))
+    global enclosures, page_start, power, reading_shown
+    reading_shown = uasyncio.Event()
+    enclosures = create_enclosures(
+        ENCLOSURES, morning, night, variables['CHANGE_FOOD_DAYS'],
+        time_service, readings=readings)
 
+    # Setup button click handler
+    low_power = variables.get('LOW_POWER', False)
+    button = ButtonClickHandler(7, button_clicked, wake_from_sleep=low_power)
+    uasyncio.create_task(button.run())
+
+    # Stagger the sensor reads so they don't contend
+    stagger_ms = DHT22_MIN_INTERVAL_MS // len(enclosures)
+    for i, enclosure in enumerate(enclosures):
+        enclosure.start(i * stagger_ms)
+
+    # The network comes up while the first reading is taken
+    uasyncio.create_task(start_network())
+
+    if low_power:
+        from power import PowerManager
+        power = PowerManager(display.display,
+                             [enclosure.sensor for enclosure in enclosures],
+                             wifi, button)
+        if HTTP_PORT or TELEMETRY == 'mqtt':
+            print('LOW_POWER has no effect, HTTP_PORT or MQTT keep the wifi on')
+
+    # The first enclosure is shown first, the others read before paging
+    await enclosures[0].sensor.wait_for_reading()
+    boot.mark('first_reading')
+
+    # Create a task to continuously send data to Blynk or MQTT. Their
+    # modules, and the status pages', are only imported from now on
+    uasyncio.create_task(send_telemetry(create_sink()))
+
+    if HTTP_PORT:
+        uasyncio.create_task(serve_status(HTTP_PORT))
+
+    gc_budget = GcBudget(GC_BUDGET)
+    page_start = utime.ticks_ms()
     while True:
-        # Sleep for 5s. Decrease sleep to 100ms if target humidity is not met.
-        sleep_time = 5 if schedule.is_target_humidity_achieved() else 0.1
+        if loop_span is not None:
+            loop_start = utime.ticks_us()
 
-        sensor.update()  # Update temp & humidity values
+        all_achieved = refresh(display)
 
-        output = f"Temperature: {sensor.temp}°C, Humidity: {sensor.humidity}%"
+        if loop_span is not None:
+            loop_span.add(utime.ticks_diff(utime.ticks_us(), loop_start))
 
-        print(output)
-        display.reset()
-        display.add_text(f"{sensor.temp}c", 7)
-        display.add_text(f"{sensor.humidity}%", 41)
-        display.show()
+        # Half of what an update that was just installed needs to be
+        # kept, see check_for_updates
+        if not reading_shown.is_set():
+            reading_shown.set()
 
-        schedule.update()
+        # The next sensor read is seconds away, a good time to collect
+        gc_budget.collect_if_due()
 
-        if not schedule.is_target_humidity_achieved():
-            if schedule.mode == "AM":
-                green_bounds = 70
-                yellow_bounds = 60
+        # Update on every fresh sample until every target is achieved,
+        # otherwise update every 5s
+        if all_achieved:
+            if power is not None:
+                await power.idle(5000)  # Light sleep between tasks
             else:
-                green_bounds = 80
-                yellow_bounds = 70
-
-            if (sensor.humidity >= green_bounds):
-                change_led_color(green)
-
-                schedule.set_target_humidity_achieved()
-
-                turn_off_led(green, delay=5)
-
-            elif (sensor.humidity >= yellow_bounds):
-                change_led_color(yellow)
-            elif (sensor.humidity < yellow_bounds):
-                change_led_color(red)
-
-        # If food change due, flash the LED
-        if schedule.food_change_due() and blink_led_task is None:
-            blink_led_task = uasyncio.create_task(blink_led())
-
-        # Cancel asyncio blink LED task if button pressed
-        if not schedule.food_change_due() and blink_led_task is not None:
-            blink_led_task = None
-
-        # Update every 100ms until target achieved, otherwise update every 5s
-        await uasyncio.sleep(sleep_time)
-
-
-# Starts the main thread
-uasyncio.run(main())
+                await uasyncio.sleep(5)
+        else:
+            if power is not None:
+                power.wake()
+            # Samples slow down while the humidity is steady, the page
+            # still changes on time
+            try:
+                await uasyncio.wait_for_ms(
+                    readings.wait(),
+                    PAGE_MS - utime.ticks_diff(utime.ticks_ms(), page_start))
+            except uasyncio.TimeoutError:
+                pass
+
+
+def run():
+    """Starts the main thread"""
+    # The readings and state are kept next to boot.py, not in the slot
+    ota_slots.restore_cwd()
+    uasyncio.run(main())
+
+
+# main.py is run as __main__ on boot. Importing it (eg from the REPL or
+# the simulator) doesn't start it, call run() instead.
+if __name__ == '__main__':
+    run()
@@ -1,31 +1,78 @@
+import hashlib
+import json
 import machine
+import sys
 import ubinascii
 import uos
-import urequests
 
+from async_http import HttpClient
 
-def check_version(host, project, auth=None, timeout=5) -> (bool, str):
+# Size of the pieces downloads are streamed to flash in
+CHUNK_SIZE = 1024
+
+TMP_DIR = 'tmp'
+
+MANIFEST_FILE = 'manifest.json'
+ETAG_FILE = 'version.etag'
+
+# ETag of the last remote version file fetched by check_version
+_remote_etag = None
+# Whether the last check_version got an answer from the host
+reached = False
+
+
+def _auth_headers(auth):
+    return {'Authorization': f'Basic {auth}'} if auth else {}
+
+
+def _read_first_line(path) -> str:
+    try:
+        with open(path, 'r') as f:
+            return f.readline().strip()
+    except OSError:
+        return ''
+
+
+def _join(directory, filename) -> str:
+    return f'{directory}/{filename}' if directory else filename
+
+
+async def check_version(host, project, auth=None, timeout=5, http=None, directory='') -> (bool, str):
+    global _remote_etag, reached
+    reached = False
     current_version = ''
+    own_http = http is None
+    if own_http:
+        http = HttpClient(timeout_ms=timeout * 1000)
     try:
-        if 'version' in uos.listdir():
-            with open('version', 'r') as current_version_file:
-                current_version = current_version_file.readline().strip()
+        current_version = _read_first_line(_join(directory, 'version'))
 
-        if auth:
-            response = urequests.get(f'{host}/{project}/version', headers={'Authorization': f'Basic {auth}'}, timeout=timeout)
-        else:
-            response = urequests.get(f'{host}/{project}/version', timeout=timeout)
+        headers = _auth_headers(auth)
+        etag = _read_first_line(ETAG_FILE) if current_version else ''
+        if etag:
+            # An unchanged version file costs a single 304
+            headers['If-None-Match'] = etag
+
+        response = await http.get(f'{host}/{project}/version', headers=headers)
         response_status_code = response.status_code
-        response_text = response.text
-        response.close()
+        response_text = await response.text()
+        reached = response_status_code in (200, 304)
+        if response_status_code == 304:
+            return False, current_version
         if response_status_code != 200:
             print(f'Remote version file {host}/{project}/version not found')
             return False, current_version
         remote_version = response_text.strip()
+        _remote_etag = response.headers.get('etag')
+        if current_version == remote_version and _remote_etag and _remote_etag != etag:
+            _write_etag()
         return current_version != remote_version, remote_version
     except Exception as ex:
         print(f'Something went wrong: {ex}')
         return False, current_version
+    finally:
+        if own_http:
+            http.close()
 
 
 def generate_auth(user=None, passwd=None) -> str | None:
@@ -37,55 +84,319 @@ def generate_auth(user=None, passwd=None) -> str | None:
     return auth_bytes.decode().strip()
 
 
-def ota_update(host, project, filenames, use_version_prefix=True, user=None, passwd=None, hard_reset_device=True, soft_reset_device=False, timeout=5) -> None:
+def _exists(path) -> bool:
+    try:
+        uos.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _hash_file(path):
+    """Returns (sha256 hasher, size) of the file at path, empty if missing."""
+    hasher = hashlib.sha256()
+    size = 0
+    if _exists(path):
+        buffer = memoryview(bytearray(CHUNK_SIZE))
+        with open(path, 'rb') as partial_file:
+            while True:
+                read = partial_file.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(buffer[:read])
+                size += read
+    return hasher, size
+
+
+async def fetch_hash(http, url, auth=None) -> str | None:
+    """Returns the hex SHA-256 published next to url as url.sha256."""
+    response = await http.get(f'{url}.sha256', headers=_auth_headers(auth))
+    response_text = await response.text()
+    if response.status_code != 200:
+        print(f'Remote hash file {url}.sha256 not found')
+        return None
+    return response_text.split()[0].lower() if response_text.strip() else None
+
+
+async def download_file(http, url, path, expected_hash, auth=None) -> bool:
+    """
+    Streams url into path in CHUNK_SIZE pieces while hashing it.
+
+    A partial file left at path by an interrupted transfer is resumed with
+    a Range request. Returns True if the file matches expected_hash, a
+    mismatching file is removed.
+    """
+    hasher, size = _hash_file(path)
+    headers = _auth_headers(auth)
+    if size:
+        headers['Range'] = f'bytes={size}-'
+
+    response = await http.get(url, headers=headers)
+    if response.status_code == 416:
+        # Nothing left to fetch, the partial file is complete
+        await response.content()
+    elif response.status_code in (200, 206):
+        if response.status_code == 200:
+            # Server ignored the range, start again
+            hasher, size = hashlib.sha256(), 0
+        with open(path, 'ab' if size else 'wb') as target_file:
+            while True:
+                chunk = await response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                target_file.write(chunk)
+    else:
+        response.close()
+        print(f'Remote source file {url} not found')
+        return False
+
+    digest = ubinascii.hexlify(hasher.digest()).decode()
+    if digest != expected_hash:
+        print(f'Hash mismatch for {url}')
+        uos.remove(path)
+        return False
+    return True
+
+
+def copy_file(source, path, expected_hash) -> bool:
+    """
+    Copies source to path in CHUNK_SIZE pieces while hashing it. Returns
+    True if the copy matches expected_hash, a mismatching copy is removed.
+    """
+    hasher = hashlib.sha256()
+    buffer = memoryview(bytearray(CHUNK_SIZE))
+    try:
+        with open(source, 'rb') as source_file, open(path, 'wb') as target_file:
+            while True:
+                read = source_file.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(buffer[:read])
+                target_file.write(buffer[:read])
+    except OSError:
+        return False
+    if ubinascii.hexlify(hasher.digest()).decode() != expected_hash:
+        uos.remove(path)
+        return False
+    return True
+
+
+def _prepare_tmp(remote_version) -> None:
+    """Creates tmp/, discarding partial downloads of another version."""
+    try:
+        uos.mkdir(TMP_DIR)
+    except OSError:
+        pass
+    marker = f'{TMP_DIR}/version'
+    if _exists(marker):
+        with open(marker, 'r') as marker_file:
+            if marker_file.readline().strip() == remote_version:
+                return
+    for filename in uos.listdir(TMP_DIR):
+        uos.remove(f'{TMP_DIR}/{filename}')
+    with open(marker, 'w') as marker_file:
+        marker_file.write(remote_version)
+
+
+def _clear_tmp() -> None:
+    try:
+        for filename in uos.listdir(TMP_DIR):
+            uos.remove(f'{TMP_DIR}/{filename}')
+        uos.rmdir(TMP_DIR)
+    except OSError:
+        pass
+
+
+def _tmp_path(filename) -> str:
+    return f'{TMP_DIR}/{filename.replace("/", "_")}'
+
+
+def _makedirs(path) -> None:
+    """Creates the parent directories of path."""
+    parts = path.split('/')[:-1]
+    for i in range(len(parts)):
+        try:
+            uos.mkdir('/'.join(parts[:i + 1]))
+        except OSError:
+            pass
+
+
+def _write_etag() -> None:
+    with open(ETAG_FILE, 'w') as etag_file:
+        etag_file.write(_remote_etag)
+
+
+def _write_version(remote_version, directory='') -> None:
+    with open(_join(directory, 'version'), 'w') as current_version_file:
+        current_version_file.write(remote_version)
+    if _remote_etag:
+        _write_etag()
+
+
+def load_manifest(path=MANIFEST_FILE) -> dict:
+    """Returns the local manifest, empty if there is none."""
+    try:
+        with open(path, 'r') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {'files': {}}
+
+
+def _file_size(path):
+    try:
+        return uos.stat(path)[6]
+    except OSError:
+        return None
+
+
+def diff_manifest(local, remote, directory='') -> (list, list):
+    """
+    Compares two manifests and returns (changed, removed) filenames.
+
+    A file is changed if it is new, its hash differs or the copy installed
+    in directory is missing or has the wrong size.
+    """
+    local_files = local.get('files', {})
+    remote_files = remote['files']
+    changed = []
+    for filename, info in remote_files.items():
+        local_info = local_files.get(filename)
+        if (local_info is None or local_info.get('sha256') != info['sha256'] or
+                _file_size(_join(directory, filename)) != info['size']):
+            changed.append(filename)
+    removed = [filename for filename in local_files if filename not in remote_files]
+    return changed, removed
+
+
+def mpy_version():
+    """The .mpy format version this firmware loads, None if unknown."""
+    mpy = getattr(sys.implementation, '_mpy', None)
+    return None if mpy is None else mpy & 0xFF
+
+
+def _shadow(filename):
+    """
+    The other form of a module, foo.py for foo.mpy and the other way
+    round. MicroPython imports foo.py over foo.mpy, so the old form has
+    to go when a module switches.
+    """
+    if filename.endswith('.mpy'):
+        return filename[:-4] + '.py'
+    if filename.endswith('.py'):
+        return filename[:-3] + '.mpy'
+    return None
+
+
+def install_file(source, target) -> None:
+    """Moves source over target with a rename instead of copying."""
+    _makedirs(target)
+    try:
+        uos.rename(source, target)
+    except OSError:
+        # Filesystems that can't rename over an existing file
+        uos.remove(target)
+        uos.rename(source, target)
+    shadow = _shadow(target)
+    if shadow is not None and _exists(shadow):
+        uos.remove(shadow)
+
+
+async def ota_update(host, project, filenames=None, use_version_prefix=True, user=None, passwd=None, hard_reset_device=True, soft_reset_device=False, timeout=5, directory='', install_dir=None, skip_version=None) -> bool:
+    """
+    Updates the device if the remote version changed. Returns True once
+    the new version is installed.
+
+    Without filenames the version's manifest.json is used: only new or
+    changed files are downloaded and files no longer listed are removed.
+    Modules may be shipped precompiled as .mpy, a version compiled for
+    another .mpy format than the firmware's is not installed.
+
+    directory holds the running version. With install_dir (which needs
+    the manifest) the new version is installed there instead of over the
+    running one, unchanged files are copied from directory rather than
+    downloaded. A remote version equal to skip_version is not installed.
+    """
+    if install_dir is None:
+        install_dir = directory
+    elif filenames is not None:
+        raise ValueError('install_dir needs the manifest, filenames can not be given.')
     all_files_found = True
     auth = generate_auth(user, passwd)
     prefix_or_path_separator = '_' if use_version_prefix else '/'
+    http = HttpClient(timeout_ms=timeout * 1000)
     try:
-        version_changed, remote_version = check_version(host, project, auth=auth, timeout=timeout)
+        version_changed, remote_version = await check_version(host, project, auth=auth, timeout=timeout, http=http, directory=directory)
+        if version_changed and remote_version == skip_version:
+            print(f'Skipping version {remote_version}')
+            return False
         if version_changed:
-            try:
-                uos.mkdir('tmp')
-            except:
-                pass
+            version_url = f'{host}/{project}/{remote_version}{prefix_or_path_separator}'
+            manifest = None
+            removed = []
+            if filenames is None:
+                response = await http.get(f'{version_url}{MANIFEST_FILE}', headers=_auth_headers(auth))
+                response_text = await response.text()
+                if response.status_code != 200:
+                    print(f'Remote manifest {version_url}{MANIFEST_FILE} not found')
+                    return False
+                manifest = json.loads(response_text)
+                compiled = manifest.get('mpy')
+                if compiled is not None and mpy_version() not in (None, compiled):
+                    print(f'Version {remote_version} is compiled for .mpy version {compiled}, this firmware loads {mpy_version()}')
+                    return False
+                filenames, removed = diff_manifest(load_manifest(_join(install_dir, MANIFEST_FILE)), manifest, install_dir)
+                print(f'Updating {filenames}, removing {removed}')
+
+            # Files of the running version that the new one keeps as is
+            running = {}
+            if install_dir != directory:
+                running = load_manifest(_join(directory, MANIFEST_FILE))['files']
+
+            _prepare_tmp(remote_version)
             for filename in filenames:
-                if auth:
-                    response = urequests.get(f'{host}/{project}/{remote_version}{prefix_or_path_separator}{filename}', headers={'Authorization': f'Basic {auth}'}, timeout=timeout)
+                url = f'{version_url}{filename}'
+                if manifest is None:
+                    expected_hash = await fetch_hash(http, url, auth=auth)
                 else:
-                    response = urequests.get(f'{host}/{project}/{remote_version}{prefix_or_path_separator}{filename}', timeout=timeout)
-                response_status_code = response.status_code
-                response_text = response.text
-                response.close()
-                if response_status_code != 200:
-                    print(f'Remote source file {host}/{project}/{remote_version}{prefix_or_path_separator}{filename} not found')
+                    expected_hash = manifest['files'][filename]['sha256']
+                if expected_hash is None:
                     all_files_found = False
+                elif running.get(filename, {}).get('sha256') == expected_hash and copy_file(_join(directory, filename), _tmp_path(filename), expected_hash):
                     continue
-                with open(f'tmp/{filename}', 'w') as source_file:
-                    source_file.write(response_text)
+                elif not await download_file(http, url, _tmp_path(filename), expected_hash, auth=auth):
+                    all_files_found = False
             if all_files_found:
                 for filename in filenames:
-                    with open(f'tmp/{filename}', 'r') as source_file, open(filename, 'w') as target_file:
-                        target_file.write(source_file.read())
-                    uos.remove(f'tmp/{filename}')
-                try:
-                    uos.rmdir('tmp')
-                except:
-                    pass
-                with open('version', 'w') as current_version_file:
-                    current_version_file.write(remote_version)
+                    install_file(_tmp_path(filename), _join(install_dir, filename))
+                for filename in removed:
+                    try:
+                        uos.remove(_join(install_dir, filename))
+                    except OSError:
+                        pass
+                _clear_tmp()
+                _makedirs(_join(install_dir, MANIFEST_FILE))
+                if manifest is not None:
+                    with open(_join(install_dir, MANIFEST_FILE), 'w') as manifest_file:
+                        json.dump(manifest, manifest_file)
+                _write_version(remote_version, install_dir)
                 if soft_reset_device:
                     print('Soft-resetting device...')
                     machine.soft_reset()
                 if hard_reset_device:
                     print('Hard-resetting device...')
                     machine.reset()
+                return True
     except Exception as ex:
         print(f'Something went wrong: {ex}')
+    finally:
+        http.close()
+    return False
 
 
-def check_for_ota_update(host, project, user=None, passwd=None, timeout=5, soft_reset_device=False):
+async def check_for_ota_update(host, project, user=None, passwd=None, timeout=5, soft_reset_device=False):
     auth = generate_auth(user, passwd)
-    version_changed, remote_version = check_version(host, project, auth=auth, timeout=timeout)
+    version_changed, remote_version = await check_version(host, project, auth=auth, timeout=timeout)
     if version_changed:
         if soft_reset_device:
             print(f'Found new version {remote_version}, soft-resetting device...')
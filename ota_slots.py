@@ -0,0 +1,163 @@
+import machine
+import sys
+import uos
+
+# Where each slot's files live, the first is the files copied over USB
+SLOT_DIRS = ('', 'slot_a', 'slot_b')
+
+# Active slot, previous slot, trial state and the slot rolled back from,
+# as indexes into SLOT_DIRS
+STATE_FILE = 'slot'
+
+TRIAL_NONE = 0
+# Activated, starts on the next boot
+TRIAL_PENDING = 1
+# Started, rolled back on the next boot unless confirmed
+TRIAL_RUNNING = 2
+
+# Seconds a new version has to call confirm() in before it is reset and
+# rolled back. main confirms once a reading is shown and the OTA host
+# answered, which takes up to 48 s of wifi retries and a 5 s check.
+CONFIRM_S = 120
+
+# Folder the device booted in, set by boot()
+_root = None
+# Resets the device when a trial isn't confirmed in time
+_timer = None
+
+
+def _load():
+    try:
+        with open(STATE_FILE, 'r') as state_file:
+            state = [int(value) for value in state_file.read().split()]
+        if len(state) == 4 and all(0 <= i < len(SLOT_DIRS) or i == -1
+                                   for i in state[:2] + state[3:]):
+            return state
+    except (OSError, ValueError):
+        pass
+    # Nothing installed over the air yet, or a corrupt file
+    return [0, 0, TRIAL_NONE, -1]
+
+
+def _save(state):
+    # Written next to the old file then renamed, so a reset mid-write
+    # leaves the old state
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w') as state_file:
+        state_file.write(' '.join(str(value) for value in state))
+    try:
+        uos.rename(tmp_path, STATE_FILE)
+    except OSError:
+        uos.remove(STATE_FILE)
+        uos.rename(tmp_path, STATE_FILE)
+
+
+def active() -> str:
+    """Folder of the running version, '' for the files copied over USB."""
+    return SLOT_DIRS[_load()[0]]
+
+
+def inactive() -> str:
+    """Folder to install the next version in, never the running one."""
+    return SLOT_DIRS[2] if _load()[0] == 1 else SLOT_DIRS[1]
+
+
+def in_trial() -> bool:
+    """Whether a new version is running but hasn't confirmed yet."""
+    return _load()[2] != TRIAL_NONE
+
+
+def failed_version() -> str | None:
+    """The version last rolled back from, None if there is none."""
+    failed = _load()[3]
+    if failed == -1:
+        return None
+    try:
+        with open(_join(SLOT_DIRS[failed], 'version'), 'r') as version_file:
+            return version_file.readline().strip()
+    except OSError:
+        return None
+
+
+def activate(directory) -> None:
+    """Boots directory from the next reset on, on trial."""
+    state = _load()
+    index = SLOT_DIRS.index(directory)
+    if index != state[0]:
+        state[1] = state[0]
+    state[0] = index
+    state[2] = TRIAL_PENDING
+    if state[3] == index:
+        state[3] = -1
+    _save(state)
+
+
+def confirm() -> None:
+    """
+    Marks the running version as good, called by main once it has shown
+    a reading and reached the OTA host.
+    Until then the previous version is started again on the next reset.
+    """
+    global _timer
+    if _timer is not None:
+        _timer.deinit()
+        _timer = None
+    state = _load()
+    if state[2] != TRIAL_NONE:
+        state[2] = TRIAL_NONE
+        _save(state)
+        print(f'Version in /{SLOT_DIRS[state[0]]} confirmed')
+
+
+def _rollback(state):
+    print(f'/{SLOT_DIRS[state[0]]} did not confirm, rolling back to '
+          f'/{SLOT_DIRS[state[1]]}')
+    state[3] = state[0]
+    state[0], state[1] = state[1], state[0]
+    state[2] = TRIAL_NONE
+    _save(state)
+
+
+def _join(directory, filename):
+    return f'{directory}/{filename}' if directory else filename
+
+
+def boot(confirm_s=CONFIRM_S) -> None:
+    """
+    The boot selector, called from boot.py before the firmware runs
+    main.py.
+
+    Rolls back when the last boot was a trial that never confirmed, else
+    starts a pending trial with a timer that resets the device if it
+    doesn't confirm within confirm_s. Then changes into the active slot
+    so the firmware runs its main.py, with the slot first on sys.path.
+    """
+    global _root, _timer
+    state = _load()
+    if state[2] == TRIAL_RUNNING:
+        _rollback(state)
+    elif state[2] == TRIAL_PENDING:
+        state[2] = TRIAL_RUNNING
+        _save(state)
+        _timer = machine.Timer(0)
+        _timer.init(mode=machine.Timer.ONE_SHOT, period=confirm_s * 1000,
+                    callback=lambda timer: machine.reset())
+
+    _root = uos.getcwd()
+    directory = SLOT_DIRS[state[0]]
+    if directory:
+        path = _root.rstrip('/') + '/' + directory
+        # The slot's modules first, then env.py and the rest of the root
+        sys.path.insert(0, path)
+        sys.path.insert(1, _root)
+        uos.chdir(path)
+        print(f'Booting /{directory}')
+
+
+def restore_cwd() -> None:
+    """
+    Changes back to the root folder boot() left, where the readings,
+    state and OTA files shared by every slot are kept.
+    """
+    if _root is not None:
+        uos.chdir(_root)
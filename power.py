@@ -0,0 +1,121 @@
+import machine
+import uasyncio
+import utime
+
+
+def _next_task_ms():
+    """
+        Milliseconds until the next uasyncio task is due, None if no other
+        task is waiting. Uses the scheduler's queue so sleeps never run
+        past another task's deadline.
+    """
+    try:
+        task = uasyncio.core._task_queue.peek()
+    except AttributeError:
+        return None
+    if task is None:
+        return None
+    return max(utime.ticks_diff(task.ph_key, utime.ticks_ms()), 0)
+
+
+class PowerManager:
+    """
+        Low-power idle mode.
+
+        While idle the CPU is put in machine.lightsleep between task
+        deadlines, woken by the RTC timer or the button, the sensor is
+        sampled less often and the display is blanked after a timeout.
+
+        There is no sleeping while the wifi is in use, so none at all
+        while the MQTT client or the status server hold it.
+    """
+    def __init__(self, display, sensors, wifi, button=None,
+                 blank_after_s=60, idle_sample_ms=30000, min_sleep_ms=20):
+        """
+            Parameters:
+                display - SSD1306 driver to blank.
+                sensors - Sensors whose sampling interval is raised while
+                          idle.
+                wifi - WifiManager, no sleeping while the link is in use.
+                button - ButtonClickHandler armed to wake the CPU around
+                         each sleep.
+                blank_after_s - Idle time before the display is turned off.
+                idle_sample_ms - Sensor sampling interval while idle.
+                min_sleep_ms - Shorter gaps are awaited instead of slept.
+        """
+        self.display = display
+        self.sensors = sensors
+        self.wifi = wifi
+        self.button = button
+        self.blank_after_ms = blank_after_s * 1000
+        self.idle_sample_ms = idle_sample_ms
+        self.min_sleep_ms = min_sleep_ms
+
+        self.is_idle = False
+        self.display_on = True
+        self._last_activity = utime.ticks_ms()
+
+        # Sleep statistics
+        self.sleeps = 0
+        self.slept_ms = 0
+
+    def activity(self):
+        """Called on user input, turns the display back on."""
+        self._last_activity = utime.ticks_ms()
+        if not self.display_on:
+            self.display.poweron()
+            self.display_on = True
+
+    def wake(self):
+        """Leaves idle mode."""
+        if self.is_idle:
+            self.is_idle = False
+            for sensor in self.sensors:
+                sensor.idle_interval_ms = 0
+        self.activity()
+
+    def _enter_idle(self):
+        self.is_idle = True
+        for sensor in self.sensors:
+            sensor.idle_interval_ms = self.idle_sample_ms
+        self._last_activity = utime.ticks_ms()
+
+    def _arm_wake(self):
+        """Private method - returns False if the CPU shouldn't sleep."""
+        return self.button is None or self.button.arm_wake()
+
+    async def idle(self, duration_ms):
+        """
+            Waits duration_ms, light sleeping whenever no other task is due.
+        """
+        if not self.is_idle:
+            self._enter_idle()
+
+        if (self.display_on and utime.ticks_diff(
+                utime.ticks_ms(), self._last_activity) >= self.blank_after_ms):
+            self.display.poweroff()
+            self.display_on = False
+
+        deadline = utime.ticks_add(utime.ticks_ms(), duration_ms)
+        while True:
+            remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+            if remaining <= 0:
+                return
+
+            nap = remaining
+            next_task = _next_task_ms()
+            if next_task is not None and next_task < nap:
+                nap = next_task
+
+            if (nap >= self.min_sleep_ms and not self.wifi.users and
+                    self._arm_wake()):
+                # ticks keep counting through lightsleep, so tasks that
+                # became due while asleep run as soon as we yield
+                machine.lightsleep(nap)
+                if self.button is not None:
+                    self.button.disarm_wake()
+                self.sleeps += 1
+                self.slept_ms += nap
+                await uasyncio.sleep_ms(0)
+            else:
+                await uasyncio.sleep_ms(min(nap, 1000))
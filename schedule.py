@@ -0,0 +1,107 @@
+import utime
+from micropython import const
+
+from state_journal import StateJournal
+
+# Schedule state kept in the state journal
+STATE_HALF_DAYS_SINCE_FED = const(0)
+STATE_MODE = const(1)
+STATE_TARGET_ACHIEVED = const(2)
+MODES = ("AM", "PM")
+
+
+class Schedule():
+    """
+        AM/PM humidity schedule and food counter of one enclosure.
+    """
+    def __init__(self, morning, night, change_food_days, time_service,
+                 state_path='state.log'):
+        """
+            Parameters:
+                morning - Hour the AM schedule starts, eg 8 for 8AM.
+                night - Hour the PM schedule starts, eg 20 for 8PM.
+                change_food_days - Days in between checking food.
+                time_service - TimeService giving the local time.
+                state_path - State journal file.
+        """
+        self.morning = morning
+        self.night = night
+        self.change_food_days = change_food_days
+        self.time_service = time_service
+
+        # utime.time() the mode next changes at, worked out by update
+        self._next_change = 0
+        time_service.listeners.append(self.time_changed)
+
+        # Restore the state saved before the last reset or power cut
+        self.state = StateJournal(state_path)
+
+        # Whether target humidity was achieved after mode changed
+        self._target_humidity_achieved = bool(
+            self.state.get(STATE_TARGET_ACHIEVED, 0))
+
+        # Stored in half days as the counter goes up by 0.5 per mode change
+        self.days_since_fed = self.state.get(
+            STATE_HALF_DAYS_SINCE_FED, change_food_days * 2) / 2
+
+        mode = self.state.get(STATE_MODE)
+        if mode is not None:
+            self.mode = MODES[mode]
+
+        self.update()
+
+    def save_state(self):
+        """Saves the state, only values that changed are written."""
+        self.state.set(STATE_HALF_DAYS_SINCE_FED, self.days_since_fed * 2)
+        self.state.set(STATE_MODE, MODES.index(self.mode))
+        self.state.set(STATE_TARGET_ACHIEVED, self._target_humidity_achieved)
+
+    def set_target_humidity_achieved(self):
+        self._target_humidity_achieved = True
+        self.save_state()
+
+    def is_target_humidity_achieved(self):
+        return self._target_humidity_achieved
+
+    def food_change_due(self):
+        return self.days_since_fed >= self.change_food_days
+
+    def reset_food_days_counter(self):
+        self.days_since_fed = 0
+        self.save_state()
+
+    def time_changed(self):
+        """Called when the clock is set, works out the next change again."""
+        self._next_change = 0
+
+    def update(self):
+        # Nothing to do until the next AM/PM boundary
+        if utime.time() < self._next_change:
+            return
+        # Keep the restored mode until the clock is set (NTP runs in the
+        # background after boot), a bogus time would count as a change
+        if hasattr(self, 'mode') and not self.time_service.valid():
+            return
+        current_mode, self._next_change = self.time_service.next_change(
+            self.morning, self.night)
+
+        # Set inital mode and return
+        if not hasattr(self, 'mode'):
+            self.mode = current_mode
+            self.save_state()
+            return
+
+        # If the mode is to be changed
+        if self.mode != current_mode:
+            self.mode = current_mode
+            self._target_humidity_achieved = False
+            self.days_since_fed += 0.5
+            self.save_state()
+
+    def get_time_hour(self):
+        current_time = self.time_service.localtime()
+        return current_time[3]
+
+    def get_time_minutes(self):
+        current_time = self.time_service.localtime()
+        return current_time[4]
@@ -0,0 +1,128 @@
+import dht
+import machine
+import uasyncio
+import utime
+from micropython import const
+
+from history import to_fixed
+
+# The DHT22 can only produce a fresh reading about every 2 seconds
+DHT22_MIN_INTERVAL_MS = const(2000)
+
+
+class Sensor:
+    """
+        The dht humidity and temperature sensor.
+
+        Sampling runs as its own uasyncio task (see run). Consumers read the
+        cached temp & humidity values or await wait_for_reading.
+    """
+    def __init__(self, pin, interval_ms=DHT22_MIN_INTERVAL_MS,
+                 max_backoff_ms=30000, notify=None, on_reading=None):
+        """
+            Parameters:
+                pin - GPIO pin the DHT22 data line is connected to.
+                interval_ms - Time between samples, never less than the
+                              DHT22 minimum interval.
+                max_backoff_ms - Upper bound of the retry delay after
+                                 failed reads.
+                notify - Event also pulsed on each fresh sample, shared by
+                         sensors to wait for a reading from any of them.
+                on_reading - Called after each fresh sample, before anyone
+                             is woken and before the next sample is
+                             scheduled, so it may change interval_ms.
+        """
+        self.dht = dht.DHT22(machine.Pin(pin))
+        self.interval_ms = max(interval_ms, DHT22_MIN_INTERVAL_MS)
+        self.max_backoff_ms = max(max_backoff_ms, self.interval_ms)
+        # Raised by the power manager while idle, the longer one is used
+        self.idle_interval_ms = 0
+
+        # Latest good reading and the ticks_ms it was taken at
+        self.temp = None
+        self.humidity = None
+        self.timestamp = None
+        # The same reading in fixed-point (see history.SCALE), for code
+        # that shouldn't allocate floats
+        self.temp_fixed = None
+        self.humidity_fixed = None
+
+        # Consecutive failed reads and the total since boot
+        self.failures = 0
+        self.total_failures = 0
+
+        self._last_measure = None
+        self._fresh = uasyncio.Event()
+        self._notify = notify
+        self._on_reading = on_reading
+
+    def has_reading(self):
+        return self.timestamp is not None
+
+    def age_ms(self):
+        """Milliseconds since the latest good reading, None if none yet."""
+        if self.timestamp is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), self.timestamp)
+
+    def update(self):
+        """
+            Calls dht measure and updates temp & humidity values.
+
+            Returns False without touching the sensor if it was read less
+            than DHT22_MIN_INTERVAL_MS ago, or if the read failed.
+        """
+        now = utime.ticks_ms()
+        if (self._last_measure is not None and
+                utime.ticks_diff(now, self._last_measure)
+                < DHT22_MIN_INTERVAL_MS):
+            return False
+        self._last_measure = now
+
+        try:
+            self.dht.measure()
+            temp = self.dht.temperature()
+            humidity = self.dht.humidity()
+        except Exception as e:
+            # OSError on a timeout, a bare Exception on a bad checksum
+            self.failures += 1
+            self.total_failures += 1
+            print(f"Failed to read sensor: {e}")
+            return False
+
+        self.temp = temp
+        self.humidity = humidity
+        self.temp_fixed = to_fixed(temp)
+        self.humidity_fixed = to_fixed(humidity)
+        self.timestamp = now
+        self.failures = 0
+
+        if self._on_reading is not None:
+            self._on_reading()
+
+        # Wake everything waiting for a fresh sample
+        self._fresh.set()
+        self._fresh.clear()
+        if self._notify is not None:
+            self._notify.set()
+            self._notify.clear()
+        return True
+
+    async def wait_for_reading(self):
+        """Waits for the next fresh sample."""
+        await self._fresh.wait()
+
+    async def run(self, delay_ms=0):
+        """
+            Samples the sensor forever, backing off after failed reads.
+            The first sample is taken after delay_ms.
+        """
+        if delay_ms:
+            await uasyncio.sleep_ms(delay_ms)
+        while True:
+            self.update()
+            delay = max(self.interval_ms, self.idle_interval_ms)
+            if self.failures:
+                delay = min(self.interval_ms << min(self.failures, 4),
+                            self.max_backoff_ms)
+            await uasyncio.sleep_ms(delay)
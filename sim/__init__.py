@@ -0,0 +1,93 @@
+"""
+    Host-side simulation of the humidity monitor.
+
+    Provides stand-ins for the MicroPython and hardware modules the device
+    code imports, running on a virtual clock, plus in-process Blynk and
+    OTA servers (sim.servers). Typical use from the repository root:
+
+        import sim
+        sim.install()
+        import main
+        sim.uasyncio.run_for(main.main(), 3600)  # one virtual hour
+
+    install() must run before any device module is imported. Device code
+    writes its files (state.log, ts/, ...) to a temporary directory that
+    stands in for the flash filesystem.
+
+    Everything runs on CPython. On the MicroPython unix port only the
+    hardware stand-ins are installed and the native uasyncio, utime and
+    framebuf are used, so time is not virtual there.
+"""
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stand-ins for modules that don't exist off-device
+HARDWARE_MODULES = ('machine', 'dht', 'network', 'ntptime', 'env')
+# Stand-ins for modules the MicroPython unix port already has
+RUNTIME_MODULES = ('utime', 'uasyncio', 'framebuf', 'micropython',
+                   'ubinascii', 'uos', 'gc', 'usocket')
+
+# Modules of the device code, unloaded by reset()
+DEVICE_MODULES = ('main', 'ssd1306', 'button_click_handler', 'sensor',
+                  'history', 'blynk_uploader', 'wifi_manager', 'async_http',
+                  'micropython_ota', 'state_journal', 'timeseries_log',
+                  'instrumentation', 'power', 'schedule', 'enclosure', 'trend',
+                  'time_service', 'http_server', 'status_pages', 'async_mqtt',
+                  'telemetry', 'ota_slots', 'gc_budget',
+                  'sparkline')
+
+
+def _stand_in(name):
+    __import__('sim.' + name)
+    return getattr(sys.modules['sim'], name)
+
+
+def install(flash_dir=None):
+    """
+        Installs the stand-in modules and changes into flash_dir (a new
+        temporary directory by default). Returns the flash directory.
+    """
+    names = HARDWARE_MODULES
+    if sys.implementation.name != 'micropython':
+        names = RUNTIME_MODULES + HARDWARE_MODULES
+    for name in names:
+        sys.modules[name] = _stand_in(name)
+
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    return use_flash(flash_dir)
+
+
+def use_flash(flash_dir=None):
+    """
+        Changes into flash_dir, a new empty temporary directory by
+        default. Returns the flash directory.
+    """
+    if flash_dir is None:
+        import tempfile
+        flash_dir = tempfile.mkdtemp(prefix='sim-flash-')
+    os.chdir(flash_dir)
+    return flash_dir
+
+
+def reset(start=(2026, 6, 1, 8, 0, 0), flash_dir=None):
+    """
+        Unloads the device modules, restarts the virtual clock and the
+        stand-in hardware and switches to flash_dir (empty by default), so
+        the next import starts like a freshly flashed device.
+    """
+    from sim import clock, environment, machine, net, network
+    for name in DEVICE_MODULES:
+        sys.modules.pop(name, None)
+    clock.reset(start)
+    environment.by_pin.clear()
+    environment.set_environment(environment.Environment())
+    machine.pins.clear()
+    machine.sleep_log.clear()
+    network.interfaces.clear()
+    network.available = True
+    net.clear()
+    return use_flash(flash_dir)
@@ -0,0 +1,287 @@
+"""
+    Performance benchmarks run against the simulator.
+
+        python -m sim.bench                      # print results
+        python -m sim.bench --save base.json     # keep as a baseline
+        python -m sim.bench --compare base.json  # fail on regressions
+
+    Times are host CPU times, useful to compare changes against each other
+    rather than as device figures. Byte counts, call counts and allocations
+    carry over to the device as they are.
+"""
+import importlib
+import sys
+import time
+
+import sim
+
+# Relative increase over the baseline counted as a regression
+TOLERANCE = 0.10
+
+
+def _timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000000
+
+
+def _display():
+    from sim import machine
+    import ssd1306
+    i2c = machine.I2C(0)
+    display = ssd1306.SSD1306_I2C(128, 64, i2c)
+    return display, i2c
+
+
+def bench_write_text(repeat=200):
+    """Time of Display.add_text sized write_text calls."""
+    sim.reset()
+    display, _ = _display()
+
+    def cold():
+        display._glyph_cache.clear()
+        display._glyph_lru.clear()
+        display.write_text('23.4c', 4, 7, 3)
+
+    def warm():
+        display.write_text('23.4c', 4, 7, 3)
+
+    return {
+        'write_text_cold_us': _timed(cold, repeat // 4 or 1),
+        'write_text_warm_us': _timed(warm, repeat),
+    }
+
+
+def bench_show(frames=200):
+    """Bytes on the I2C bus per show() for the main loop's screen."""
+    sim.reset()
+    display, i2c = _display()
+    i2c.record = False
+    from sim import environment
+
+    start = i2c.bytes_written
+    for frame in range(frames):
+        # A reading every 2 s, mostly unchanged between frames
+        sim.clock.clock.advance(2)
+        temp, humidity = environment.current.read()
+        display.fill(0)
+        display.write_text(f'{temp}c', 0, 7, 3)
+        display.write_text(f'{humidity}%', 0, 41, 3)
+        display.show()
+    return {
+        'show_bytes_per_frame': (i2c.bytes_written - start) / frames,
+        'show_full_frame_bytes': len(display.buffer),
+        'show_skipped_frames': display.flushes_skipped,
+    }
+
+
+def bench_sparkline(samples=300):
+    """
+        Drawing time and I2C bytes per new sample with the sparkline on
+        the display, against drawing the whole plot again.
+    """
+    sim.reset()
+    display, i2c = _display()
+    i2c.record = False
+    from sim import environment
+    from history import History
+    from sparkline import Sparkline
+
+    history = History(sample_period_s=0)
+    sparkline = Sparkline(history)
+
+    def add_sample():
+        sim.clock.clock.advance(30)
+        history.add(*environment.current.read())
+
+    # Fill the plot first, the steady state is a full plot scrolling
+    for _ in range(sparkline.width):
+        add_sample()
+    sparkline.update()
+    display.fill(0)
+    sparkline.blit(display)
+    display.show()
+
+    update_s = 0
+    start_bytes = i2c.bytes_written
+    start_columns = sparkline.columns_drawn
+    for _ in range(samples):
+        add_sample()
+        start = time.perf_counter()
+        sparkline.update()
+        update_s += time.perf_counter() - start
+        display.fill(0)
+        sparkline.blit(display)
+        display.show()
+    columns = sparkline.columns_drawn
+    return {
+        'sparkline_update_us': update_s / samples * 1000000,
+        'sparkline_redraw_us': _timed(sparkline.redraw, 20),
+        'sparkline_columns': (columns - start_columns) / samples,
+        'sparkline_bytes_per_sample': (i2c.bytes_written - start_bytes) /
+        samples,
+    }
+
+
+def _heap_tracker():
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    return tracemalloc
+
+
+def bench_main_loop(virtual_s=3600):
+    """
+        Runs main() for virtual_s seconds against the stand-in servers and
+        measures the main loop.
+    """
+    sim.reset()
+    from sim import servers, uasyncio
+    # Importing it marks the first boot stage
+    main = _quiet(importlib.import_module, 'main')
+
+    iterations = [0]
+    refresh = main.refresh
+
+    def counting_refresh(display):
+        iterations[0] += 1
+        return refresh(display)
+    main.refresh = counting_refresh
+
+    async def device():
+        blynk = await servers.BlynkServer().start()
+        ota = await servers.OtaServer().start()
+        ota.publish('v1', {'main.py': b''})
+        with open('version', 'w') as version_file:
+            version_file.write('v1')
+        try:
+            await main.main()
+        finally:
+            blynk.close()
+            ota.close()
+
+    tracemalloc = _heap_tracker()
+    start = time.perf_counter()
+    _quiet(uasyncio.run_for, device(), virtual_s)
+    elapsed = time.perf_counter() - start
+    results = {
+        'loop_iterations': iterations[0],
+        'loop_iteration_us': elapsed / max(iterations[0], 1) * 1000000,
+    }
+    if tracemalloc is not None:
+        results['heap_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return results
+
+
+def bench_boot(virtual_s=60):
+    """
+        Virtual ms from reset to the end of each boot stage, so a change
+        that holds up the first reading or the network shows up.
+    """
+    sim.reset()
+    from sim import servers, uasyncio
+    # Importing it marks the first boot stage
+    main = _quiet(importlib.import_module, 'main')
+
+    async def device():
+        blynk = await servers.BlynkServer().start()
+        ntp = await servers.NtpServer().start()
+        ota = await servers.OtaServer().start()
+        ota.publish('v1', {'main.py': b''})
+        with open('version', 'w') as version_file:
+            version_file.write('v1')
+        try:
+            await main.main()
+        finally:
+            blynk.close()
+            ntp.close()
+            ota.close()
+
+    _quiet(uasyncio.run_for, device(), virtual_s)
+    return {f'boot_{stage}_ms': ms
+            for stage, ms in main.instrumentation.boot.stages}
+
+
+def bench_ota_check(repeat=20):
+    """Wall time of a boot-time OTA check with nothing to update."""
+    sim.reset()
+    from sim import servers, uasyncio
+    import micropython_ota
+
+    async def checks():
+        ota = await servers.OtaServer().start()
+        ota.publish('v1', {'main.py': b''})
+        with open('version', 'w') as version_file:
+            version_file.write('v1')
+        # First check stores the ETag, later ones get a 304
+        await micropython_ota.ota_update('http://ota.sim', 'humidity')
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await micropython_ota.ota_update('http://ota.sim', 'humidity')
+        elapsed = time.perf_counter() - start
+        ota.close()
+        return elapsed
+
+    elapsed = _quiet(uasyncio.run, checks())
+    return {'ota_check_ms': elapsed / repeat * 1000}
+
+
+def _quiet(function, *args):
+    """Calls function with the device's serial output suppressed."""
+    import contextlib
+    import os
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            return function(*args)
+
+
+BENCHMARKS = (bench_write_text, bench_show, bench_sparkline, bench_main_loop,
+              bench_boot, bench_ota_check)
+
+
+def run_all():
+    results = {}
+    for benchmark in BENCHMARKS:
+        results.update(benchmark())
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns the metrics that grew by more than tolerance."""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        # Higher is better only for these
+        if name in ('loop_iterations', 'show_skipped_frames',
+                    'show_full_frame_bytes'):
+            continue
+        if base and value > base * (1 + tolerance):
+            regressions.append((name, base, value))
+    return regressions
+
+
+def main(argv):
+    import json
+    sim.install()
+    results = run_all()
+    for name, value in results.items():
+        print(f'{name:24} {value:12.1f}')
+
+    if '--save' in argv:
+        with open(argv[argv.index('--save') + 1], 'w') as f:
+            json.dump(results, f, indent=2)
+    if '--compare' in argv:
+        with open(argv[argv.index('--compare') + 1]) as f:
+            regressions = compare(results, json.load(f))
+        for name, base, value in regressions:
+            print(f'REGRESSION {name}: {base:.1f} -> {value:.1f}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
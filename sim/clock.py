@@ -0,0 +1,65 @@
+"""
+    Virtual clock shared by the utime, machine and uasyncio stand-ins.
+
+    Time only moves when something sleeps (or the event loop has nothing
+    to do until its next timer), so simulated hours run in milliseconds.
+"""
+import calendar
+
+# MicroPython ticks wrap at 2**30
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    def __init__(self, start=(2026, 6, 1, 8, 0, 0)):
+        """
+            Parameters:
+                start - UTC (year, month, day, hour, minute, second) the
+                        clock starts at.
+        """
+        # The true time the clock started at, what NTP servers report
+        self.start_epoch = calendar.timegm(tuple(start) + (0, 0, 0))
+        # What the RTC read when the clock started, changed when it's set
+        self.epoch = self.start_epoch
+        # Seconds since the clock started, the monotonic time
+        self.now = 0.0
+        # How fast (+) or slow (-) the RTC runs, in parts per million
+        self.drift_ppm = 0
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def rtc_seconds(self):
+        """Seconds the RTC counted since the clock started."""
+        return self.now * (1 + self.drift_ppm / 1000000)
+
+    def rtc_time(self):
+        """Unix time in (fractional) seconds as the RTC keeps it."""
+        return self.epoch + self.rtc_seconds()
+
+    def time(self):
+        """Unix time in seconds."""
+        return int(self.rtc_time())
+
+    def true_time(self):
+        """The real unix time, unaffected by RTC drift or setting."""
+        return self.start_epoch + self.now
+
+    def ticks_ms(self):
+        return int(self.now * 1000) & TICKS_MAX
+
+    def ticks_us(self):
+        return int(self.now * 1000000) & TICKS_MAX
+
+
+clock = VirtualClock()
+
+
+def reset(start=(2026, 6, 1, 8, 0, 0)):
+    """Replaces the shared clock, returns the new one."""
+    global clock
+    clock = VirtualClock(start)
+    return clock
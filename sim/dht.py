@@ -0,0 +1,46 @@
+"""dht stand-in reading the simulated environment."""
+from sim import clock as _clock
+from sim import environment as _environment
+
+
+class DHT22:
+    # The real part needs about 2 s between measurements
+    MIN_INTERVAL_S = 2
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.measurements = 0
+        self.too_soon = 0
+        self._last = None
+        self._temp = None
+        self._humidity = None
+
+    def measure(self):
+        now = _clock.clock.now
+        self.measurements += 1
+        # Allow for float rounding of the virtual clock
+        if (self._last is not None and
+                now - self._last < self.MIN_INTERVAL_S - 0.0005):
+            self.too_soon += 1
+            raise OSError(116)  # ETIMEDOUT, as the driver does
+        self._last = now
+
+        environment = _environment.for_pin(getattr(self.pin, 'id', None))
+        if (environment.fail_every and
+                self.measurements % environment.fail_every == 0):
+            raise OSError(116)
+        if (environment.checksum_every and
+                self.measurements % environment.checksum_every == 0):
+            # The driver raises a bare Exception on a corrupt frame
+            raise Exception("checksum error")
+        self._temp, self._humidity = environment.read()
+
+    def temperature(self):
+        return self._temp
+
+    def humidity(self):
+        return self._humidity
+
+
+class DHT11(DHT22):
+    pass
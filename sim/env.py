@@ -0,0 +1,11 @@
+"""Default env.py variables for the simulated device."""
+variables = {
+    'SSID': 'sim-ssid',
+    'PASS': 'sim-pass',
+    'MORNING': 8,
+    'NIGHT': 20,
+    'CHANGE_FOOD_DAYS': 3,
+    'BLYNK_AUTH_TOKEN': 'sim-token',
+    'OTA_HOST': 'http://ota.sim',
+    'OTA_PROJECT_NAME': 'humidity',
+}
@@ -0,0 +1,70 @@
+"""
+    Scriptable conditions inside the simulated tank.
+
+    The dht stand-in reads temperature and humidity from the current
+    Environment at the virtual time of each measurement.
+"""
+import math
+
+from sim import clock as _clock
+
+
+def misting_curve(period_s=4 * 3600, low=55.0, high=90.0, rise_s=60,
+                  decay_s=3600):
+    """
+        Humidity of a tank misted every period_s: a quick rise to high,
+        then an exponential fall back towards low.
+    """
+    def humidity(t):
+        phase = t % period_s
+        if phase < rise_s:
+            start = low + (high - low) * math.exp(-period_s / decay_s)
+            return start + (high - start) * phase / rise_s
+        return low + (high - low) * math.exp(-(phase - rise_s) / decay_s)
+    return humidity
+
+
+def constant(value):
+    return lambda t: value
+
+
+class Environment:
+    def __init__(self, humidity=None, temp=None, fail_every=0,
+                 checksum_every=0):
+        """
+            Parameters:
+                humidity - f(seconds) -> %RH, default misting_curve().
+                temp - f(seconds) -> degrees C, default a slow daily swing.
+                fail_every - Every n-th measurement fails, 0 for never.
+                checksum_every - Every n-th measurement has a bad checksum,
+                                 0 for never.
+        """
+        self.humidity = humidity or misting_curve()
+        self.temp = temp or (
+            lambda t: 24.0 + 2.0 * math.sin(2 * math.pi * t / 86400))
+        self.fail_every = fail_every
+        self.checksum_every = checksum_every
+
+    def read(self):
+        t = _clock.clock.now
+        return round(self.temp(t), 1), round(self.humidity(t), 1)
+
+
+current = Environment()
+
+# Environments of sensors on other pins, eg a second enclosure
+by_pin = {}
+
+
+def set_environment(environment, pin=None):
+    """Sets the environment of every sensor, or of the one on pin."""
+    global current
+    if pin is None:
+        current = environment
+    else:
+        by_pin[pin] = environment
+    return environment
+
+
+def for_pin(pin):
+    return by_pin.get(pin, current)
@@ -0,0 +1,144 @@
+"""
+    Pure Python framebuf stand-in, MONO_VLSB only.
+
+    The built-in 8x8 font is replaced by deterministic made-up glyphs: text
+    lights a stable, character-dependent set of pixels, which is all the
+    driver and benchmarks need.
+"""
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+def _glyph(char):
+    """Column bytes of the stand-in glyph for char."""
+    code = ord(char)
+    if code == 32:
+        return bytes(8)
+    columns = bytearray(8)
+    seed = (code * 2654435761) & 0xFFFFFFFF
+    for i in range(7):
+        seed = (seed * 1103515245 + 12345) & 0x7FFFFFFF
+        columns[i] = (seed >> 8) & 0x7F
+    return bytes(columns)
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError('Only MONO_VLSB is simulated')
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        if len(buffer) < ((height + 7) // 8) * width:
+            raise ValueError('buffer too small')
+
+    def _set(self, x, y, c):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            index = (y >> 3) * self.width + x
+            if c:
+                self.buffer[index] |= 1 << (y & 7)
+            else:
+                self.buffer[index] &= ~(1 << (y & 7)) & 0xFF
+
+    def _get(self, x, y):
+        return (self.buffer[(y >> 3) * self.width + x] >> (y & 7)) & 1
+
+    def fill(self, c):
+        size = ((self.height + 7) // 8) * self.width
+        self.buffer[:size] = (b'\xff' if c else b'\x00') * size
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                return self._get(x, y)
+            return None
+        self._set(x, y, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        x0, x1 = max(x, 0), min(x + w, self.width)
+        y0, y1 = max(y, 0), min(y + h, self.height)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx, dy = abs(x2 - x1), -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for char in s:
+            columns = _glyph(char)
+            for i in range(8):
+                bits = columns[i]
+                for j in range(8):
+                    if bits >> j & 1:
+                        self._set(x + i, y + j, c)
+            x += 8
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for j in range(fbuf.height):
+            yy = y + j
+            if not 0 <= yy < self.height:
+                continue
+            for i in range(fbuf.width):
+                xx = x + i
+                if not 0 <= xx < self.width:
+                    continue
+                c = fbuf._get(i, j)
+                if palette is not None:
+                    c = palette.pixel(c, 0)
+                if c != key:
+                    self._set(xx, yy, c)
+
+    def scroll(self, xstep, ystep):
+        """Shifts the contents, the uncovered area is left as it was."""
+        w, h = self.width, self.height
+        if ystep == 0:
+            # Sideways only: a byte move per page, like the C version
+            shift = min(abs(xstep), w)
+            for row in range(0, ((h + 7) // 8) * w, w):
+                if xstep < 0:
+                    self.buffer[row:row + w - shift] = (
+                        self.buffer[row + shift:row + w])
+                elif xstep > 0:
+                    self.buffer[row + shift:row + w] = (
+                        self.buffer[row:row + w - shift])
+            return
+        snapshot = [[self._get(i, j) for i in range(w)] for j in range(h)]
+        for j in range(h):
+            src_y = j - ystep
+            if not 0 <= src_y < h:
+                continue
+            for i in range(w):
+                src_x = i - xstep
+                if 0 <= src_x < w:
+                    self._set(i, j, snapshot[src_y][src_x])
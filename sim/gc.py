@@ -0,0 +1,34 @@
+"""
+    gc stand-in: CPython's gc plus MicroPython's mem_free/mem_alloc.
+
+    Heap figures come from tracemalloc when it is tracing, against a
+    simulated heap of HEAP_SIZE bytes.
+"""
+from gc import *  # noqa: F401,F403
+import gc as _gc
+
+HEAP_SIZE = 160 * 1024
+
+collections = 0
+
+
+def collect(generation=2):
+    global collections
+    collections += 1
+    return _gc.collect(generation)
+
+
+def mem_alloc():
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def mem_free():
+    return max(HEAP_SIZE - mem_alloc(), 0)
+
+
+def threshold(amount=None):
+    if amount is None:
+        return -1
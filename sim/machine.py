@@ -0,0 +1,229 @@
+"""machine stand-in: pins with scriptable IRQs, recording I2C/SPI buses."""
+from sim import clock as _clock
+
+
+class DeviceReset(BaseException):
+    """
+        Raised by reset() and soft_reset(). Derives from BaseException so
+        device code catching Exception doesn't swallow it.
+    """
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.kind = kind
+
+
+def reset():
+    raise DeviceReset('hard')
+
+
+def soft_reset():
+    raise DeviceReset('soft')
+
+
+# Milliseconds spent in lightsleep/deepsleep
+sleep_log = []
+
+
+def lightsleep(time_ms=None):
+    sleep_log.append(('light', time_ms))
+    if time_ms:
+        _clock.clock.advance(time_ms / 1000)
+
+
+def deepsleep(time_ms=None):
+    sleep_log.append(('deep', time_ms))
+    raise DeviceReset('deepsleep')
+
+
+def freq(hz=None):
+    return 160000000
+
+
+def unique_id():
+    return b'\x5e\x1d\x00\x00\x00\x01'
+
+
+def reset_cause():
+    return PWRON_RESET
+
+
+def wake_reason():
+    return 0
+
+
+# Pin.irq wake values
+IDLE = 1
+SLEEP = 2
+DEEPSLEEP = 4
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+# All pins created, by id, so tests can reach the device's pins
+pins = {}
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    def __init__(self, id, mode=-1, pull=-1, value=None, **kwargs):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        # Inputs with a pull up read high until driven
+        self._value = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self._value = value
+        self.handler = None
+        self.trigger = 0
+        self.history = []
+        pins[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None, **kwargs):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+        self.history.append((_clock.clock.now, self._value))
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=3, **kwargs):
+        self.handler = handler
+        self.trigger = trigger
+
+    def drive(self, value):
+        """
+            Simulates an external level change on an input, calling the
+            IRQ handler like the hardware would.
+        """
+        value = 1 if value else 0
+        if value == self._value:
+            return
+        self._value = value
+        edge = Pin.IRQ_RISING if value else Pin.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge:
+            self.handler(self)
+
+
+class I2C:
+    """Records every transaction written to it."""
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400000, **kwargs):
+        self.freq = freq
+        self.transactions = []
+        self.bytes_written = 0
+        # Keep every transaction, set False for long runs
+        self.record = True
+
+    def scan(self):
+        return [0x3C]
+
+    def writeto(self, addr, buf, stop=True):
+        data = bytes(buf)
+        self.bytes_written += len(data)
+        if self.record:
+            self.transactions.append((addr, data))
+        return 1
+
+    def writevto(self, addr, vector, stop=True):
+        data = b''.join(bytes(buf) for buf in vector)
+        self.bytes_written += len(data)
+        if self.record:
+            self.transactions.append((addr, data))
+        return 1
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(nbytes)
+
+
+class SoftI2C(I2C):
+    pass
+
+
+class SPI:
+    """Records every write."""
+
+    def __init__(self, id=1, *args, **kwargs):
+        self.inits = 0
+        self.writes = []
+        self.bytes_written = 0
+
+    def init(self, *args, **kwargs):
+        self.inits += 1
+
+    def write(self, buf):
+        data = bytes(buf)
+        self.bytes_written += len(data)
+        self.writes.append(data)
+
+
+class RTC:
+    def __init__(self, id=0):
+        pass
+
+    def datetime(self, datetime=None):
+        if datetime is not None:
+            import calendar
+            year, month, day, _, hour, minute, second = datetime[:7]
+            target = calendar.timegm((year, month, day, hour, minute,
+                                      second, 0, 0, 0))
+            if len(datetime) > 7:
+                target += datetime[7] / 1000000  # Microseconds
+            _clock.clock.epoch = target - _clock.clock.rtc_seconds()
+            return
+        import time
+        t = time.gmtime(_clock.clock.time())
+        return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour,
+                t.tm_min, t.tm_sec, 0)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.callback = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, **kwargs):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.feeds = 0
+
+    def feed(self):
+        self.feeds += 1
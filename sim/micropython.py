@@ -0,0 +1,39 @@
+"""micropython stand-in."""
+
+
+def const(value):
+    return value
+
+
+def native(function):
+    return function
+
+
+viper = native
+
+
+def schedule(function, arg):
+    """Runs function(arg) soon from the event loop, like the device."""
+    from sim import uasyncio
+    loop = uasyncio.get_event_loop()
+    loop.call_soon(function, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def mem_info(verbose=None):
+    print('mem: simulated')
+
+
+def opt_level(level=None):
+    return 0
@@ -0,0 +1,36 @@
+"""
+    Name resolution for the simulation.
+
+    The device code connects to real host names (blynk.cloud, the OTA
+    host). Stand-in servers register here under those names and the
+    uasyncio and urequests stand-ins connect to them instead.
+"""
+_hosts = {}
+
+# Whether hosts without a stand-in may be reached on the real network
+allow_real_network = False
+
+
+def register(host, address, port=None):
+    """
+        Routes host (and optionally only port on it) to address, a
+        (host, port) tuple of a local server.
+    """
+    _hosts[(host, port)] = address
+
+
+def unregister(host, port=None):
+    _hosts.pop((host, port), None)
+
+
+def clear():
+    _hosts.clear()
+
+
+def resolve(host, port):
+    address = _hosts.get((host, port)) or _hosts.get((host, None))
+    if address is not None:
+        return address
+    if allow_real_network:
+        return host, port
+    raise OSError(f'No stand-in server for {host}:{port}')
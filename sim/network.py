@@ -0,0 +1,58 @@
+"""network stand-in: a station interface that associates after a delay."""
+from sim import clock as _clock
+
+STA_IF = 0
+AP_IF = 1
+
+# Virtual seconds an association takes, and whether it ever succeeds
+connect_delay_s = 2.0
+available = True
+
+interfaces = []
+
+
+class WLAN:
+    IF_STA = STA_IF
+    IF_AP = AP_IF
+
+    def __init__(self, interface_id=STA_IF):
+        self.interface_id = interface_id
+        self._active = False
+        self._connect_started = None
+        self.connects = 0
+        self.activations = 0
+        interfaces.append(self)
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        if is_active and not self._active:
+            self.activations += 1
+        self._active = bool(is_active)
+        if not self._active:
+            self._connect_started = None
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        if not self._active:
+            raise OSError('Wifi Not Started')
+        self.connects += 1
+        self._connect_started = _clock.clock.now
+
+    def disconnect(self):
+        self._connect_started = None
+
+    def isconnected(self):
+        return (available and self._active and
+                self._connect_started is not None and
+                _clock.clock.now - self._connect_started >= connect_delay_s)
+
+    def status(self, param=None):
+        return 1010 if self.isconnected() else 1001
+
+    def ifconfig(self, config=None):
+        return ('192.168.1.50', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+
+    def config(self, *args, **kwargs):
+        if args == ('mac',):
+            return b'\x5e\x1d\x00\x00\x00\x01'
+        return None
@@ -0,0 +1,332 @@
+"""
+    In-process HTTP/1.1 stand-ins for Blynk and the OTA host, and SNTP and
+    MQTT stand-ins.
+
+    Servers run on the simulation's event loop and register their host
+    name with sim.net, so device code talking to https://blynk.cloud or
+    the OTA_HOST reaches them unchanged.
+"""
+import hashlib
+import json
+import struct
+
+from sim import net
+from sim import uasyncio
+
+
+class StandInServer:
+    """Minimal keep-alive HTTP/1.1 server, subclasses implement handle."""
+
+    def __init__(self, host, port=None):
+        """
+            Parameters:
+                host - Host name the device uses for this server.
+                port - Only route this port of host, default all ports.
+        """
+        self.host = host
+        self.port = port
+        self.requests = []
+        self.connections = 0
+        self._server = None
+        # Set to make the server stop answering (eg to test timeouts)
+        self.stalled = False
+        # Set to send bodies with chunked transfer encoding
+        self.chunked = False
+        self._writers = []
+
+    async def start(self):
+        self._server = await uasyncio.start_server(self._serve, '127.0.0.1', 0)
+        address = self._server.sockets[0].getsockname()
+        net.register(self.host, address, self.port)
+        return self
+
+    def close(self):
+        net.unregister(self.host, self.port)
+        self.disconnect_all()
+        if self._server is not None:
+            self._server.close()
+
+    def disconnect_all(self):
+        """Drops every open connection, as an idle timeout would."""
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                path, _, query = target.partition('?')
+                params = dict(part.split('=', 1) for part in query.split('&')
+                              if '=' in part)
+                self.requests.append((method, target, headers, body))
+
+                while self.stalled:
+                    await uasyncio.sleep(1)
+
+                status, response_headers, response_body = self.handle(
+                    method, path, params, headers, body)
+                head = [f'HTTP/1.1 {status} {_REASONS.get(status, "OK")}']
+                response_headers = dict(response_headers)
+                if self.chunked:
+                    response_headers['Transfer-Encoding'] = 'chunked'
+                    response_body = _chunk(response_body)
+                else:
+                    response_headers['Content-Length'] = len(response_body)
+                for name, value in response_headers.items():
+                    head.append(f'{name}: {value}')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() +
+                             response_body)
+                await writer.drain()
+        except (ConnectionError, uasyncio.IncompleteReadError,
+                uasyncio.CancelledError):
+            # Client went away or the simulation is shutting down
+            pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            writer.close()
+
+    def handle(self, method, path, params, headers, body):
+        return 404, {}, b''
+
+
+def _chunk(body, size=16):
+    """body in chunked transfer encoding, size bytes per chunk."""
+    chunks = [b'%x\r\n%s\r\n' % (len(body[i:i + size]), body[i:i + size])
+              for i in range(0, len(body), size)]
+    return b''.join(chunks) + b'0\r\n\r\n'
+
+
+_REASONS = {200: 'OK', 206: 'Partial Content', 304: 'Not Modified',
+            400: 'Bad Request', 404: 'Not Found', 416: 'Range Not Satisfiable'}
+
+
+class BlynkServer(StandInServer):
+    """
+        Accepts Blynk HTTP API updates and keeps every value received, per
+        virtual pin, in points.
+    """
+    def __init__(self, token='sim-token', host='blynk.cloud'):
+        super().__init__(host)
+        self.token = token
+        # pin -> [(timestamp_ms or None, value)]
+        self.points = {}
+
+    def handle(self, method, path, params, headers, body):
+        if params.get('token') != self.token:
+            return 400, {}, b'Invalid token.'
+        if path == '/external/api/batch/update' and method == 'POST':
+            pin = params.get('pin')
+            for timestamp, value in json.loads(body):
+                self.points.setdefault(pin, []).append((timestamp, value))
+            return 200, {}, b''
+        if path in ('/external/api/batch/update', '/external/api/update'):
+            for pin, value in params.items():
+                if pin != 'token':
+                    self.points.setdefault(pin, []).append((None, float(value)))
+            return 200, {}, b''
+        return 404, {}, b''
+
+
+class OtaServer(StandInServer):
+    """
+        Static file host for OTA updates, laid out like the nginx host in
+        the readme, with ETag and Range support.
+    """
+    def __init__(self, host='ota.sim', project='humidity'):
+        super().__init__(host)
+        self.project = project
+        # url path -> content
+        self.files = {}
+
+    def publish(self, version, files):
+        """
+            Publishes version with files ({name: bytes}) and a manifest,
+            and makes it the current version.
+        """
+        manifest = {'version': version, 'files': {}}
+        for name, content in files.items():
+            self.files[f'/{self.project}/{version}/{name}'] = content
+            manifest['files'][name] = {
+                'size': len(content),
+                'sha256': hashlib.sha256(content).hexdigest(),
+            }
+            self.files[f'/{self.project}/{version}/{name}.sha256'] = (
+                hashlib.sha256(content).hexdigest().encode())
+        self.files[f'/{self.project}/{version}/manifest.json'] = (
+            json.dumps(manifest).encode())
+        self.files[f'/{self.project}/version'] = version.encode() + b'\n'
+
+    def handle(self, method, path, params, headers, body):
+        content = self.files.get(path)
+        if content is None:
+            return 404, {}, b''
+        etag = '"' + hashlib.sha256(content).hexdigest()[:16] + '"'
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, b''
+        if 'range' in headers:
+            start = int(headers['range'][6:].split('-')[0])
+            if start >= len(content):
+                return 416, {}, b''
+            return 206, {'ETag': etag}, content[start:]
+        return 200, {'ETag': etag}, content
+
+
+class MqttBroker:
+    """
+        MQTT 3.1.1 stand-in accepting QoS 0 and 1 publishes and keeping
+        each message received in messages.
+    """
+    def __init__(self, host='mqtt.sim', port=1883):
+        self.host = host
+        self.port = port
+        # (topic, payload, qos) in the order they arrived
+        self.messages = []
+        self.connections = 0
+        self.pings = 0
+        # Set to stop answering at all (eg to test keepalive timeouts)
+        self.stalled = False
+        # Set to take publishes without sending PUBACKs
+        self.drop_acks = False
+        self._server = None
+        self._writers = []
+
+    async def start(self):
+        self._server = await uasyncio.start_server(self._serve, '127.0.0.1', 0)
+        address = self._server.sockets[0].getsockname()
+        net.register(self.host, address, self.port)
+        return self
+
+    def close(self):
+        net.unregister(self.host, self.port)
+        self.disconnect_all()
+        if self._server is not None:
+            self._server.close()
+
+    def disconnect_all(self):
+        """Drops every client connection, as a broker restart would."""
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+
+    async def _read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, await reader.readexactly(length)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        try:
+            while True:
+                header, body = await self._read_packet(reader)
+                while self.stalled:
+                    await uasyncio.sleep(1)
+                packet_type = header & 0xF0
+                if packet_type == 0x10:  # CONNECT
+                    writer.write(b'\x20\x02\x00\x00')
+                elif packet_type == 0x30:  # PUBLISH
+                    qos = (header >> 1) & 3
+                    length = struct.unpack('!H', body[:2])[0]
+                    topic = body[2:2 + length].decode()
+                    offset = 2 + length
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                    self.messages.append((topic, body[offset:], qos))
+                    if qos and not self.drop_acks:
+                        writer.write(b'\x40\x02' + packet_id)
+                elif packet_type == 0xC0:  # PINGREQ
+                    self.pings += 1
+                    writer.write(b'\xd0\x00')
+                elif packet_type == 0xE0:  # DISCONNECT
+                    break
+                await writer.drain()
+        except (ConnectionError, uasyncio.IncompleteReadError,
+                uasyncio.CancelledError):
+            pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            writer.close()
+
+
+class NtpServer:
+    """
+        SNTP stand-in on UDP, answering with the clock's true time so the
+        device can measure how far its drifting RTC is off.
+    """
+    NTP_DELTA = 2208988800  # 1900 to 1970
+
+    def __init__(self, host='pool.ntp.org', port=123):
+        self.host = host
+        self.port = port
+        self.requests = 0
+        # Set to drop requests (eg to test timeouts)
+        self.stalled = False
+        self._transport = None
+
+    async def start(self):
+        loop = uasyncio.get_event_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _NtpProtocol(self), local_addr=('127.0.0.1', 0))
+        address = self._transport.get_extra_info('sockname')
+        net.register(self.host, address, self.port)
+        return self
+
+    def close(self):
+        net.unregister(self.host, self.port)
+        if self._transport is not None:
+            self._transport.close()
+
+    def reply(self, request):
+        from sim import clock
+        now = clock.clock.true_time() + self.NTP_DELTA
+        seconds = int(now)
+        fraction = int((now - seconds) * (1 << 32))
+        # Leap 0, version 4, mode 4 (server), stratum 1, transmit time set
+        return (bytes((0x24, 1, 0, 0)) + bytes(36) +
+                struct.pack('!II', seconds, fraction))
+
+
+class _NtpProtocol:
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.server.requests += 1
+        if not self.server.stalled and len(data) >= 48:
+            self.transport.sendto(self.server.reply(data), address)
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        pass
@@ -0,0 +1,137 @@
+"""
+    Tests of async_http.HttpClient against an in-process stand-in server.
+
+        python -m pytest sim/test_async_http.py
+"""
+import pytest
+
+import sim
+from sim import clock, servers, uasyncio
+
+HOST = 'http.sim'
+BODY = bytes(range(256)) * 4
+
+
+class _Server(servers.StandInServer):
+    def handle(self, method, path, params, headers, body):
+        if path == '/echo':
+            return 200, {}, body
+        if path == '/body':
+            return 200, {}, BODY
+        return 404, {}, b''
+
+
+def _run(test, chunked=False):
+    """Runs test(client, server) on the simulator's event loop."""
+    sim.install()
+    sim.reset()
+    import async_http
+
+    async def runner():
+        server = await _Server(HOST).start()
+        server.chunked = chunked
+        client = async_http.HttpClient(timeout_ms=5000)
+        try:
+            return await test(client, server)
+        finally:
+            client.close()
+            server.close()
+
+    return uasyncio.run(runner())
+
+
+def test_content_length_body():
+    async def test(client, server):
+        response = await client.get(f'http://{HOST}/body')
+        assert response.status_code == 200
+        assert response.headers['content-length'] == str(len(BODY))
+        assert await response.content() == BODY
+
+    _run(test)
+
+
+def test_chunked_body():
+    async def test(client, server):
+        response = await client.post(f'http://{HOST}/echo', data=BODY)
+        assert response.headers['transfer-encoding'] == 'chunked'
+        assert await response.content() == BODY
+        # Finished at the terminating chunk, so the connection is reused
+        response = await client.get(f'http://{HOST}/body')
+        assert await response.content() == BODY
+        assert client.connections_opened == 1
+
+    _run(test, chunked=True)
+
+
+def test_keep_alive_reuses_connection():
+    async def test(client, server):
+        for _ in range(3):
+            response = await client.get(f'http://{HOST}/body')
+            assert await response.content() == BODY
+        assert client.requests == 3
+        assert client.connections_opened == 1
+        assert server.connections == 1
+
+    _run(test)
+
+
+def test_retries_stale_pooled_connection():
+    async def test(client, server):
+        response = await client.get(f'http://{HOST}/body')
+        await response.content()
+        # The server drops the idle connection, the next request finds
+        # out when it is used and retries on a new one
+        server.disconnect_all()
+        await uasyncio.sleep(0)
+        response = await client.post(f'http://{HOST}/echo', data=b'again')
+        assert await response.content() == b'again'
+        assert client.connections_opened == 2
+
+    _run(test)
+
+
+def test_deadline_expires_waiting_for_response():
+    async def test(client, server):
+        import async_http
+        server.stalled = True
+        start = clock.clock.now
+        with pytest.raises(async_http.HttpError):
+            await client.get(f'http://{HOST}/body', timeout_ms=2000)
+        assert clock.clock.now - start == pytest.approx(2, abs=0.1)
+        assert not client._idle
+
+    _run(test)
+
+
+def test_deadline_expires_mid_body():
+    async def test(client, server):
+        import async_http
+        response = await client.get(f'http://{HOST}/body', timeout_ms=2000)
+        await response.read(16)
+        clock.clock.advance(3)
+        with pytest.raises(async_http.HttpError):
+            await response.read()
+        # The half-read connection is closed, not pooled
+        assert response._writer is None
+        assert not client._idle
+
+    _run(test)
+
+
+def test_malformed_status_line():
+    async def serve(reader, writer):
+        await reader.readline()
+        writer.write(b'garbage\r\n\r\n')
+        await writer.drain()
+
+    async def test(client, server):
+        import async_http
+        bad = await uasyncio.start_server(serve, '127.0.0.1', 0)
+        sim.net.register('bad.sim', bad.sockets[0].getsockname())
+        try:
+            with pytest.raises(async_http.HttpError):
+                await client.get('http://bad.sim/')
+        finally:
+            bad.close()
+
+    _run(test)
@@ -0,0 +1,174 @@
+"""
+    Tests of async_mqtt.MqttClient against the stand-in broker.
+
+        python -m pytest sim/test_async_mqtt.py
+"""
+import pytest
+
+import sim
+from sim import clock, servers, uasyncio
+
+HOST = 'mqtt.sim'
+
+
+def _run(test, **options):
+    """Runs test(client, broker) on the simulator's event loop."""
+    sim.install()
+    sim.reset()
+    import async_mqtt
+
+    async def runner():
+        broker = await servers.MqttBroker(HOST).start()
+        client = async_mqtt.MqttClient('sim-device', HOST, **options)
+        try:
+            return await test(client, broker)
+        finally:
+            await client.disconnect()
+            broker.close()
+
+    return uasyncio.run(runner())
+
+
+async def _until(condition, timeout_s=60):
+    """Sleeps a virtual 100 ms at a time until condition() holds."""
+    start = clock.clock.now
+    while not condition():
+        assert clock.clock.now - start < timeout_s
+        await uasyncio.sleep_ms(100)
+
+
+def _wifi():
+    from wifi_manager import WifiManager
+    return WifiManager('sim-ssid', 'sim-pass')
+
+
+def test_qos1_publish_is_acked():
+    async def test(client, broker):
+        await client.connect()
+        for i in range(10):
+            await client.publish('vivarium/test', f'{i}', qos=1)
+        await client.wait_acked()
+        assert broker.messages == [
+            ('vivarium/test', f'{i}'.encode(), 1) for i in range(10)]
+        assert not client._in_flight
+        assert client.published == 10
+
+    _run(test)
+
+
+def test_in_flight_window_waits_for_acks():
+    async def test(client, broker):
+        import async_mqtt
+        await client.connect()
+        broker.drop_acks = True
+        for i in range(4):
+            await client.publish('vivarium/test', b'x', qos=1)
+        assert len(client._in_flight) == 4
+        # The window is full, the fifth waits for a PUBACK that never comes
+        start = clock.clock.now
+        with pytest.raises(async_mqtt.MqttError):
+            await client.publish('vivarium/test', b'x', qos=1)
+        assert clock.clock.now - start == pytest.approx(2, abs=0.1)
+        assert len(broker.messages) == 4
+        # Started over on a new connection, the lost ones are forgotten
+        assert not client.connected
+        assert not client._in_flight
+
+    _run(test, window=4, timeout_ms=2000)
+
+
+def test_keepalive_pings_idle_connection():
+    async def test(client, broker):
+        await client.connect()
+        # Pinged every half keepalive while nothing else is sent
+        await uasyncio.sleep(60)
+        assert client.connected
+        assert broker.pings == client.pings
+        assert 5 <= broker.pings <= 6
+
+    _run(test, keepalive_s=20)
+
+
+def test_keepalive_drops_silent_broker():
+    async def test(client, broker):
+        await client.connect()
+        broker.stalled = True
+        start = clock.clock.now
+        await _until(lambda: not client.connected)
+        # Nothing back for 1.5 keepalives
+        assert clock.clock.now - start <= 20
+        assert client.disconnects == 1
+
+    _run(test, keepalive_s=10)
+
+
+def test_reconnects_with_backoff():
+    async def test(client, broker):
+        attempts = []
+        connect = client.connect
+
+        async def recording_connect():
+            attempts.append(clock.clock.now)
+            await connect()
+
+        client.connect = recording_connect
+        task = uasyncio.create_task(client.run(_wifi()))
+        await _until(lambda: client.connected)
+
+        # A broker restart: the connection drops and the broker is away
+        # for a while
+        sim.net.unregister(HOST, broker.port)
+        broker.disconnect_all()
+        await _until(lambda: not client.connected)
+        await uasyncio.sleep(30)
+        sim.net.register(HOST, broker._server.sockets[0].getsockname(),
+                         broker.port)
+        await _until(lambda: client.connected)
+        assert client.connects == 2
+        assert client.disconnects == 1
+
+        # Each attempt also brings the wifi up again, the backoff between
+        # them doubles from 1 s
+        gaps = [b - a for a, b in zip(attempts[1:], attempts[2:])]
+        assert len(gaps) >= 4
+        for i, (gap, next_gap) in enumerate(zip(gaps, gaps[1:])):
+            assert next_gap - gap == pytest.approx(2 << i, abs=0.2)
+        task.cancel()
+
+    _run(test)
+
+
+def test_resends_readings_when_acks_are_lost():
+    class Enclosure:
+        name = 'tank'
+
+    async def test(client, broker):
+        from telemetry import MqttSink
+        from timeseries_log import TimeSeriesLog
+        enclosure = Enclosure()
+        enclosure.tslog = TimeSeriesLog('ts')
+        for i in range(5):
+            enclosure.tslog.append(24.0, 70.0 + i, 1780000000 + 30 * i)
+
+        task = uasyncio.create_task(client.run(_wifi()))
+        await _until(lambda: client.connected)
+        sink = MqttSink(client)
+
+        # The PUBACKs are lost, the window fills up, nothing is marked
+        # sent and the connection is started over
+        broker.drop_acks = True
+        assert not await sink.send(enclosure)
+        assert enclosure.tslog.unsent_count() == 5
+        assert len(broker.messages) == client.window
+
+        broker.drop_acks = False
+        await _until(lambda: client.connected)
+        assert await sink.send(enclosure)
+        assert enclosure.tslog.unsent_count() == 0
+        # The whole batch went again
+        resent = broker.messages[client.window:]
+        assert len(resent) == 5
+        assert resent[:client.window] == broker.messages[:client.window]
+        task.cancel()
+
+    _run(test, timeout_ms=2000)
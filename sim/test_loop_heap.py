@@ -0,0 +1,208 @@
+"""
+    Checks that the main loop's steady state doesn't allocate or grow the
+    heap.
+
+        python -m pytest sim/test_loop_heap.py
+        python -m sim.test_loop_heap
+
+    Runs main.refresh, one pass of the main loop, against a display and
+    enclosures on the simulator, with a fresh reading and a page change
+    on every pass.
+
+    Allocations are found by tracing the device code as it runs: every
+    bytecode that builds an object (an f-string, a list, a tuple, a
+    closure, ...) and every call of a builtin that returns a new one
+    (print, str, ...) is an allocation on MicroPython too. CPython's own
+    allocations (boxed ints, the stand-ins' work) aren't, so the heap
+    can't be measured directly.
+
+    Leaks are measured by tracing the heap instead. Allocations made by
+    CPython itself come and go, anything the loop keeps shows up as
+    growth. What the stand-ins record (I2C transactions, pin changes)
+    isn't counted, it doesn't exist on the device. Objects alive at the
+    moment of measuring (a sleeping LED task, the last reading) add up
+    to a few hundred bytes at most, so growth is counted per pass over
+    many passes: anything kept on every pass is at least one object, 16
+    bytes or more.
+"""
+import contextlib
+import dis
+import fnmatch
+import gc
+import os
+import sys
+import tracemalloc
+
+import sim
+
+WARMUP = 1000
+ITERATIONS = 1000
+
+# Bytecodes that build a new object
+_ALLOCATING_OPS = {dis.opmap[name] for name in (
+    'BUILD_TUPLE', 'BUILD_LIST', 'BUILD_SET', 'BUILD_MAP',
+    'BUILD_CONST_KEY_MAP', 'BUILD_STRING', 'BUILD_SLICE', 'FORMAT_VALUE',
+    'LIST_EXTEND', 'MAKE_FUNCTION', 'CALL_FUNCTION_EX', 'RETURN_GENERATOR',
+    'LOAD_BUILD_CLASS')}
+# Builtins that return a new object
+_ALLOCATING_BUILTINS = {print, str, repr, format, bytes, bytearray, list,
+                        tuple, dict, set, memoryview, float, sorted}
+
+
+def _setup():
+    sim.install()
+    sim.reset()
+    import main
+    from enclosure import create_enclosures
+
+    # Two enclosures so paging and the label are drawn too
+    main.enclosures = create_enclosures(
+        [{'sensor': 2}, {'sensor': 3}], 8, 20, 3, main.time_service)
+    display = main.Display()
+    return main, display
+
+
+def _device_heap():
+    """Traced bytes, without the stand-ins' and tracemalloc's own."""
+    stand_ins = os.path.join(os.path.dirname(os.path.abspath(__file__)), '*')
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, stand_ins),
+         tracemalloc.Filter(False, tracemalloc.__file__),
+         tracemalloc.Filter(False, fnmatch.__file__)])
+    return sum(stat.size for stat in snapshot.statistics('filename'))
+
+
+def _stepper(main, display):
+    """
+        A main loop pass with a fresh sample from every sensor 5 s on, so
+        the page changes every pass. Allocations made by the pass are
+        appended to found when given.
+    """
+    from sim import clock, uasyncio
+
+    async def step(found=None):
+        # Recorded into each enclosure's history and trend by the sensor
+        clock.clock.advance(5)
+        for enclosure in main.enclosures:
+            enclosure.sensor.update()
+        if found is None:
+            main.refresh(display)
+        else:
+            with _trace_allocations(found):
+                main.refresh(display)
+        # Let tasks the loop started (LED timers) run
+        await uasyncio.sleep(0)
+
+    return step
+
+
+def _device_files():
+    return {os.path.join(sim.REPO_ROOT, name + '.py')
+            for name in sim.DEVICE_MODULES}
+
+
+@contextlib.contextmanager
+def _trace_allocations(found):
+    """
+        Appends (file, line, what) to found for every allocation made by
+        the device code while in the with block.
+    """
+    device_files = _device_files()
+
+    def trace_opcodes(frame, event, arg):
+        if event == 'opcode':
+            code = frame.f_code
+            op = code.co_code[frame.f_lasti]
+            if op in _ALLOCATING_OPS:
+                found.append((os.path.basename(code.co_filename),
+                              frame.f_lineno, dis.opname[op]))
+        return trace_opcodes
+
+    def trace_calls(frame, event, arg):
+        if frame.f_code.co_filename not in device_files:
+            return None
+        frame.f_trace_opcodes = True
+        return trace_opcodes
+
+    def profile(frame, event, arg):
+        if (event == 'c_call' and arg in _ALLOCATING_BUILTINS and
+                frame.f_code.co_filename in device_files):
+            found.append((os.path.basename(frame.f_code.co_filename),
+                          frame.f_lineno, arg.__name__))
+
+    sys.settrace(trace_calls)
+    sys.setprofile(profile)
+    try:
+        yield found
+    finally:
+        sys.settrace(None)
+        sys.setprofile(None)
+
+
+def allocations_per_iteration(iterations=100):
+    """
+        Allocations the device code made in iterations main loop passes,
+        after a warmup, as (file, line, what).
+    """
+    main, display = _setup()
+    from sim import uasyncio
+    step = _stepper(main, display)
+
+    async def measure():
+        for _ in range(WARMUP):
+            await step()
+        found = []
+        for _ in range(iterations):
+            await step(found)
+        return found
+
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            return uasyncio.run(measure())
+
+
+def heap_growth_per_iteration(iterations=ITERATIONS):
+    """Bytes the heap grew by per main loop pass, after a warmup."""
+    main, display = _setup()
+    from sim import uasyncio
+    step = _stepper(main, display)
+
+    async def measure():
+        # Warmed up while tracing, tracemalloc and CPython's own caches
+        # grow at first
+        tracemalloc.start()
+        try:
+            for _ in range(WARMUP):
+                await step()
+            gc.collect()
+            # Once first, the filters compile patterns on first use
+            _device_heap()
+            start = _device_heap()
+            for _ in range(iterations):
+                await step()
+            gc.collect()
+            return _device_heap() - start
+        finally:
+            tracemalloc.stop()
+
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            growth = uasyncio.run(measure())
+    return growth / iterations
+
+
+def test_main_loop_does_not_allocate():
+    assert allocations_per_iteration() == []
+
+
+def test_main_loop_heap_is_flat():
+    assert heap_growth_per_iteration() < 1
+
+
+if __name__ == '__main__':
+    allocations = allocations_per_iteration()
+    for allocation in sorted(set(allocations)):
+        print('Allocates: %s:%d %s' % allocation)
+    growth = heap_growth_per_iteration()
+    print(f'Heap growth per main loop pass: {growth} bytes')
+    assert not allocations and growth < 1
@@ -0,0 +1,56 @@
+"""
+    Tests of main on the simulated device.
+
+        python -m pytest sim/test_main.py
+"""
+import sys
+
+import sim
+from sim import clock, environment, uasyncio
+
+
+def test_pages_change_while_sampling_is_slow():
+    sim.install()
+    sim.reset()
+    # Steady and below target, so the sensor backs off to slow samples
+    environment.set_environment(
+        environment.Environment(humidity=environment.constant(40.0)))
+    import main
+
+    changes = []
+    refresh = main.refresh
+
+    def recording_refresh(display):
+        page = main.page
+        achieved = refresh(display)
+        if main.page != page:
+            changes.append(clock.clock.now)
+        return achieved
+
+    main.refresh = recording_refresh
+    uasyncio.run_for(main.main(), 120)
+
+    assert main.enclosures[0].sensor.interval_ms == 30000
+    assert len(changes) >= 20
+    for before, after in zip(changes, changes[1:]):
+        assert after - before < 5.5
+
+
+def test_telemetry_is_imported_after_first_reading():
+    sim.install()
+    sim.reset()
+    import main
+
+    imported = {}
+    mark = main.instrumentation.boot.mark
+
+    def recording_mark(stage):
+        imported[stage] = set(sys.modules)
+        mark(stage)
+
+    main.instrumentation.boot.mark = recording_mark
+    uasyncio.run_for(main.main(), 10)
+
+    lazy = {'telemetry', 'blynk_uploader', 'async_http', 'async_mqtt'}
+    assert not lazy & imported['first_reading']
+    assert 'telemetry' in sys.modules
@@ -0,0 +1,62 @@
+"""
+    Tests of sensor.Sensor's sampling task against the dht stand-in.
+
+        python -m pytest sim/test_sensor.py
+"""
+import sim
+from sim import clock, environment, uasyncio
+
+
+def _run(test, **conditions):
+    """Runs test(sensor) on the simulator's event loop."""
+    sim.install()
+    sim.reset()
+    environment.set_environment(
+        environment.Environment(humidity=environment.constant(70.0),
+                                **conditions))
+    import sensor
+
+    async def runner():
+        return await test(sensor.Sensor(2))
+
+    return uasyncio.run(runner())
+
+
+def test_checksum_error_counts_as_failure():
+    async def test(sensor):
+        # The second measurement has a bad checksum
+        assert sensor.update()
+        clock.clock.advance(2)
+        assert not sensor.update()
+        assert sensor.failures == 1
+        assert sensor.total_failures == 1
+        clock.clock.advance(2)
+        assert sensor.update()
+        assert sensor.failures == 0
+
+    _run(test, checksum_every=2)
+
+
+def test_task_survives_checksum_errors():
+    async def test(sensor):
+        task = uasyncio.create_task(sensor.run())
+        # Every other measurement is corrupt, readings keep coming
+        for _ in range(5):
+            await uasyncio.wait_for_ms(sensor.wait_for_reading(), 60000)
+        assert sensor.total_failures >= 4
+        assert sensor.humidity == 70.0
+        task.cancel()
+
+    _run(test, checksum_every=2)
+
+
+def test_backs_off_after_checksum_errors():
+    async def test(sensor):
+        task = uasyncio.create_task(sensor.run())
+        # Every measurement is corrupt: retried after 4, 8, 16 and 30 s
+        await uasyncio.sleep(60)
+        assert sensor.total_failures == 5
+        assert sensor.timestamp is None
+        task.cancel()
+
+    _run(test, checksum_every=1)
@@ -0,0 +1,86 @@
+"""
+    Tests of the status pages served by http_server.HttpServer.
+
+        python -m pytest sim/test_status_pages.py
+"""
+import sim
+from sim import uasyncio
+
+HOST = 'device.sim'
+
+
+def _run(test, sensors=(2,), instrumented=False):
+    """
+        Runs test(enclosures) on the simulator's event loop, with the
+        status pages of an enclosure per sensor pin served on HOST.
+    """
+    sim.install()
+    sim.reset()
+    import main
+    import instrumentation
+    from enclosure import create_enclosures
+    from http_server import HttpServer
+    from status_pages import StatusPages
+
+    async def runner():
+        if instrumented:
+            main.start_instrumentation()
+        enclosures = create_enclosures(
+            [{'sensor': pin} for pin in sensors], 8, 20, 3,
+            main.time_service)
+        for enclosure in enclosures:
+            enclosure.sensor.update()
+        await uasyncio.sleep(1)
+
+        server = HttpServer(80)
+        StatusPages(enclosures, main.wifi, main.time_service, server,
+                    boot=instrumentation.boot)
+        await server.start()
+        sim.net.register(HOST, server._server.sockets[0].getsockname())
+        try:
+            return await test(enclosures)
+        finally:
+            server.close()
+
+    return uasyncio.run(runner())
+
+
+async def _get(path):
+    """Returns the status line, header lines and body of GET path."""
+    reader, writer = await uasyncio.open_connection(HOST, 80)
+    writer.write(f'GET {path} HTTP/1.0\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read(-1)
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    status, *headers = head.split(b'\r\n')
+    return status, headers, body
+
+
+def test_metrics_larger_than_buffer():
+    async def test(enclosures):
+        status, headers, body = await _get('/metrics')
+        assert status == b'HTTP/1.0 200 OK'
+        assert not [h for h in headers if h.startswith(b'Content-Length')]
+        # Four enclosures and the instrumentation don't fit one buffer
+        assert len(body) > 4096
+        for enclosure in enclosures:
+            name = enclosure.name.encode()
+            assert (b'vivarium_humidity_percent{enclosure="' + name + b'"}'
+                    in body)
+        assert b'vivarium_runtime{name="sensor_update_count"}' in body
+        assert body.endswith(b'\n')
+
+    _run(test, sensors=(2, 3, 4, 5), instrumented=True)
+
+
+def test_buffered_pages_have_content_length():
+    async def test(enclosures):
+        status, headers, body = await _get('/readings')
+        assert status == b'HTTP/1.0 200 OK'
+        assert b'Content-Length: %d' % len(body) in headers
+        assert body.startswith(b'{"time":')
+        status, _, _ = await _get('/missing')
+        assert status == b'HTTP/1.0 404 Not Found'
+
+    _run(test)
@@ -0,0 +1,70 @@
+"""
+    Tests of sending the logged readings to Blynk while the network is
+    down and after it comes back.
+
+        python -m pytest sim/test_telemetry.py
+"""
+import sim
+from sim import clock, network, servers, uasyncio
+
+
+def test_failed_flushes_back_off():
+    sim.install()
+    sim.reset()
+    from blynk_uploader import BlynkUploader
+
+    async def test():
+        # No Blynk server, every flush fails
+        uploader = BlynkUploader('sim-token', timeout=1)
+        for i in range(48):
+            uploader.add(24.0, 70.0, timestamp=1780000000 + 30 * i)
+        assert uploader.flush_due()
+
+        retries = []
+        for _ in range(7):
+            assert not await uploader.flush()
+            failed_at = clock.clock.now
+            assert not uploader.flush_due()
+            while not uploader.flush_due():
+                clock.clock.advance(1)
+            retries.append(round(clock.clock.now - failed_at))
+        assert retries == [60, 120, 240, 480, 960, 1800, 1800]
+        assert uploader.failed_flushes == 7
+
+        # Back to the batch size or interval once a flush goes through
+        server = await servers.BlynkServer().start()
+        try:
+            assert await uploader.flush()
+        finally:
+            server.close()
+        assert uploader.failed_flushes == 0
+        assert len(server.points['v1']) == 48
+
+    uasyncio.run(test())
+
+
+def test_wifi_outage_backs_off():
+    sim.install()
+    sim.reset()
+    import main
+    from enclosure import create_enclosures
+    from telemetry import BlynkSink
+
+    async def test():
+        main.enclosures = create_enclosures(
+            [{'sensor': 2}, {'sensor': 3}], 8, 20, 3, main.time_service)
+        for enclosure in main.enclosures:
+            enclosure.start()
+        network.available = False
+        try:
+            await uasyncio.wait_for(main.send_telemetry(BlynkSink('sim-token')),
+                                    3 * 3600)
+        except uasyncio.TimeoutError:
+            pass
+        return main.wifi
+
+    wifi = uasyncio.run(test())
+    # Due after 48 readings, 24 minutes, then retried after 1, 2, 4, 8,
+    # 16 and 30 minutes rather than on every 30 s pass
+    assert wifi.connects == 0
+    assert wifi.failures <= 10 * wifi.attempts
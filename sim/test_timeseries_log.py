@@ -0,0 +1,28 @@
+"""
+    Tests of timeseries_log.TimeSeriesLog on the simulated flash.
+
+        python -m pytest sim/test_timeseries_log.py
+"""
+import os
+
+import sim
+
+
+def test_ignores_stray_segment_names():
+    sim.install()
+    sim.reset()
+    from timeseries_log import TimeSeriesLog
+
+    log = TimeSeriesLog('ts')
+    for i in range(3):
+        log.append(24.0, 70.0, 1780000000 + 30 * i)
+    for name in ('backup.seg', '7.seg', '-1.seg', '00000001 copy.seg'):
+        with open(f'ts/{name}', 'wb') as stray:
+            stray.write(b'not a segment')
+
+    log = TimeSeriesLog('ts')
+    assert len(log) == 3
+    assert log.last_timestamp() == 1780000060
+    log.append(24.0, 71.0, 1780000090)
+    assert len(log) == 4
+    assert os.path.exists('ts/backup.seg')
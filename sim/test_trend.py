@@ -0,0 +1,45 @@
+"""
+    Tests of trend.Trend fed simulated sensor readings.
+
+        python -m pytest sim/test_trend.py
+"""
+import random
+
+import sim
+from sim import environment
+
+
+def _sample(humidity, seconds, noise=0.0, seed=1):
+    """
+        Feeds a Trend readings of humidity(t), DHT22 rounded and with
+        +-noise, at the intervals it asks for. Returns the trend and the
+        number of reads.
+    """
+    sim.install()
+    sim.reset()
+    from trend import Trend
+    trend = Trend()
+    noise_source = random.Random(seed)
+    reads = 0
+    t_ms = 0
+    while t_ms < seconds * 1000:
+        value = humidity(t_ms / 1000) + noise_source.uniform(-noise, noise)
+        trend.add(round(value, 1), t_ms)
+        reads += 1
+        t_ms += trend.interval_ms
+    return trend, reads
+
+
+def test_noisy_plateau_is_not_misting():
+    # Drying slowly, 1 %RH an hour, with a 0.1 %RH of sensor noise
+    trend, reads = _sample(lambda t: 70.0 - t / 3600, 3600, noise=0.1)
+    assert trend.mistings == 0
+    # Mostly sampled at the slow interval, 120 reads an hour
+    assert reads < 200
+
+
+def test_counts_each_misting():
+    trend, _ = _sample(
+        environment.misting_curve(period_s=3600, decay_s=900), 4 * 3600,
+        noise=0.1)
+    assert trend.mistings == 4
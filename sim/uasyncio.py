@@ -0,0 +1,178 @@
+"""
+    uasyncio stand-in on top of CPython asyncio.
+
+    Coroutines run on an event loop whose time is the virtual clock: when
+    no task is ready and no socket has data, the loop jumps the clock to
+    its next timer instead of waiting. Connections to hosts registered
+    with sim.net are redirected to the in-process stand-in servers.
+"""
+import asyncio as _asyncio
+import selectors as _selectors
+from asyncio import *  # noqa: F401,F403
+
+from sim import clock as _clock
+from sim import net as _net
+
+
+class _VirtualSelector(_selectors.BaseSelector):
+    """Selector that advances the virtual clock instead of blocking."""
+
+    def __init__(self):
+        self._selector = _selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj):
+        return self._selector.get_key(fileobj)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # Nothing scheduled, only socket I/O can wake the loop. Give
+            # in-flight data a moment to arrive.
+            return self._selector.select(0.05)
+        _clock.clock.advance(timeout)
+        return []
+
+
+class VirtualEventLoop(_asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__(_VirtualSelector())
+
+    def time(self):
+        return _clock.clock.now
+
+
+_loop = None
+
+
+def new_event_loop():
+    global _loop
+    _loop = VirtualEventLoop()
+    _asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def get_event_loop():
+    try:
+        return _asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    if _loop is None or _loop.is_closed():
+        new_event_loop()
+    return _loop
+
+
+def run(coro):
+    """Runs coro on a fresh virtual-time loop, like uasyncio.run."""
+    loop = new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        _shutdown(loop)
+
+
+def run_for(coro, seconds):
+    """
+        Runs coro for at most seconds of virtual time, then cancels it and
+        every task it started. Returns coro's result or None if it was
+        still running.
+    """
+    loop = new_event_loop()
+
+    async def runner():
+        try:
+            return await _asyncio.wait_for(coro, seconds)
+        except _asyncio.TimeoutError:
+            return None
+
+    try:
+        return loop.run_until_complete(runner())
+    finally:
+        _shutdown(loop)
+
+
+def _shutdown(loop):
+    tasks = [task for task in _asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        loop.run_until_complete(
+            _asyncio.gather(*tasks, return_exceptions=True))
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+    _asyncio.set_event_loop(None)
+
+
+class _Deadline:
+    def __init__(self, ph_key):
+        self.ph_key = ph_key
+
+
+class _TaskQueue:
+    """
+        Mimics peek() of MicroPython's uasyncio.core._task_queue: the
+        earliest deadline, as ticks_ms, of any ready or sleeping task.
+    """
+    def peek(self):
+        loop = get_event_loop()
+        if loop._ready:
+            return _Deadline(_clock.clock.ticks_ms())
+        for handle in sorted(loop._scheduled, key=lambda h: h.when()):
+            if not handle.cancelled():
+                return _Deadline(int(handle.when() * 1000) & _clock.TICKS_MAX)
+        return None
+
+
+class core:
+    _task_queue = _TaskQueue()
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(aw, timeout):
+    return await _asyncio.wait_for(aw, timeout / 1000)
+
+
+async def open_connection(host, port, ssl=None, **kwargs):
+    """Connects to the stand-in server registered for host."""
+    address = _net.resolve(host, port)
+    return await _asyncio.open_connection(address[0], address[1], **kwargs)
+
+
+async def start_server(callback, host, port, backlog=5, ssl=None):
+    return await _asyncio.start_server(callback, host, port, backlog=backlog)
+
+
+class ThreadSafeFlag:
+    """Flag that can be set from an IRQ handler and awaited by one task."""
+
+    def __init__(self):
+        self._event = _asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
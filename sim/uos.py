@@ -0,0 +1,11 @@
+"""uos stand-in on the host filesystem, rooted at the simulated flash."""
+from os import listdir, mkdir, remove, rename, rmdir, stat, getcwd, chdir  # noqa: F401
+
+
+def statvfs(path):
+    import os
+    return tuple(os.statvfs(path))
+
+
+def uname():
+    return ('esp32', 'sim', '1.0', 'sim', 'ESP32C3 simulator')
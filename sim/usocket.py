@@ -0,0 +1,11 @@
+"""usocket stand-in, host names resolve to the stand-in servers."""
+from socket import *  # noqa: F401,F403
+from socket import AF_INET, SOCK_STREAM
+
+from sim import net as _net
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    """Like the device: [(family, type, proto, canonname, address)]."""
+    return [(AF_INET, type or SOCK_STREAM, proto, '',
+             _net.resolve(host, port))]
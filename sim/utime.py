@@ -0,0 +1,60 @@
+"""utime stand-in running on the virtual clock."""
+import time as _time
+
+from sim import clock as _clock
+
+
+def time():
+    return _clock.clock.time()
+
+
+def time_ns():
+    return int(_clock.clock.rtc_time() * 1000000000)
+
+
+def gmtime(secs=None):
+    if secs is None:
+        secs = time()
+    return tuple(_time.gmtime(secs))[:8]
+
+
+# The device has no timezone, localtime is UTC
+localtime = gmtime
+
+
+def mktime(t):
+    import calendar
+    return calendar.timegm(tuple(t)[:6] + (0, 0, 0))
+
+
+def sleep(seconds):
+    _clock.clock.advance(seconds)
+
+
+def sleep_ms(ms):
+    _clock.clock.advance(ms / 1000)
+
+
+def sleep_us(us):
+    _clock.clock.advance(us / 1000000)
+
+
+def ticks_ms():
+    return _clock.clock.ticks_ms()
+
+
+def ticks_us():
+    return _clock.clock.ticks_us()
+
+
+def ticks_cpu():
+    return _clock.clock.ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _clock.TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _clock.TICKS_MAX
+    return diff - _clock.TICKS_PERIOD if diff >= _clock.TICKS_HALF else diff
@@ -0,0 +1,118 @@
+import framebuf
+
+from history import SCALE
+
+
+class Sparkline:
+    """
+        Scrolling humidity (top) and temperature (bottom) plot of a
+        History, one column per stored sample with the latest on the
+        right.
+
+        The plot is kept in its own frame buffer. New samples scroll it
+        left with framebuf.scroll and only their columns are drawn, so
+        once it is filled it is never drawn from scratch again. Samples
+        stored while the plot isn't shown are caught up on the next
+        update. blit() copies it onto the display, where show() only
+        sends what changed.
+    """
+    def __init__(self, history, width=128, height=56,
+                 humidity_range=(40, 100), temp_range=(15, 35),
+                 humidity_height=32):
+        """
+            Parameters:
+                history - History whose ring buffer is plotted.
+                width, height - Size of the plot in pixels.
+                humidity_range, temp_range - (low, high) values plotted,
+                                             readings outside are clamped.
+                humidity_height - Rows of the humidity plot, the
+                                  temperature plot is below a 1 px line.
+        """
+        self.history = history
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(((height + 7) // 8) * width)
+        self.frame = framebuf.FrameBuffer(self.buffer, width, height,
+                                          framebuf.MONO_VLSB)
+        self._humidity_low = humidity_range[0] * SCALE
+        self._humidity_span = (humidity_range[1] - humidity_range[0]) * SCALE
+        self._temp_low = temp_range[0] * SCALE
+        self._temp_span = (temp_range[1] - temp_range[0]) * SCALE
+        self._humidity_height = humidity_height
+        self._temp_top = humidity_height + 1
+        self._temp_height = height - self._temp_top
+        # History.stored when the plot was last brought up to date
+        self._drawn = 0
+        # Columns drawn and full redraws since boot
+        self.columns_drawn = 0
+        self.redraws = 0
+
+    def update(self):
+        """
+            Draws the samples stored since the last update. Returns the
+            number of new samples.
+        """
+        new = self.history.stored - self._drawn
+        if not new:
+            return 0
+        if new >= self.width or not self._drawn:
+            # Nothing on the plot is still in view
+            self.redraw()
+            return new
+        self._drawn = self.history.stored
+
+        width = self.width
+        frame = self.frame
+        frame.scroll(-new, 0)
+        # scroll leaves the uncovered columns as they were
+        frame.fill_rect(width - new, 0, new, self.height, 0)
+        last = len(self.history) - 1
+        for n in range(last - new + 1, last + 1):
+            self._draw_column(width - 1 - last + n, n)
+        return new
+
+    def redraw(self):
+        """Draws the whole plot from the history."""
+        self.frame.fill(0)
+        self._drawn = self.history.stored
+        count = len(self.history)
+        for x in range(max(self.width - count, 0), self.width):
+            self._draw_column(x, count - self.width + x)
+        self.redraws += 1
+
+    def blit(self, display, x=0, y=8):
+        """Copies the plot onto display with its top left at x, y."""
+        display.blit(self.frame, x, y)
+
+    def _draw_column(self, x, n):
+        """Private method - draws the n-th stored sample at column x."""
+        history = self.history
+        i = history.index(n)
+        # Joined to the previous sample by a vertical line
+        previous = history.index(n - 1) if n else i
+        frame = self.frame
+        self._segment(x, history.humidities[previous],
+                      history.humidities[i], self._humidity_low,
+                      self._humidity_span, 0, self._humidity_height)
+        frame.pixel(x, self._humidity_height, 1)
+        self._segment(x, history.temps[previous], history.temps[i],
+                      self._temp_low, self._temp_span, self._temp_top,
+                      self._temp_height)
+        self.columns_drawn += 1
+
+    def _segment(self, x, previous, value, low, span, top, height):
+        y0 = _row(previous, low, span, top, height)
+        y1 = _row(value, low, span, top, height)
+        if y0 > y1:
+            y0, y1 = y1, y0
+        self.frame.vline(x, y0, y1 - y0 + 1, 1)
+
+
+def _row(value, low, span, top, height):
+    """Row of a fixed-point value plotted in rows top to top + height."""
+    value -= low
+    if value < 0:
+        value = 0
+    elif value > span:
+        value = span
+    return top + (height - 1) - value * (height - 1) // span
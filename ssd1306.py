@@ -6,6 +6,7 @@
 
 from micropython import const
 import framebuf
+import micropython
 
 
 # register definitions
@@ -28,22 +29,77 @@ SET_PRECHARGE = const(0xD9)
 SET_VCOM_DESEL = const(0xDB)
 SET_CHARGE_PUMP = const(0x8D)
 
+_NORM_INV_CMDS = (bytes((SET_NORM_INV,)), bytes((SET_NORM_INV | 1,)))
+
+# Columns in a block of a page show() sends, when the width allows
+_BLOCK = const(16)
+
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 
 
 class SSD1306(framebuf.FrameBuffer):
+    # Maximum number of scaled glyphs kept by write_text
+    glyph_cache_size = 32
+
     def __init__(self, width, height, external_vcc):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self._buffer_mv = memoryview(self.buffer)
+        # Copy of the frame as last sent to the panel, used by show()
+        # to only transfer the pages and columns that changed
+        self._sent = bytearray(len(self.buffer))
+        # The frame in blocks of _BLOCK columns of a page, or whole pages,
+        # so show() can send part of a page without slicing a memoryview
+        # (which allocates) on every call
+        self._block = _BLOCK if width % _BLOCK == 0 else width
+        self._blocks = [self._buffer_mv[i:i + self._block]
+                        for i in range(0, len(self.buffer), self._block)]
+        self._full_flush = True
+        # Flush statistics: data bytes written, show() calls that sent
+        # data and show() calls with nothing to send
+        self.bytes_sent = 0
+        self.flushes = 0
+        self.flushes_skipped = 0
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        # Scratch 8x8 frame used to rasterise a single built-in font glyph
+        self._glyph_src_buf = bytearray(8)
+        self._glyph_src = framebuf.FrameBuffer(
+            self._glyph_src_buf, 8, 8, framebuf.MONO_VLSB)
+        # Glyph key (see _get_glyph) -> scaled FrameBuffer, oldest key first
+        self._glyph_cache = {}
+        self._glyph_lru = []
+        # Reusable command sequences for show() and contrast()
+        self._window_cmds = bytearray(
+            (SET_COL_ADDR, 0, 0, SET_PAGE_ADDR, 0, 0))
+        self._cmd_pair = bytearray(2)
         self.init_display()
 
+    def write_cmds(self, cmds):
+        """
+            Sends a sequence of command bytes to the display.
+
+            Transports override this to send the whole sequence in a
+            single bus transaction.
+        """
+        for cmd in cmds:
+            self.write_cmd(cmd)
+
+    def write_blocks(self, blocks, first, end):
+        """
+            Sends blocks first to end - 1 as consecutive data.
+
+            Transports override this to send them in a single bus
+            transaction.
+        """
+        for i in range(first, end):
+            self.write_data(blocks[i])
+
     def init_display(self):
-        for cmd in (
+        self.write_cmds(bytes((
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR,
@@ -73,10 +129,10 @@ class SSD1306(framebuf.FrameBuffer):
             # charge pump
             SET_CHARGE_PUMP,
             0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01,
-        ):  # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01,  # on
+        )))
         self.fill(0)
+        self.invalidate()
         self.show()
 
     def poweroff(self):
@@ -86,26 +142,183 @@ class SSD1306(framebuf.FrameBuffer):
         self.write_cmd(SET_DISP | 0x01)
 
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self._cmd_pair[0] = SET_CONTRAST
+        self._cmd_pair[1] = contrast
+        self.write_cmds(self._cmd_pair)
 
     def invert(self, invert):
-        self.write_cmd(SET_NORM_INV | (invert & 1))
+        self.write_cmds(_NORM_INV_CMDS[invert & 1])
+
+    def invalidate(self):
+        """Forces the next show() to send the whole frame."""
+        self._full_flush = True
 
     def show(self):
-        x0 = 0
-        x1 = self.width - 1
+        """
+            Sends the framebuffer to the display.
+
+            Only the column span that changed in each page since the last
+            flush is sent, widened to whole blocks of 16 columns. Nothing
+            is sent if the frame is unchanged. Doesn't allocate.
+        """
+        width = self.width
+        buffer = self.buffer
+        sent = self._sent
+        block = self._block
+        blocks = self._blocks
+
+        if self._full_flush:
+            self._full_flush = False
+            self._write_window(0, width - 1, 0, self.pages - 1,
+                               self._buffer_mv)
+            sent[:] = buffer
+            self.flushes += 1
+            return
+
+        dirty = 0
+        for page in range(self.pages):
+            start = page * width
+            a = _first_diff(buffer, sent, start, start + width)
+            if a < 0:
+                continue
+            b = _last_diff(buffer, sent, a, start + width) + 1
+            a -= (a - start) % block
+            b += (block - (b - start) % block) % block
+            # The column address advances within the window, so the
+            # blocks are written one after the other
+            self._set_window(a - start, b - start - 1, page, page)
+            self.write_blocks(blocks, a // block, b // block)
+            self.bytes_sent += b - a
+            _copy(sent, buffer, a, b)
+            dirty += 1
+
+        if dirty:
+            self.flushes += 1
+        else:
+            self.flushes_skipped += 1
+
+    def _write_window(self, x0, x1, page0, page1, data):
+        """
+            Private method - sets the column/page address window and
+            writes data into it.
+        """
+        self._set_window(x0, x1, page0, page1)
+        self.write_data(data)
+        self.bytes_sent += len(data)
+
+    def _set_window(self, x0, x1, page0, page1):
+        """Private method - sets the column/page address window."""
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        cmds = self._window_cmds
+        cmds[1] = x0
+        cmds[2] = x1
+        cmds[4] = page0
+        cmds[5] = page1
+        self.write_cmds(cmds)
+
+    def write_text(self, text, x, y, size, color=1, length=None):
+        ''' Method to write Text on OLED/LCD Displays
+            with a variable font size
+
+            Each character is scaled once and kept in a small LRU cache,
+            so drawing a string costs one blit per character. Text in a
+            bytes-like buffer is drawn without allocating.
+
+            Args:
+            text: the string of chars, or bytes-like buffer, to be displayed
+            x: x co-ordinate of starting position
+            y: y co-ordinate of starting position
+            size: font size of text
+            color: color of text to be displayed
+            length: number of chars of a buffer to draw, default all
+        '''
+        step = 8 * size
+        if isinstance(text, str):
+            for char in text:
+                if char != ' ':
+                    self._blit_glyph(ord(char), x, y, size, color)
+                x += step
+            return
+
+        if length is None:
+            length = len(text)
+        for i in range(length):
+            code = text[i]
+            if code != 0x20:
+                self._blit_glyph(code, x, y, size, color)
+            x += step
+
+    def _blit_glyph(self, code, x, y, size, color):
+        """Private method - draws the char with code point code."""
+        glyph = self._get_glyph(code, size, color)
+        # Background pixels of the glyph are transparent
+        self.blit(glyph, x, y, 1 - color)
+
+    def _get_glyph(self, code, size, color):
+        """
+            Private method - returns the cached scaled glyph for the char
+            with code point code, rendering it on a cache miss.
+        """
+        # A small int, so looking a glyph up doesn't allocate
+        key = (code << 8) | (size << 1) | color
+        glyph = self._glyph_cache.get(key)
+        if glyph is not None:
+            # Mark as most recently used
+            if self._glyph_lru[-1] != key:
+                self._glyph_lru.remove(key)
+                self._glyph_lru.append(key)
+            return glyph
+
+        while len(self._glyph_lru) >= self.glyph_cache_size:
+            del self._glyph_cache[self._glyph_lru.pop(0)]
+
+        src = self._glyph_src
+        src.fill(0)
+        src.text(chr(code), 0, 0, 1)
+
+        side = 8 * size
+        glyph = framebuf.FrameBuffer(
+            bytearray(((side + 7) // 8) * side), side, side,
+            framebuf.MONO_VLSB)
+        glyph.fill(1 - color)
+        for i in range(8):
+            for j in range(8):
+                if src.pixel(i, j):
+                    glyph.fill_rect(i * size, j * size, size, size, color)
+
+        self._glyph_cache[key] = glyph
+        self._glyph_lru.append(key)
+        return glyph
+
+
+@micropython.native
+def _first_diff(a, b, start, end):
+    """Returns the index of the first differing byte in start..end, or -1."""
+    for i in range(start, end):
+        if a[i] != b[i]:
+            return i
+    return -1
+
+
+@micropython.native
+def _last_diff(a, b, start, end):
+    """Returns the index of the last differing byte in start..end, or -1."""
+    i = end - 1
+    while i >= start:
+        if a[i] != b[i]:
+            return i
+        i -= 1
+    return -1
+
+
+@micropython.native
+def _copy(a, b, start, end):
+    """Copies b[start:end] into a, without slicing."""
+    for i in range(start, end):
+        a[i] = b[i]
 
 
 class SSD1306_I2C(SSD1306):
@@ -114,44 +327,33 @@ class SSD1306_I2C(SSD1306):
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.cmd_list = [b"\x00", None]  # Co=0, D/C#=0
         super().__init__(width, height, external_vcc)
+        # Control byte and the blocks of a page for write_blocks, unused
+        # entries are left empty
+        self.blocks_list = [b"\x40"] + [b""] * (width // self._block)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80  # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        # A single control byte with Co=0 marks every following byte in
+        # the transaction as a command
+        self.cmd_list[1] = cmds
+        self.i2c.writevto(self.addr, self.cmd_list)
+
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
 
-    def write_text(self, text, x, y, size, color=1):
-        ''' Method to write Text on OLED/LCD Displays
-            with a variable font size
-
-            Args:
-            text: the string of chars to be displayed
-            x: x co-ordinate of starting position
-            y: y co-ordinate of starting position
-            size: font size of text
-            color: color of text to be displayed
-        '''
-        background = self.pixel(x, y)
-        info = []
-        # Creating reference charaters to read their values
-        self.text(text, x, y, color)
-        for i in range(x, x+(8*len(text))):
-            for j in range(y, y+8):
-                # Fetching amd saving details of pixels, such as
-                # x co-ordinate, y co-ordinate, and color of the pixel
-                px_color = self.pixel(i, j)
-                info.append((i, j, px_color)) if px_color == color else None
-        # Clearing the reference characters from the screen
-        self.text(text, x, y, background)
-        # Writing the custom-sized font characters on screen
-        for px_info in info:
-            self.fill_rect(size*px_info[0] - (size-1)*x, size *
-                           px_info[1] - (size-1)*y, size, size, px_info[2])
+    def write_blocks(self, blocks, first, end):
+        blocks_list = self.blocks_list
+        for i in range(1, len(blocks_list)):
+            n = first + i - 1
+            blocks_list[i] = blocks[n] if n < end else b""
+        self.i2c.writevto(self.addr, blocks_list)
 
 
 class SSD1306_SPI(SSD1306):
@@ -164,6 +366,9 @@ class SSD1306_SPI(SSD1306):
         self.dc = dc
         self.res = res
         self.cs = cs
+        self.cmd_buf = bytearray(1)
+        # The bus is configured once here rather than on every write
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         import time
 
         self.res(1)
@@ -174,15 +379,17 @@ class SSD1306_SPI(SSD1306):
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cmd_buf[0] = cmd
+        self.write_cmds(self.cmd_buf)
+
+    def write_cmds(self, cmds):
         self.cs(1)
         self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(cmds)
         self.cs(1)
 
     def write_data(self, buf):
-        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
         self.dc(1)
         self.cs(0)
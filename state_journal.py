@@ -0,0 +1,95 @@
+import struct
+import ubinascii
+import uos
+
+# Record: magic, key, value, crc32 of the preceding bytes
+RECORD_FORMAT = '<BBiI'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORD_MAGIC = 0xA5
+
+
+class StateJournal:
+    """
+        Small persistent key/value store for integer state.
+
+        Values are kept in an append-only log of fixed-size CRC-checked
+        records, the latest record for a key wins. A record is only
+        appended when a value actually changes, and the log is compacted
+        to one record per key once it reaches max_size, so flash is not
+        rewritten on every loop iteration. A torn or corrupt record at the
+        end of the log (eg power lost mid-write) is ignored.
+    """
+    def __init__(self, path='state.log', max_size=2048):
+        """
+            Parameters:
+                path - Log file on the flash filesystem.
+                max_size - Log size in bytes that triggers compaction.
+        """
+        self.path = path
+        self.max_size = max(max_size, RECORD_SIZE * 16)
+        self.values = {}
+        self.size = 0
+        self.writes = 0
+        self.compactions = 0
+        self._load()
+
+    def _load(self):
+        """Private method - restores the values with a single read."""
+        try:
+            with open(self.path, 'rb') as log_file:
+                data = log_file.read()
+        except OSError:
+            return
+
+        valid = 0
+        for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            record = data[offset:offset + RECORD_SIZE]
+            magic, key, value, crc = struct.unpack(RECORD_FORMAT, record)
+            if (magic != RECORD_MAGIC or
+                    crc != ubinascii.crc32(record[:-4]) & 0xFFFFFFFF):
+                # Anything after a bad record can't be trusted
+                break
+            self.values[key] = value
+            valid = offset + RECORD_SIZE
+        self.size = valid
+
+        if valid != len(data):
+            # Drop the corrupt tail so new records follow valid ones
+            self.compact()
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        """Stores value for key (0-255), writing only if it changed."""
+        value = int(value)
+        if self.values.get(key) == value:
+            return
+        self.values[key] = value
+
+        if self.size + RECORD_SIZE > self.max_size:
+            self.compact()
+            return
+
+        with open(self.path, 'ab') as log_file:
+            log_file.write(_pack(key, value))
+        self.size += RECORD_SIZE
+        self.writes += 1
+
+    def compact(self):
+        """Rewrites the log with one record per key."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as log_file:
+            for key, value in self.values.items():
+                log_file.write(_pack(key, value))
+        uos.rename(tmp_path, self.path)
+        self.size = RECORD_SIZE * len(self.values)
+        self.writes += 1
+        self.compactions += 1
+
+
+def _pack(key, value):
+    record = bytearray(struct.pack(RECORD_FORMAT, RECORD_MAGIC, key, value, 0))
+    struct.pack_into('<I', record, RECORD_SIZE - 4,
+                     ubinascii.crc32(record[:-4]) & 0xFFFFFFFF)
+    return record
@@ -0,0 +1,193 @@
+import gc
+import utime
+
+import instrumentation
+from blynk_uploader import EPOCH_OFFSET
+
+# Largest number of history samples served in one response
+MAX_HISTORY = 120
+
+# Prometheus metrics per enclosure: (name, type, value of an enclosure)
+_ENCLOSURE_METRICS = (
+    ('vivarium_humidity_percent', 'gauge', lambda e: e.sensor.humidity),
+    ('vivarium_temperature_celsius', 'gauge', lambda e: e.sensor.temp),
+    ('vivarium_reading_age_seconds', 'gauge',
+     lambda e: None if e.sensor.age_ms() is None
+     else e.sensor.age_ms() // 1000),
+    ('vivarium_humidity_level_percent', 'gauge', lambda e: e.trend.level),
+    ('vivarium_humidity_slope_percent_per_minute', 'gauge',
+     lambda e: e.trend.slope),
+    ('vivarium_target_achieved', 'gauge',
+     lambda e: int(e.schedule.is_target_humidity_achieved())),
+    ('vivarium_days_since_fed', 'gauge', lambda e: e.schedule.days_since_fed),
+    ('vivarium_food_change_due', 'gauge',
+     lambda e: int(e.schedule.food_change_due())),
+    ('vivarium_unsent_readings', 'gauge', lambda e: e.tslog.unsent_count()),
+    ('vivarium_sensor_failures_total', 'counter',
+     lambda e: e.sensor.total_failures),
+    ('vivarium_mistings_total', 'counter', lambda e: e.trend.mistings),
+    ('vivarium_time_to_target_seconds', 'gauge',
+     lambda e: e.time_to_target()),
+    ('vivarium_time_to_dry_seconds', 'gauge', lambda e: e.time_to_dry()),
+)
+
+# Values already in fixed-point and their scale
+_FIXED = {'vivarium_humidity_level_percent': 10,
+          'vivarium_humidity_slope_percent_per_minute': 100}
+
+
+class StatusPages:
+    """
+        The device's state for the LAN, served by an HttpServer:
+            /readings - Latest reading and schedule of each enclosure (JSON).
+            /history - Stored samples of an enclosure (JSON), query
+                       enclosure (index, default 0) and n (default 60).
+            /metrics - Everything in Prometheus text format.
+            /metrics.json - Runtime metrics (JSON).
+    """
+    def __init__(self, enclosures, wifi, time_service, server, boot=None):
+        self.enclosures = enclosures
+        self.wifi = wifi
+        self.time_service = time_service
+        self.server = server
+        # BootTimer of this run, None to leave the boot stages out
+        self.boot = boot
+        server.route('/readings', self.readings)
+        server.route('/history', self.history)
+        server.route('/metrics', self.metrics,
+                     'text/plain; version=0.0.4', streamed=True)
+        server.route('/metrics.json', self.metrics_json)
+
+    def readings(self, out, params):
+        out.add(b'{"time":', utime.time() + EPOCH_OFFSET,
+                b',"enclosures":[')
+        for i, enclosure in enumerate(self.enclosures):
+            sensor = enclosure.sensor
+            schedule = enclosure.schedule
+            trend = enclosure.trend
+            if i:
+                out.add(b',')
+            out.add(b'{"name":')
+            out.add_json(enclosure.name)
+            out.add(b',"temp":')
+            out.add_json(sensor.temp)
+            out.add(b',"humidity":')
+            out.add_json(sensor.humidity)
+            out.add(b',"age_ms":')
+            out.add_json(sensor.age_ms())
+            out.add(b',"slope":')
+            out.add_fixed(trend.slope, 100)
+            out.add(b',"time_to_target_s":')
+            out.add_json(enclosure.time_to_target())
+            out.add(b',"time_to_dry_s":')
+            out.add_json(enclosure.time_to_dry())
+            out.add(b',"mode":')
+            out.add_json(getattr(schedule, 'mode', None))
+            out.add(b',"target_achieved":')
+            out.add_json(schedule.is_target_humidity_achieved())
+            out.add(b',"days_since_fed":', schedule.days_since_fed,
+                    b',"food_change_due":')
+            out.add_json(schedule.food_change_due())
+            out.add(b'}')
+        out.add(b']}')
+
+    def history(self, out, params):
+        index = int(params.get('enclosure', 0))
+        if not 0 <= index < len(self.enclosures):
+            raise ValueError('No such enclosure')
+        history = self.enclosures[index].history
+        n = min(int(params.get('n', 60)), MAX_HISTORY, len(history))
+
+        out.add(b'{"name":')
+        out.add_json(self.enclosures[index].name)
+        out.add(b',"period_s":', history.sample_period_s, b',"points":[')
+        for k in range(len(history) - n, len(history)):
+            i = history.index(k)
+            if k != len(history) - n:
+                out.add(b',')
+            out.add(b'[', history.timestamps[i] + EPOCH_OFFSET, b',')
+            out.add_fixed(history.temps[i])
+            out.add(b',')
+            out.add_fixed(history.humidities[i])
+            out.add(b']')
+        out.add(b']}')
+
+    def _runtime(self):
+        """Device wide (name, type, value) metrics."""
+        server = self.server
+        return (
+            ('vivarium_mem_free_bytes', 'gauge', gc.mem_free()),
+            ('vivarium_wifi_connects_total', 'counter', self.wifi.connects),
+            ('vivarium_wifi_failures_total', 'counter', self.wifi.failures),
+            ('vivarium_time_syncs_total', 'counter', self.time_service.syncs),
+            ('vivarium_rtc_drift_ppm', 'gauge', self.time_service.drift_ppm),
+            ('vivarium_http_requests_total', 'counter', server.requests),
+            ('vivarium_http_rejected_total', 'counter', server.rejected),
+            ('vivarium_http_timeouts_total', 'counter', server.timeouts),
+        )
+
+    async def metrics(self, out, params, send):
+        # Sent a metric family at a time, the whole body grows with the
+        # enclosures and the instrumented spans and can outgrow the buffer
+        for name, kind, value in _ENCLOSURE_METRICS:
+            out.add(b'# TYPE ', name, b' ', kind, b'\n')
+            for enclosure in self.enclosures:
+                v = value(enclosure)
+                if v is None:
+                    continue
+                out.add(name, b'{enclosure=')
+                out.add_json(enclosure.name)
+                out.add(b'} ')
+                if name in _FIXED:
+                    out.add_fixed(v, _FIXED[name])
+                else:
+                    out.add(v)
+                out.add(b'\n')
+            await send()
+
+        for name, kind, value in self._runtime():
+            out.add(b'# TYPE ', name, b' ', kind, b'\n', name, b' ', value,
+                    b'\n')
+        await send()
+
+        if self.boot is not None:
+            out.add(b'# TYPE vivarium_boot_stage_ms gauge\n')
+            for stage, ms in self.boot.stages:
+                out.add(b'vivarium_boot_stage_ms{stage="', stage, b'"} ', ms,
+                        b'\n')
+            await send()
+
+        # Instrumentation, when it is on
+        metrics = instrumentation.metrics
+        if metrics is not None:
+            out.add(b'# TYPE vivarium_runtime gauge\n')
+            for name, value in metrics.summary().items():
+                if value is not None:
+                    out.add(b'vivarium_runtime{name="', name, b'"} ', value,
+                            b'\n')
+
+    def metrics_json(self, out, params):
+        out.add(b'{')
+        for name, _, value in self._runtime():
+            # Without the prefix, eg "mem_free_bytes"
+            out.add(b'"', name[9:], b'":', value, b',')
+        if self.boot is not None:
+            out.add(b'"boot_ms":{')
+            for i, (stage, ms) in enumerate(self.boot.stages):
+                if i:
+                    out.add(b',')
+                out.add(b'"', stage, b'":', ms)
+            out.add(b'},')
+        out.add(b'"instrumentation":')
+        metrics = instrumentation.metrics
+        if metrics is None:
+            out.add(b'null')
+        else:
+            out.add(b'{')
+            for i, (name, value) in enumerate(metrics.summary().items()):
+                if i:
+                    out.add(b',')
+                out.add(b'"', name, b'":')
+                out.add_json(value)
+            out.add(b'}')
+        out.add(b'}')
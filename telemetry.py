@@ -0,0 +1,163 @@
+from history import SCALE
+from blynk_uploader import BlynkUploader, EPOCH_OFFSET
+from async_http import HttpClient
+
+
+class TelemetrySink:
+    """
+        Where logged readings are sent.
+
+        Readings are logged to each enclosure's TimeSeriesLog first. A sink
+        sends the ones it hasn't sent yet and moves the log's cursor on
+        once they have arrived, so nothing is lost while it is down. All
+        the methods sending data need a network connection.
+
+        Sinks implement async send(enclosure), which sends every unsent
+        reading of the enclosure, oldest first, and returns False if some
+        could not be sent. The other methods have defaults here.
+    """
+    def due(self, enclosure):
+        """Whether the enclosure's unsent readings should be sent now."""
+        return enclosure.tslog.unsent_count() > 0
+
+    async def send_metrics(self, summary):
+        """Sends the instrumentation summary, a dict of numbers."""
+        pass
+
+    def failed(self, enclosure):
+        """
+            Called for every enclosure after a round of sends failed, eg
+            the network didn't come up.
+        """
+        pass
+
+    def done(self):
+        """Called after each round of sends."""
+        pass
+
+
+class BlynkSink(TelemetrySink):
+    """
+        Sends each enclosure's readings to its Blynk virtual pins, in
+        timestamped batches once enough have been logged.
+    """
+    def __init__(self, token, metrics_pins=None, timeout=10):
+        """
+            Parameters:
+                token - Blynk auth token.
+                metrics_pins - Virtual pins to send instrumentation metrics
+                               to, eg {'v10': 'loop_lag_max_us'}.
+                timeout - HTTP request deadline in seconds.
+        """
+        self.token = token
+        self.metrics_pins = metrics_pins or {}
+        # The uploaders share one connection
+        self.http = HttpClient(timeout_ms=timeout * 1000)
+        self._uploaders = {}
+        self._metrics = BlynkUploader(token, pins=(), http=self.http)
+
+    def uploader(self, enclosure):
+        """The enclosure's BlynkUploader, created on first use."""
+        uploader = self._uploaders.get(enclosure.pins)
+        if uploader is None:
+            uploader = BlynkUploader(self.token, pins=enclosure.pins,
+                                     http=self.http)
+            self._uploaders[enclosure.pins] = uploader
+        return uploader
+
+    def due(self, enclosure):
+        return self.uploader(enclosure).flush_due(
+            enclosure.tslog.unsent_count())
+
+    def failed(self, enclosure):
+        # Backs off the uploaders that are still due, one whose flush
+        # failed already did
+        if self.due(enclosure):
+            self.uploader(enclosure).failed()
+
+    async def send(self, enclosure):
+        uploader = self.uploader(enclosure)
+        tslog = enclosure.tslog
+        while True:
+            # A batch left by a failed flush is the head of the unsent
+            # log, it is retried as it is so pins that got it already
+            # don't get it again
+            if not len(uploader):
+                for timestamp, temp, humidity in tslog.read_unsent(
+                        uploader.capacity):
+                    uploader.add(temp / SCALE, humidity / SCALE,
+                                 timestamp=timestamp)
+            last_timestamp = uploader.last_timestamp()
+
+            if last_timestamp is None:
+                return True
+            if not await uploader.flush():
+                return False
+            tslog.mark_sent(last_timestamp)
+
+    async def send_metrics(self, summary):
+        if self.metrics_pins:
+            await self._metrics.update({pin: summary.get(name, 0) for pin, name
+                                        in self.metrics_pins.items()})
+
+    def done(self):
+        # The wifi goes down after the upload
+        self.http.close()
+
+
+class MqttSink(TelemetrySink):
+    """
+        Publishes each reading as a JSON message to
+        <topic>/<enclosure name> over a long-lived MQTT connection, as
+        soon as it is logged.
+    """
+    def __init__(self, client, topic='vivarium', qos=1, batch=48):
+        """
+            Parameters:
+                client - MqttClient, connected by its run task.
+                topic - Topic prefix.
+                qos - 0 or 1. With 0 readings count as sent once written.
+                batch - Readings published before the log is updated.
+        """
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.batch = batch
+
+    def due(self, enclosure):
+        return (self.client.connected and
+                enclosure.tslog.unsent_count() > 0)
+
+    async def send(self, enclosure):
+        client = self.client
+        tslog = enclosure.tslog
+        topic = f'{self.topic}/{enclosure.name}'
+        try:
+            while True:
+                last_timestamp = None
+                for timestamp, temp, humidity in tslog.read_unsent(
+                        self.batch):
+                    await client.publish(
+                        topic,
+                        f'{{"time":{timestamp + EPOCH_OFFSET},'
+                        f'"temp":{temp / SCALE},'
+                        f'"humidity":{humidity / SCALE}}}',
+                        qos=self.qos)
+                    last_timestamp = timestamp
+
+                if last_timestamp is None:
+                    return True
+                await client.wait_acked()
+                tslog.mark_sent(last_timestamp)
+        except OSError as e:
+            print(f"Failed to publish readings: {e}")
+            return False
+
+    async def send_metrics(self, summary):
+        body = ','.join(f'"{name}":{value}' for name, value in summary.items()
+                        if value is not None)
+        try:
+            await self.client.publish(f'{self.topic}/metrics',
+                                      '{' + body + '}')
+        except OSError as e:
+            print(f"Failed to publish metrics: {e}")
@@ -0,0 +1,289 @@
+import machine
+import struct
+import uasyncio
+import usocket
+import utime
+from micropython import const
+
+NTP_PORT = const(123)
+# NTP counts from 1900, MicroPython ports from 2000 (or 1970)
+NTP_DELTA = 3155673600 if utime.gmtime(0)[0] == 2000 else 2208988800
+
+# Wait between checks for the server's reply
+_POLL_MS = const(20)
+# Shortest time between two syncs the drift is measured over
+_MIN_DRIFT_WINDOW_MS = const(600000)
+# Drift corrections smaller than this are left to build up
+_MIN_STEP_MS = const(50)
+# Steps at least this big make schedules recompute their deadlines
+_STEP_NOTIFY_MS = const(1000)
+# The RTC starts in 2000 on power-up, anything before this wasn't set
+_MIN_VALID_YEAR = const(2024)
+
+# Daylight saving rules: (month, nth Sunday (-1 for the last), seconds into
+# the day) for the start and end, and whether those times are local
+DST_RULES = {
+    'EU': ((3, -1, 3600), (10, -1, 3600), False),
+    'US': ((3, 2, 7200), (11, 1, 7200), True),
+}
+
+
+def _sunday(year, month, n):
+    """Day of the month of the nth Sunday, the last one for n = -1."""
+    if n > 0:
+        weekday = utime.gmtime(utime.mktime(
+            (year, month, 1, 0, 0, 0, 0, 0)))[6]
+        return 1 + (6 - weekday) % 7 + 7 * (n - 1)
+    if month == 12:
+        year, month = year + 1, 0
+    last = utime.gmtime(utime.mktime(
+        (year, month + 1, 1, 0, 0, 0, 0, 0)) - 86400)
+    return last[2] - (last[6] - 6) % 7
+
+
+class TimeService:
+    """
+        Keeps the RTC on time with background SNTP syncs and converts to
+        local time.
+
+        Syncs use a non-blocking UDP exchange inside the shared wifi
+        session. Between syncs the RTC is nudged by the drift measured
+        over the previous ones.
+    """
+    def __init__(self, wifi, host='pool.ntp.org', utc_offset_s=0, dst=None,
+                 resync_s=6 * 3600, retry_s=300, adjust_s=600,
+                 timeout_ms=2000):
+        """
+            Parameters:
+                wifi - WifiManager to sync over.
+                host - NTP server.
+                utc_offset_s - Local standard time offset from UTC.
+                dst - Daylight saving rule in DST_RULES, None for none.
+                resync_s - Time between syncs.
+                retry_s - Time before retrying a failed sync.
+                adjust_s - Time between drift corrections.
+                timeout_ms - Time to wait for the server's reply.
+        """
+        if dst is not None and dst not in DST_RULES:
+            raise ValueError(f"Unknown DST rule {dst}")
+        self.wifi = wifi
+        self.host = host
+        self.utc_offset_s = utc_offset_s
+        self.dst = dst
+        self.resync_s = resync_s
+        self.retry_s = retry_s
+        self.adjust_s = adjust_s
+        self.timeout_ms = timeout_ms
+
+        # Called without arguments when the RTC is stepped
+        self.listeners = []
+
+        self.synced = False
+        self.syncs = 0
+        self.failures = 0
+        # How far off the RTC was at the last sync, in ms
+        self.last_offset_ms = None
+        # How fast (+) or slow (-) the RTC runs, in parts per million
+        self.drift_ppm = 0
+
+        self._query = bytearray(48)
+        self._query[0] = 0x1B  # Version 3, client mode
+        # Server address, looked up once as getaddrinfo blocks the event
+        # loop, and again only after a failed exchange
+        self._address = None
+        self._next_sync = None
+        # RTC time of the last sync and drift correction in ms, and the
+        # corrections applied since the sync
+        self._synced_at = None
+        self._adjusted_at = None
+        self._applied_ms = 0
+
+        # Start and end of daylight saving in the year last looked at
+        self._dst_year = None
+        self._dst_start = 0
+        self._dst_end = 0
+
+    def valid(self):
+        """Whether the RTC holds the real time, synced or kept over a reset."""
+        return self.synced or utime.gmtime()[0] >= _MIN_VALID_YEAR
+
+    def utc_offset(self, t=None):
+        """Local time offset from UTC in seconds at time t (default now)."""
+        if t is None:
+            t = utime.time()
+        if self.dst is None:
+            return self.utc_offset_s
+        year = utime.gmtime(t)[0]
+        if year != self._dst_year:
+            self._dst_bounds(year)
+        if self._dst_start <= t < self._dst_end:
+            return self.utc_offset_s + 3600
+        return self.utc_offset_s
+
+    def _dst_bounds(self, year):
+        start, end, local = DST_RULES[self.dst]
+        bounds = []
+        for month, n, seconds in (start, end):
+            day = _sunday(year, month, n)
+            bounds.append(utime.mktime(
+                (year, month, day, 0, 0, 0, 0, 0)) + seconds)
+        if local:
+            # Starts in standard time, ends in daylight time
+            bounds[0] -= self.utc_offset_s
+            bounds[1] -= self.utc_offset_s + 3600
+        self._dst_year = year
+        self._dst_start, self._dst_end = bounds
+
+    def localtime(self, t=None):
+        """Like utime.localtime, in the configured timezone."""
+        if t is None:
+            t = utime.time()
+        return utime.gmtime(t + self.utc_offset(t))
+
+    def next_change(self, morning, night, t=None):
+        """
+            The schedule mode at time t (default now) and the time it
+            next changes.
+
+            Returns ("AM" or "PM", utime.time() of the next change).
+        """
+        if t is None:
+            t = utime.time()
+        local = t + self.utc_offset(t)
+        day = local - local % 86400
+        seconds = local - day
+        if seconds < morning * 3600:
+            mode, change = "PM", day + morning * 3600
+        elif seconds < night * 3600:
+            mode, change = "AM", day + night * 3600
+        else:
+            mode, change = "PM", day + 86400 + morning * 3600
+        # The offset may differ by then if daylight saving starts or ends
+        return mode, change - self.utc_offset(change - self.utc_offset(t))
+
+    def _rtc_ms(self):
+        return utime.time_ns() // 1000000
+
+    def _set_rtc(self, ms):
+        t = utime.gmtime(ms // 1000)
+        machine.RTC().datetime((t[0], t[1], t[2], t[6] + 1, t[3], t[4], t[5],
+                                ms % 1000 * 1000))
+
+    async def _exchange(self):
+        """
+            Private method - asks the server for the time.
+
+            Returns the time in ms, as utime.time_ns() // 1000000 would
+            read if the RTC was right. Raises OSError on failure.
+        """
+        if self._address is None:
+            self._address = usocket.getaddrinfo(self.host, NTP_PORT)[0][-1]
+        address = self._address
+        sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sent = utime.ticks_ms()
+            sock.sendto(self._query, address)
+            while True:
+                try:
+                    reply = sock.recv(48)
+                    break
+                except OSError:
+                    # Nothing received yet
+                    if (utime.ticks_diff(utime.ticks_ms(), sent)
+                            >= self.timeout_ms):
+                        raise OSError("NTP timeout")
+                    await uasyncio.sleep_ms(_POLL_MS)
+            round_trip = utime.ticks_diff(utime.ticks_ms(), sent)
+        finally:
+            sock.close()
+
+        # Server mode and a non-zero stratum, 0 is a kiss of death
+        if len(reply) < 48 or reply[0] & 7 != 4 or not reply[1]:
+            raise OSError("Bad NTP reply")
+        seconds, fraction = struct.unpack('!II', reply[40:48])
+        # The server's transmit time, half a round trip ago
+        return ((seconds - NTP_DELTA) * 1000 + (fraction * 1000 >> 32) +
+                round_trip // 2)
+
+    async def sync(self):
+        """
+            Sets the RTC from the NTP server and updates the drift
+            estimate. Needs a network connection.
+
+            Returns True on success.
+        """
+        try:
+            ntp_ms = await self._exchange()
+        except OSError as e:
+            self.failures += 1
+            # The server may be gone, pools hand out another one
+            self._address = None
+            self._next_sync = utime.ticks_add(utime.ticks_ms(),
+                                              self.retry_s * 1000)
+            print(f"Failed to sync time: {e}")
+            return False
+
+        rtc_ms = self._rtc_ms()
+        offset_ms = ntp_ms - rtc_ms
+        if self._synced_at is not None:
+            elapsed = rtc_ms - self._synced_at
+            if elapsed >= _MIN_DRIFT_WINDOW_MS:
+                # What the error would be without the corrections made
+                error = offset_ms + self._applied_ms
+                drift_ppm = -error * 1000000 // elapsed
+                if self.syncs > 1:
+                    drift_ppm = (self.drift_ppm + drift_ppm) // 2
+                self.drift_ppm = drift_ppm
+
+        self._set_rtc(ntp_ms)
+        self._synced_at = ntp_ms
+        self._adjusted_at = ntp_ms
+        self._applied_ms = 0
+        self.last_offset_ms = offset_ms
+        self.synced = True
+        self.syncs += 1
+        self._next_sync = utime.ticks_add(utime.ticks_ms(),
+                                          self.resync_s * 1000)
+        print(f"Time synchronized, RTC was {offset_ms}ms off")
+
+        if abs(offset_ms) >= _STEP_NOTIFY_MS:
+            for listener in self.listeners:
+                listener()
+        return True
+
+    def _compensate(self):
+        """Private method - corrects the RTC for the drift since the last."""
+        if not self.drift_ppm or self._adjusted_at is None:
+            return
+        rtc_ms = self._rtc_ms()
+        correction = (-self.drift_ppm * (rtc_ms - self._adjusted_at)
+                      // 1000000)
+        if abs(correction) < _MIN_STEP_MS:
+            return
+        self._set_rtc(rtc_ms + correction)
+        self._applied_ms += correction
+        self._adjusted_at = rtc_ms + correction
+
+    async def run(self):
+        """
+            Resyncs every resync_s in the background and corrects the
+            drift every adjust_s in between.
+        """
+        while True:
+            if (self._next_sync is None or utime.ticks_diff(
+                    utime.ticks_ms(), self._next_sync) >= 0):
+                try:
+                    async with self.wifi:
+                        await self.sync()
+                except OSError as e:
+                    self.failures += 1
+                    self._next_sync = utime.ticks_add(utime.ticks_ms(),
+                                                      self.retry_s * 1000)
+                    print(f"Failed to connect to internet: {e}")
+            else:
+                self._compensate()
+
+            await uasyncio.sleep_ms(max(0, min(
+                self.adjust_s * 1000,
+                utime.ticks_diff(self._next_sync, utime.ticks_ms()))))
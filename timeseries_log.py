@@ -0,0 +1,220 @@
+import struct
+import uos
+import utime
+
+from history import to_fixed
+from state_journal import StateJournal
+
+# Segment header: magic, format version, record size, reserved,
+# timestamp of the first record
+HEADER_FORMAT = '<4sBBHI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b'TSLG'
+VERSION = 1
+
+# Record: timestamp in seconds, fixed-point temperature and humidity
+RECORD_FORMAT = '<Ihh'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Key of the upload cursor in the log's state journal
+CURSOR_KEY = 0
+
+
+class TimeSeriesLog:
+    """
+        Store-and-forward log of readings on flash.
+
+        Readings are fixed-size records appended to segment files. Each
+        segment starts with a header holding the timestamp of its first
+        record, and records are in time order, so a time range is found
+        with a few seeks rather than a scan. The oldest segment is deleted
+        once there are more than max_segments. The defaults hold a week of
+        30 second samples in about 160 KB.
+
+        The timestamp of the last reading uploaded is kept as a cursor so
+        the unsent tail can be replayed after the network comes back.
+    """
+    def __init__(self, directory='ts', records_per_segment=2880,
+                 max_segments=8):
+        """
+            Parameters:
+                directory - Directory holding the segment files.
+                records_per_segment - Records written before a new
+                                      segment is started.
+                max_segments - Segments kept, older ones are deleted.
+        """
+        self.directory = directory
+        self.records_per_segment = records_per_segment
+        self.max_segments = max_segments
+        self._record = bytearray(RECORD_SIZE)
+        self._full = False
+        self.out_of_order = 0
+
+        try:
+            uos.mkdir(directory)
+        except OSError:
+            pass
+
+        self.cursor = StateJournal(f'{directory}/cursor.log')
+
+        # [sequence number, first timestamp, record count] per segment
+        self.segments = []
+        # Sequence number of the next segment, past every segment file
+        # found so an ignored one is never overwritten
+        self._next_seq = 0
+        for filename in sorted(uos.listdir(directory)):
+            if not filename.endswith('.seg'):
+                continue
+            try:
+                seq = int(filename[:-4])
+            except ValueError:
+                continue
+            # Only names _path gives, not eg '7.seg' or a copy left by hand
+            if filename != f'{seq:08d}.seg':
+                continue
+            self._next_seq = max(self._next_seq, seq + 1)
+            self._load_segment(seq)
+        self._last = self.last_timestamp()
+
+    def _path(self, seq):
+        return f'{self.directory}/{seq:08d}.seg'
+
+    def _load_segment(self, seq):
+        path = self._path(seq)
+        size = uos.stat(path)[6]
+        with open(path, 'rb') as segment_file:
+            header = segment_file.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            uos.remove(path)
+            return
+        magic, version, record_size, _, first = struct.unpack(
+            HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            print(f'Ignoring unknown segment {path}')
+            return
+        count, torn = divmod(size - HEADER_SIZE, RECORD_SIZE)
+        self.segments.append([seq, first, count])
+        # A torn write would misalign later records, so close the segment
+        # and append to a new one
+        self._full = bool(torn)
+
+    def __len__(self):
+        return sum(segment[2] for segment in self.segments)
+
+    def last_timestamp(self):
+        """Timestamp of the newest record, None if the log is empty."""
+        for seq, first, count in reversed(self.segments):
+            if count:
+                return self._timestamp_at(seq, count - 1)
+        return None
+
+    def append(self, temp, humidity, timestamp=None):
+        """
+            Appends a reading. Readings older than the newest record are
+            dropped so records stay in time order.
+        """
+        if timestamp is None:
+            timestamp = utime.time()
+        if self._last is not None and timestamp < self._last:
+            self.out_of_order += 1
+            return False
+
+        if (not self.segments or self._full or
+                self.segments[-1][2] >= self.records_per_segment):
+            self._new_segment(timestamp)
+
+        struct.pack_into(RECORD_FORMAT, self._record, 0, timestamp,
+                         to_fixed(temp), to_fixed(humidity))
+        with open(self._path(self.segments[-1][0]), 'ab') as segment_file:
+            segment_file.write(self._record)
+        self.segments[-1][2] += 1
+        self._last = timestamp
+        return True
+
+    def _new_segment(self, first):
+        seq = self._next_seq
+        self._next_seq += 1
+        with open(self._path(seq), 'wb') as segment_file:
+            segment_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+                                           RECORD_SIZE, 0, first))
+        self.segments.append([seq, first, 0])
+        self._full = False
+
+        # Retention by deleting whole segments
+        while len(self.segments) > self.max_segments:
+            uos.remove(self._path(self.segments.pop(0)[0]))
+
+    def _timestamp_at(self, seq, index, segment_file=None):
+        if segment_file is None:
+            with open(self._path(seq), 'rb') as segment_file:
+                return self._timestamp_at(seq, index, segment_file)
+        segment_file.seek(HEADER_SIZE + index * RECORD_SIZE)
+        return struct.unpack('<I', segment_file.read(4))[0]
+
+    def _bisect(self, segment_file, seq, count, timestamp):
+        """Index of the first record at or after timestamp."""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if self._timestamp_at(seq, mid, segment_file) < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _start(self, timestamp):
+        """(segment position, record index) of the first record >= timestamp."""
+        position = 0
+        for i, (seq, first, count) in enumerate(self.segments):
+            if first <= timestamp:
+                position = i
+        seq, first, count = self.segments[position]
+        with open(self._path(seq), 'rb') as segment_file:
+            return position, self._bisect(segment_file, seq, count, timestamp)
+
+    def read_range(self, start=0, end=None, limit=None):
+        """
+            Yields (timestamp, temp, humidity) for records with
+            start <= timestamp < end, temp & humidity in fixed point.
+        """
+        if not self.segments:
+            return
+        position, index = self._start(start)
+        record = self._record
+        for seq, first, count in self.segments[position:]:
+            if end is not None and first >= end:
+                return
+            with open(self._path(seq), 'rb') as segment_file:
+                segment_file.seek(HEADER_SIZE + index * RECORD_SIZE)
+                while index < count:
+                    segment_file.readinto(record)
+                    timestamp, temp, humidity = struct.unpack(RECORD_FORMAT,
+                                                              record)
+                    if end is not None and timestamp >= end:
+                        return
+                    yield timestamp, temp, humidity
+                    index += 1
+                    if limit is not None:
+                        limit -= 1
+                        if not limit:
+                            return
+            index = 0
+
+    def sent_until(self):
+        """Timestamp of the last uploaded reading, -1 if none."""
+        return self.cursor.get(CURSOR_KEY, -1)
+
+    def mark_sent(self, timestamp):
+        """Moves the upload cursor past readings up to timestamp."""
+        self.cursor.set(CURSOR_KEY, timestamp)
+
+    def read_unsent(self, limit=None):
+        return self.read_range(self.sent_until() + 1, limit=limit)
+
+    def unsent_count(self):
+        """Number of records after the upload cursor."""
+        if not self.segments:
+            return 0
+        position, index = self._start(self.sent_until() + 1)
+        return (sum(segment[2] for segment in self.segments[position:]) -
+                index)
@@ -0,0 +1,105 @@
+"""
+    Writes manifest.json for an OTA version directory.
+
+    Run on the machine hosting the updates, eg:
+        python tools/make_manifest.py /var/www/ota/humidity/v1.0.1
+
+    With --mpy the modules are first compiled to .mpy with mpy-cross
+    (pip install mpy-cross, its version has to match the firmware's), which
+    loads faster and takes less RAM on the device than compiling the .py
+    files at import:
+        python tools/make_manifest.py /var/www/ota/humidity/v1.0.1 --mpy
+
+    Native code is compiled for the ESP32-C3, add --march=<arch> for other
+    boards (mpy-cross --help lists them).
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+MANIFEST_FILE = 'manifest.json'
+
+# Run as source by the firmware, never compiled
+SOURCE_ONLY = ('main.py', 'boot.py', 'env.py')
+
+# Native code architecture of the ESP32-C3
+MARCH = 'rv32imc'
+
+
+def compile_modules(version_dir, mpy_cross='mpy-cross', march=MARCH):
+    """
+        Replaces every .py module in version_dir with a compiled .mpy.
+        Returns the .mpy format version.
+
+        Everything is compiled into a temporary directory first, so a
+        module that fails to compile leaves version_dir untouched.
+
+        Parameters:
+            version_dir - Directory of the version's files.
+            mpy_cross - The mpy-cross command.
+            march - Architecture of the device's native code, needed by
+                    @micropython.native functions.
+    """
+    compiled = []
+    with tempfile.TemporaryDirectory() as build_dir:
+        for root, _, names in os.walk(version_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if not name.endswith('.py') or (
+                        root == version_dir and name in SOURCE_ONLY):
+                    continue
+                module = os.path.relpath(path, version_dir)[:-3]
+                output = os.path.join(build_dir, module + '.mpy')
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+                subprocess.run([mpy_cross, f'-march={march}', '-o', output,
+                                path], check=True)
+                compiled.append((path, output))
+
+        version = None
+        for path, output in compiled:
+            shutil.copyfile(output, path[:-3] + '.mpy')
+            os.remove(path)
+            # Header: 'M', format version, flags, ...
+            with open(output, 'rb') as f:
+                version = f.read(2)[1]
+    return version
+
+
+def build_manifest(version_dir, mpy_version=None):
+    files = {}
+    for root, _, names in os.walk(version_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, version_dir).replace(os.sep, '/')
+            if filename == MANIFEST_FILE or filename.endswith('.sha256'):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            files[filename] = {
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+    manifest = {'version': os.path.basename(os.path.normpath(version_dir)),
+                'files': files}
+    if mpy_version is not None:
+        manifest['mpy'] = mpy_version
+    return manifest
+
+
+if __name__ == '__main__':
+    version_dir = sys.argv[1]
+    mpy_version = None
+    march = MARCH
+    for arg in sys.argv[2:]:
+        if arg.startswith('--march='):
+            march = arg[len('--march='):]
+    if '--mpy' in sys.argv:
+        mpy_version = compile_modules(version_dir, march=march)
+    manifest = build_manifest(version_dir, mpy_version)
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(manifest['files'])} files to manifest")
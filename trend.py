@@ -0,0 +1,114 @@
+import utime
+from micropython import const
+
+from history import to_fixed
+
+# Slopes are in hundredths of %RH per minute, for fixed-point humidity
+# (x10) over milliseconds that is delta * 600000 // dt_ms
+_SLOPE_SCALE = const(600000)
+
+
+class Trend:
+    """
+        Incremental humidity trend, O(1) per sample with integer maths.
+
+        level is the exponentially weighted humidity (fixed-point, see
+        history.SCALE) and slope its exponentially weighted rate of change
+        in hundredths of %RH per minute. The slope rising to misting_rate
+        is counted as a misting, it is over once the slope falls back below
+        changing_rate. Going by the slope keeps sensor noise out, a single
+        0.1 %RH step 2 s apart is a rate of 300. interval_ms is the sampling
+        interval to use next: fast while humidity is changing, doubling up
+        to slow_ms while it is flat.
+    """
+    def __init__(self, fast_ms=2000, slow_ms=30000, changing_rate=50,
+                 misting_rate=300, smoothing=2):
+        """
+            Parameters:
+                fast_ms - Sampling interval while humidity is changing.
+                slow_ms - Longest sampling interval while it is flat.
+                changing_rate - Slope counted as changing, 0.01 %RH/min.
+                misting_rate - Slope counted as a misting, 0.01 %RH/min.
+                smoothing - A new sample is weighted 1 / 2**smoothing.
+        """
+        self.fast_ms = fast_ms
+        self.slow_ms = slow_ms
+        self.changing_rate = changing_rate
+        self.misting_rate = misting_rate
+        self.smoothing = smoothing
+
+        self.level = None
+        self.slope = 0
+        self.interval_ms = fast_ms
+        self.misting = False
+        self.mistings = 0
+        self.last_misting = None
+
+        # Accumulators hold the averages times 2**smoothing, which keeps
+        # the fractional bits the shifts would otherwise drop
+        self._level_acc = 0
+        self._slope_acc = 0
+        self._last = 0
+        self._timestamp = None
+
+    def add(self, humidity, timestamp=None):
+        """Adds a reading taken at timestamp (ticks_ms, default now)."""
+        if timestamp is None:
+            timestamp = utime.ticks_ms()
+        value = to_fixed(humidity)
+        k = self.smoothing
+
+        if self._timestamp is None:
+            self._level_acc = value << k
+            self.level = value
+        else:
+            dt = utime.ticks_diff(timestamp, self._timestamp)
+            if dt <= 0:
+                return
+            rate = (value - self._last) * _SLOPE_SCALE // dt
+            self._level_acc += value - (self._level_acc >> k)
+            self._slope_acc += rate - (self._slope_acc >> k)
+            self.level = self._level_acc >> k
+            self.slope = self._slope_acc >> k
+
+            if self.misting:
+                self.misting = self.slope >= self.changing_rate
+            elif self.slope >= self.misting_rate:
+                self.misting = True
+                self.mistings += 1
+                self.last_misting = timestamp
+
+        self._last = value
+        self._timestamp = timestamp
+
+        if self.misting or abs(self.slope) >= self.changing_rate:
+            self.interval_ms = self.fast_ms
+        else:
+            self.interval_ms = min(self.interval_ms * 2, self.slow_ms)
+
+    def seconds_to(self, humidity):
+        """
+            Seconds until the level reaches humidity at the current slope,
+            None if it isn't heading that way.
+        """
+        if self.level is None:
+            return None
+        difference = to_fixed(humidity) - self.level
+        if not difference:
+            return 0
+        if not self.slope or (difference > 0) != (self.slope > 0):
+            return None
+        # Minutes are difference * 10 / slope
+        return difference * 600 // self.slope
+
+    def time_to_target(self, target):
+        """Seconds until humidity rises to target, None if not rising."""
+        if self.level is not None and self.level >= to_fixed(target):
+            return 0
+        return self.seconds_to(target)
+
+    def time_to_dry(self, threshold):
+        """Seconds until humidity falls to threshold, None if not falling."""
+        if self.level is not None and self.level <= to_fixed(threshold):
+            return 0
+        return self.seconds_to(threshold)
@@ -0,0 +1,112 @@
+import network
+import uasyncio
+import utime
+
+
+class WifiManager:
+    """
+        Shares one wifi connection between tasks.
+
+        Use as an async context manager. The first user brings the link up,
+        later users share it and the radio is powered down when the last
+        user leaves:
+
+            async with wifi:
+                ...
+
+        Raises OSError on entry if the connection could not be made, or
+        there are no credentials, so the device runs offline without them.
+    """
+    def __init__(self, ssid, password, timeout_ms=15000, attempts=3,
+                 backoff_ms=1000, max_backoff_ms=60000):
+        """
+            Parameters:
+                ssid, password - Wifi credentials, None if not set.
+                timeout_ms - Time to wait for a single connection attempt.
+                attempts - Connection attempts per acquire.
+                backoff_ms - Delay after the first failed attempt, doubled
+                             after each further failure.
+                max_backoff_ms - Upper bound of the delay between attempts.
+        """
+        self.ssid = ssid
+        self.password = password
+        self.timeout_ms = timeout_ms
+        self.attempts = attempts
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+
+        self.sta_if = network.WLAN(network.WLAN.IF_STA)
+        self.users = 0
+        self._lock = uasyncio.Lock()
+        self._next_backoff_ms = backoff_ms
+
+        # Connection statistics
+        self.connects = 0
+        self.failures = 0
+        self.last_connect_ms = None
+        self.max_connect_ms = 0
+
+    def isconnected(self):
+        return self.sta_if.isconnected()
+
+    async def __aenter__(self):
+        self.users += 1
+        try:
+            await self.connect()
+        except Exception:
+            self.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def release(self):
+        self.users -= 1
+        if self.users <= 0:
+            self.users = 0
+            self.sta_if.active(False)
+
+    async def connect(self):
+        """Connects unless already connected, retrying with backoff."""
+        if self.ssid is None or self.password is None:
+            raise OSError("Create env.py with a dict 'variables' "
+                          "containing SSID & PASS for Wifi.")
+        async with self._lock:
+            for attempt in range(self.attempts):
+                if attempt:
+                    await uasyncio.sleep_ms(self._next_backoff_ms)
+                    self._next_backoff_ms = min(self._next_backoff_ms * 2,
+                                                self.max_backoff_ms)
+                if await self._try_connect():
+                    self._next_backoff_ms = self.backoff_ms
+                    return
+            raise OSError('Failed to connect to wifi')
+
+    async def _try_connect(self):
+        """Private method - one connection attempt with a timeout."""
+        if self.sta_if.isconnected():
+            return True
+
+        start = utime.ticks_ms()
+        try:
+            self.sta_if.active(True)
+            self.sta_if.connect(self.ssid, self.password)
+        except OSError as e:
+            self.failures += 1
+            print(f"Failed to connect to wifi: {e}")
+            return False
+        while not self.sta_if.isconnected():
+            if utime.ticks_diff(utime.ticks_ms(), start) > self.timeout_ms:
+                self.failures += 1
+                print("Wifi connection timed out")
+                self.sta_if.disconnect()
+                return False
+            await uasyncio.sleep_ms(100)
+
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+        self.connects += 1
+        self.last_connect_ms = elapsed
+        self.max_connect_ms = max(self.max_connect_ms, elapsed)
+        print('network info:', self.sta_if.ifconfig())
+        return True